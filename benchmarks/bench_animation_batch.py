@@ -0,0 +1,89 @@
+"""
+Animation batches against one render job per candidate, run in Blender on a scene with matching variables:
+
+    blender -b scene.blend -P benchmarks/bench_animation_batch.py -- --candidates 8 --output batch.json
+
+Renders random candidates within the bounds of the matching variables one render job each, read back by the file
+capture as in optimization runs, then as the frames of one animation batch. Times both, and checks that each frame
+matches the render of its candidate and that the actions of the animated IDs are restored after the batch. The
+render engine must be noise free or seeded, like Workbench, EEVEE or Cycles without an animated seed.
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+import bpy
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from headless import load # with Blender's bpy, only skips the addon registration code of the package
+
+properties, matching_variables, render_backend, render_capture, animation_batch = load("properties", "matching_variables", "render_backend", "render_capture", "animation_batch")
+
+def animated_actions(targets: list) -> list:
+    return [(target.animation_data.action, getattr(target.animation_data, "action_slot", None)) if target.animation_data else None for target in targets]
+
+def run(candidates: int, seed: int, work_dir: str) -> tuple[dict, bool]:
+    context = bpy.context
+    matching_properties = getattr(context.scene, properties.MATCHING_PROPERTIES_PROPNAME)
+    if len(matching_properties) == 0:
+        raise SystemExit("The scene has no matching variables")
+    lower = np.array([matching_property.minimum for matching_property in matching_properties])
+    upper = np.array([matching_property.maximum for matching_property in matching_properties])
+    xs = list(lower + np.random.default_rng(seed).random((candidates, len(lower))) * (upper - lower))
+    x0 = [matching_variables.get_value(matching_property.datablock, matching_property.data_path_indexed) for matching_property in matching_properties]
+    targets = [animation_batch.animated_target(matching_property.datablock, matching_variables.split_data_path_indexed(matching_property.data_path_indexed)[0])[0]
+               for matching_property in matching_properties]
+    backend = render_backend.FullRender(write_still=False)
+    capture = render_capture.FileCapture(work_dir)
+    batch = animation_batch.AnimationBatch(work_dir)
+    try:
+        start = time.perf_counter()
+        single_matrices = []
+        for x in xs:
+            matching_variables.set_matching_values(context, x)
+            backend.render(context)
+            single_matrices.append(capture.capture(context.scene).copy())
+        single_time = time.perf_counter() - start
+        matching_variables.set_matching_values(context, x0)
+        actions = animated_actions(targets)
+        start = time.perf_counter()
+        batch.keyframe(context, xs)
+        try:
+            frame_paths = batch.render(context, backend, len(xs))
+        finally:
+            batch.clear()
+        batch_matrices = [batch.read(frame_path).copy() for frame_path in frame_paths]
+        batch_time = time.perf_counter() - start
+        restored = animated_actions(targets) == actions
+    finally:
+        matching_variables.set_matching_values(context, x0)
+        capture.teardown(context.scene)
+        batch.teardown()
+    differences = [float(np.max(np.abs(batch_matrix - single_matrix))) for batch_matrix, single_matrix in zip(batch_matrices, single_matrices)]
+    layered = "layers" in bpy.types.Action.bl_rna.properties
+    print(f"{candidates} candidates, {'layered' if layered else 'legacy'} actions: single renders {single_time:.2f} s, animation batch {batch_time:.2f} s, "
+          f"largest frame difference {max(differences):.5f}, actions {'restored' if restored else 'NOT restored'}")
+    return {"benchmark": "animation_batch", "candidates": candidates, "layered_actions": layered, "single_s": single_time, "batch_s": batch_time,
+            "frame_differences": differences, "actions_restored": restored}, restored
+
+def main():
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+    parser = argparse.ArgumentParser(description="Benchmarks and checks animation batches against single renders in Blender.")
+    parser.add_argument("--candidates", type=int, default=8, help="Candidates of the batch")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the random candidates")
+    parser.add_argument("--tolerance", type=float, default=1 / 255, help="Largest difference between a frame and its single render, in display encoded values")
+    parser.add_argument("--output", default=None, help="JSON results path")
+    args = parser.parse_args(argv)
+    if not hasattr(bpy.types.Scene, properties.MATCHING_PROPERTIES_PROPNAME): # the addon isn't enabled, the scene still holds its data
+        properties.register()
+    result, restored = run(args.candidates, args.seed, bpy.app.tempdir)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump({"blend": bpy.data.filepath, "engine": bpy.context.scene.render.engine, "results": [result]}, output_file, indent=1)
+        print(f"Results written to {args.output}")
+    if not restored or max(result["frame_differences"]) > args.tolerance:
+        raise SystemExit(f"Animation batch frames differ from single renders by more than {args.tolerance:.5f}, or actions were not restored")
+
+main()
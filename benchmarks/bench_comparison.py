@@ -0,0 +1,100 @@
+import time
+import tracemalloc
+from typing import Callable
+import numpy as np
+from headless import load, SyntheticImage, synthetic_image
+
+image_comparison, = load("image_comparison")
+
+SIZES = {
+    "512x512": (512, 512),
+    "1920x1080": (1920, 1080),
+    "3840x2160": (3840, 2160),
+    "7680x4320": (7680, 4320),
+}
+POPULATION_SIZE = 60 # differential evolution generation of 4 variables
+
+def numpy_histograms(matrix: np.ndarray, channel: str) -> list[np.ndarray]:
+    """Reference implementation: one np.histogram call per channel, as before the histogram engine"""
+    histograms = []
+    for compared in image_comparison.CHANNELS_BY_CHANNEL[channel]:
+        if compared == 'LUMINANCE':
+            values = matrix[:, :, :3] @ image_comparison.LUMINANCE_WEIGHTS
+        else:
+            values = matrix[:, :, image_comparison.COLOR_CHANNEL_INDEX[compared]]
+        histograms.append(np.histogram(values, bins=image_comparison.HISTOGRAM_RESOLUTION, range=(0, 1))[0] / values.size)
+    return histograms
+
+def measure(func: Callable, repeats: int) -> tuple[float, int]:
+    """Median duration over repeats, and peak traced memory of one extra call"""
+    func() # warm up buffers and caches
+    durations = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return float(np.median(durations)), peak
+
+def result(benchmark: str, size: str | None, pixels: int | None, func: Callable, repeats: int, **labels) -> dict:
+    """Measures func, with pixels/s when it processes an image and calls/s otherwise"""
+    duration, peak = measure(func, repeats)
+    throughput = f"{pixels / duration / 1e6:10.1f} Mpx/s" if pixels else f"{1 / duration:10.0f} call/s"
+    print(f"{benchmark:<26} {' '.join(str(value) for value in labels.values()):<28} {size or '':>10} {duration * 1000:10.3f} ms {throughput} {peak / 2 ** 20:8.1f} MiB")
+    record = {"benchmark": benchmark, **labels, "median_s": duration, "peak_memory_bytes": peak}
+    if pixels:
+        record.update(size=size, pixels=pixels, pixels_per_s=pixels / duration)
+    else:
+        record.update(calls_per_s=1 / duration)
+    return record
+
+def run(sizes: list[str], repeats: int = 3, histogram_threads: int = 1) -> list[dict]:
+    results = []
+    channels = list(image_comparison.CHANNELS_BY_CHANNEL)
+    distances = list(image_comparison.DISTANCE_FUNCTIONS_BY_NAME)
+
+    # distances only depend on the histogram resolution
+    rng = np.random.default_rng(0)
+    histogram1, histogram2 = rng.random((2, image_comparison.HISTOGRAM_RESOLUTION))
+    histogram1 /= histogram1.sum()
+    histogram2 /= histogram2.sum()
+    for distance, distance_function in image_comparison.DISTANCE_FUNCTIONS_BY_NAME.items():
+        results.append(result("distance", None, None, lambda: distance_function(histogram1, histogram2), repeats * 100, distance=distance))
+    # a population scored against the reference profile in one pass, and one candidate at a time
+    reference = SyntheticImage(synthetic_image(64, 64, seed=3), "reference")
+    population = rng.random((POPULATION_SIZE, 3, image_comparison.HISTOGRAM_RESOLUTION))
+    population /= population.sum(axis=-1, keepdims=True)
+    for distance in distances:
+        profile = image_comparison.ReferenceProfile(reference, 'RGB', distance)
+        results.append(result("distance_batch", None, None, lambda: profile.compare_histograms_batch(population), repeats * 10, distance=distance, population=POPULATION_SIZE))
+        results.append(result("distance_loop", None, None, lambda: [profile.compare_histograms(histograms) for histograms in population], repeats * 10,
+                              distance=distance, population=POPULATION_SIZE))
+        profile.close()
+
+    for size in sizes:
+        width, height = SIZES[size]
+        pixels = width * height
+        matrix = synthetic_image(width, height, seed=1)
+        other_matrix = synthetic_image(width, height, seed=2)
+        image = SyntheticImage(matrix, "render")
+        other_image = SyntheticImage(other_matrix, "reference")
+
+        for channel in channels:
+            results.append(result("channel_histogram", size, pixels, lambda: numpy_histograms(matrix, channel), repeats, channel=channel))
+            engine = image_comparison.HistogramEngine(image_comparison.CHANNELS_BY_CHANNEL[channel], threads=histogram_threads)
+            results.append(result("histogram_engine", size, pixels, lambda: engine.compute(matrix), repeats, channel=channel, threads=histogram_threads))
+            engine.close()
+        results.append(result("image_to_matrix", size, pixels, lambda: image_comparison.image_to_matrix(image), repeats))
+        for channel in channels:
+            for distance in distances:
+                results.append(result("compare_images", size, pixels, lambda: image_comparison.compare_images(image, other_image, channel, distance), repeats,
+                                      channel=channel, distance=distance))
+                profile = image_comparison.ReferenceProfile(other_image, channel, distance, histogram_threads)
+                results.append(result("reference_profile_compare", size, pixels, lambda: profile.compare(matrix), repeats,
+                                      channel=channel, distance=distance, threads=histogram_threads))
+                profile.close()
+        del matrix, other_matrix, image, other_image
+    return results
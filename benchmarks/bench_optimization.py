@@ -0,0 +1,80 @@
+import contextlib
+import io
+import time
+import numpy as np
+from headless import load, SyntheticImage, synthetic_context, synthetic_image
+
+optimization, = load("optimization")
+
+# The synthetic renderer applies per channel gains and a gamma to a base image. The reference image is rendered with
+# TARGET, so the optimum is known: TARGET, with a score of 0.
+BOUNDS = [(0.5, 1.5), (0.5, 1.5), (0.5, 1.5), (0.5, 2.0)]
+TARGET = np.array([0.8, 1.2, 0.95, 1.3])
+X0 = [1.0, 1.0, 1.0, 1.0]
+
+def synthetic_render(base: np.ndarray, x: np.ndarray) -> np.ndarray:
+    matrix = base.copy()
+    rgb = matrix[:, :, :3]
+    rgb *= np.asarray(x[:3], dtype=np.float32)
+    np.clip(rgb, 0, 1, out=rgb)
+    np.power(rgb, np.float32(x[3]), out=rgb)
+    return matrix
+
+def synthetic_optimizer_class(optimizer_class: type) -> type:
+    """Subclass of an optimizer rendering with synthetic_render instead of Blender"""
+    class SyntheticOptimizer(optimizer_class):
+        def __init__(self, base: np.ndarray, delay: float, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.base = base
+            self.delay = delay
+            self.render_time = 0.0
+
+        def initial_parameters(self) -> tuple[list[float], list[tuple[float, float]]]:
+            return list(X0), list(BOUNDS)
+
+        def render_histograms(self, x: np.ndarray, render_fidelity=None, backend=None) -> np.ndarray:
+            start = time.perf_counter()
+            matrix = synthetic_render(self.base, x)
+            if self.delay > 0:
+                time.sleep(self.delay) # stands for the render time of a real scene
+            histograms = self.reference_profile.compute_histograms(matrix)
+            self.render_time += time.perf_counter() - start
+            return histograms
+
+    SyntheticOptimizer.__name__ = f"Synthetic{optimizer_class.__name__}"
+    return SyntheticOptimizer
+
+def best_so_far(scores: list[float]) -> list[float | None]:
+    curve = np.minimum.accumulate(np.array(scores, dtype=float)) if scores else np.array([])
+    return [float(score) if np.isfinite(score) else None for score in curve] # keep the results valid JSON
+
+def run(budget: int = 120, delay: float = 0.0, resolution: int = 128, repeats: int = 1, channel: str = 'RGB', distance: str = 'BHATTACHARYYA',
+        optimizer_names: list[str] | None = None, seed: int = 0) -> list[dict]:
+    results = []
+    base = synthetic_image(resolution, resolution, seed=seed)
+    reference = SyntheticImage(synthetic_render(base, TARGET), "reference")
+    lower, upper = np.array(BOUNDS).T
+    for name in optimizer_names or list(optimization.OPTIMIZER_BY_NAME):
+        optimizer_class = synthetic_optimizer_class(optimization.OPTIMIZER_BY_NAME[name])
+        for repeat in range(repeats):
+            optimizer = optimizer_class(base, delay, channel, distance, reference, budget, synthetic_context(), capture='FILE', dashboard=False,
+                                        use_checkpoint=False, seed=seed + repeat)
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()): # optimizers print every evaluation
+                x = np.array(optimizer.optimize())
+            duration = time.perf_counter() - start
+            evaluations = len(optimizer.scores)
+            curve = best_so_far(optimizer.scores)
+            parameter_error = float(np.linalg.norm((x - TARGET) / (upper - lower)))
+            print(f"{name:<24} run {repeat}: {evaluations:5d} evaluations {evaluations / duration:8.1f} eval/s, best score {optimizer.lowest_score:.5f}, "
+                  f"parameter error {parameter_error:.4f}, optimizer overhead {(duration - optimizer.render_time) / max(evaluations, 1) * 1000:.2f} ms/eval")
+            results.append({
+                "benchmark": "optimizer", "optimizer": name, "run": repeat, "channel": channel, "distance": distance,
+                "budget": budget, "delay_s": delay, "resolution": resolution,
+                "evaluations": evaluations, "duration_s": duration, "evaluations_per_s": evaluations / duration,
+                "render_time_s": optimizer.render_time, "overhead_per_evaluation_s": (duration - optimizer.render_time) / max(evaluations, 1),
+                "best_score": curve[-1] if curve else None, "optimum_score": 0.0,
+                "result": x.tolist(), "optimum": TARGET.tolist(), "parameter_error": parameter_error,
+                "best_score_by_evaluation": curve,
+            })
+    return results
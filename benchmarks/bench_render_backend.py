@@ -0,0 +1,68 @@
+"""
+Cost of switching the render engine for the EEVEE backend, run in Blender on a scene rendered with another engine:
+
+    blender -b scene.blend -P benchmarks/bench_render_backend.py -- --renders 8 --output eevee.json
+
+Times batches of EEVEE renders with the engine switched for each render, with the engine switched once for the batch
+(a backend session, as in optimization runs), and with the scene engine set to EEVEE for the whole run.
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+import bpy
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from headless import load # with Blender's bpy, only skips the addon registration code of the package
+
+render_backend, = load("render_backend")
+
+def time_renders(render, renders: int) -> list[float]:
+    durations = []
+    for _ in range(renders):
+        start = time.perf_counter()
+        render()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+def summary(case: str, durations: list[float]) -> dict:
+    print(f"{case:<12} first {durations[0] * 1000:9.1f} ms, median {np.median(durations) * 1000:9.1f} ms, total {sum(durations):8.2f} s")
+    return {"benchmark": "eevee_backend", "case": case, "renders": len(durations), "first_s": durations[0],
+            "median_s": float(np.median(durations)), "total_s": sum(durations), "durations_s": durations}
+
+def run(renders: int) -> list[dict]:
+    context = bpy.context
+    render = context.scene.render
+    engine = render.engine
+    if engine in render_backend.EEVEE_ENGINE_IDENTIFIERS:
+        raise SystemExit("The scene already renders with EEVEE, there is no engine switch to measure")
+    backend = render_backend.EeveeRender(write_still=False)
+    full_render = render_backend.FullRender(write_still=False)
+    results = []
+    full_render.render(context) # warm up the scene engine, so that the first switch is measured from the same state
+    results.append(summary("per render", time_renders(lambda: backend.render(context), renders)))
+    full_render.render(context)
+    with backend.session(context):
+        results.append(summary("session", time_renders(lambda: backend.render(context), renders)))
+    render_backend.set_eevee_engine(render)
+    try:
+        results.append(summary("scene EEVEE", time_renders(lambda: full_render.render(context), renders)))
+    finally:
+        render.engine = engine
+    return results
+
+def main():
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+    parser = argparse.ArgumentParser(description="Benchmarks the EEVEE render backend engine switches in Blender.")
+    parser.add_argument("--renders", type=int, default=8, help="Renders of each case")
+    parser.add_argument("--output", default=None, help="JSON results path")
+    args = parser.parse_args(argv)
+    results = run(args.renders)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump({"blend": bpy.data.filepath, "engine": bpy.context.scene.render.engine, "results": results}, output_file, indent=1)
+        print(f"Results written to {args.output}")
+
+main()
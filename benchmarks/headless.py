@@ -0,0 +1,78 @@
+import importlib
+import tempfile
+import types
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+import numpy as np
+
+# Loads refmatcher modules outside of Blender. The comparison and optimization code only needs bpy for rendering,
+# which the benchmarks replace with synthetic renders, and for type annotations and property declarations at import time.
+
+REFMATCHER_DIR = Path(__file__).resolve().parent.parent / "refmatcher"
+
+class _AnyType(type):
+    def __getattr__(cls, name):
+        return cls
+
+class _BlenderType(metaclass=_AnyType):
+    pass
+
+def _headless_bpy() -> types.ModuleType:
+    bpy = types.ModuleType("bpy")
+    bpy.types = types.ModuleType("bpy.types")
+    bpy.types.__getattr__ = lambda name: _BlenderType
+    bpy.props = types.ModuleType("bpy.props")
+    bpy.props.__getattr__ = lambda name: (lambda *args, **kwargs: None)
+    bpy.app = SimpleNamespace(tempdir=tempfile.mkdtemp(prefix="refmatcher_benchmark_"), binary_path="", version=(0, 0, 0),
+                              handlers=SimpleNamespace(persistent=lambda function: function, load_post=[], depsgraph_update_post=[]))
+    bpy.data = SimpleNamespace(filepath="", images={})
+    bpy.utils = SimpleNamespace(user_resource=lambda *args, **kwargs: tempfile.gettempdir())
+    bpy.ops = SimpleNamespace()
+    return bpy
+
+def load(*module_names: str) -> list[types.ModuleType]:
+    """Imports refmatcher modules without running the addon registration code of the package"""
+    if "bpy" not in sys.modules:
+        bpy = _headless_bpy()
+        sys.modules["bpy"] = bpy
+        sys.modules["bpy.types"] = bpy.types
+        sys.modules["bpy.props"] = bpy.props
+    if "refmatcher" not in sys.modules:
+        package = types.ModuleType("refmatcher")
+        package.__path__ = [str(REFMATCHER_DIR)]
+        sys.modules["refmatcher"] = package
+    return [importlib.import_module(f"refmatcher.{module_name}") for module_name in module_names]
+
+class SyntheticImage:
+    """Stands for a bpy.types.Image: the attributes used by image_comparison.image_to_matrix"""
+    def __init__(self, matrix: np.ndarray, name: str = "synthetic"):
+        self.matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        self.name = name
+        self.filepath = ""
+        self.size = (self.matrix.shape[1], self.matrix.shape[0])
+        self.channels = self.matrix.shape[2]
+        self.pixels = SimpleNamespace(foreach_get=self._foreach_get)
+
+    def _foreach_get(self, buffer: np.ndarray):
+        buffer[:] = self.matrix.ravel()
+
+def synthetic_context() -> SimpleNamespace:
+    """Context with a Workbench scene (no sample count) and no-op progress reporting"""
+    render = SimpleNamespace(resolution_percentage=100, engine='BLENDER_WORKBENCH', use_border=False, use_crop_to_border=False,
+                             border_min_x=0.0, border_min_y=0.0, border_max_x=1.0, border_max_y=1.0)
+    scene = SimpleNamespace(render=render, name="Scene")
+    window_manager = SimpleNamespace(progress_begin=lambda *args: None, progress_update=lambda *args: None, progress_end=lambda: None)
+    return SimpleNamespace(scene=scene, window_manager=window_manager)
+
+def synthetic_image(width: int, height: int, seed: int = 0) -> np.ndarray:
+    """Smooth gradients with noise, so that histograms are spread over all bins"""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    matrix = np.empty((height, width, 4), dtype=np.float32)
+    matrix[:, :, 0] = x / max(width - 1, 1)
+    matrix[:, :, 1] = y / max(height - 1, 1)
+    matrix[:, :, 2] = 0.5 + 0.5 * np.sin((x + y) / max(width, height) * 6 * np.pi)
+    matrix[:, :, :3] += rng.normal(scale=0.05, size=(height, width, 3)).astype(np.float32)
+    matrix[:, :, 3] = 1
+    return np.clip(matrix, 0, 1, out=matrix)
@@ -0,0 +1,98 @@
+"""
+Headless benchmarks of the comparison and optimization pipeline, run with a plain Python interpreter having numpy and scipy:
+
+    python benchmarks/run.py --sizes 512x512 1920x1080 --budget 120 --output results.json
+    python benchmarks/run.py --compare baseline.json results.json
+
+Results are written as JSON, with the commit they were measured on, so that runs can be compared across commits.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+from pathlib import Path
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCHMARKS_DIR))
+
+def git_revision() -> dict:
+    def git(*args: str) -> str:
+        try:
+            return subprocess.run(["git", *args], cwd=BENCHMARKS_DIR, capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return ""
+    return {"commit": git("rev-parse", "HEAD"), "dirty": bool(git("status", "--porcelain", "--", "../refmatcher"))}
+
+def metadata() -> dict:
+    import numpy
+    import scipy
+    return {
+        "date": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        **git_revision(),
+        "python": platform.python_version(), "numpy": numpy.__version__, "scipy": scipy.__version__,
+        "platform": platform.platform(), "processor": platform.processor(), "cpu_count": os.cpu_count(),
+    }
+
+def result_key(result: dict) -> tuple:
+    """Identifies a benchmark case across runs: every label, without the measurements"""
+    labels = ("benchmark", "optimizer", "run", "channel", "distance", "threads", "size", "budget", "delay_s", "resolution")
+    return tuple((label, result[label]) for label in labels if label in result)
+
+THROUGHPUT_METRICS = ("pixels_per_s", "calls_per_s", "evaluations_per_s")
+
+def compare(baseline_path: str, current_path: str):
+    with open(baseline_path) as baseline_file, open(current_path) as current_file:
+        baseline, current = json.load(baseline_file), json.load(current_file)
+    print(f"baseline {baseline['metadata']['commit'][:10]}, current {current['metadata']['commit'][:10]}")
+    baseline_results = {result_key(result): result for result in baseline["results"]}
+    for result in current["results"]:
+        key = result_key(result)
+        previous = baseline_results.get(key)
+        if previous is None:
+            continue
+        name = " ".join(str(value) for _, value in key)
+        metric = next(metric for metric in THROUGHPUT_METRICS if metric in result)
+        line = f"{name:<70} {metric} x{result[metric] / previous[metric]:.2f}"
+        if "peak_memory_bytes" in result and previous["peak_memory_bytes"] > 0:
+            line += f", peak memory x{result['peak_memory_bytes'] / previous['peak_memory_bytes']:.2f}"
+        if result.get("best_score") is not None and previous.get("best_score") is not None:
+            line += f", best score {previous['best_score']:.5f} -> {result['best_score']:.5f}"
+        print(line)
+
+def main():
+    import bench_comparison
+    parser = argparse.ArgumentParser(description="Benchmarks image comparison and optimizers without Blender.")
+    parser.add_argument("--sizes", nargs="+", choices=list(bench_comparison.SIZES), default=list(bench_comparison.SIZES))
+    parser.add_argument("--repeats", type=int, default=3, help="Timed repetitions of each comparison benchmark")
+    parser.add_argument("--threads", type=int, default=1, help="Histogram threads")
+    parser.add_argument("--optimizers", nargs="+", default=None, help="Optimizer names, all by default")
+    parser.add_argument("--budget", type=int, default=120, help="Evaluation budget of each optimizer run")
+    parser.add_argument("--delay", type=float, default=0.0, help="Seconds added to every synthetic render")
+    parser.add_argument("--resolution", type=int, default=128, help="Side of the synthetic renders")
+    parser.add_argument("--runs", type=int, default=1, help="Runs of each optimizer, with different seeds")
+    parser.add_argument("--skip-comparison", action="store_true")
+    parser.add_argument("--skip-optimization", action="store_true")
+    parser.add_argument("--output", default=None, help="JSON results path")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"), help="Compare two JSON results instead of running")
+    args = parser.parse_args()
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    results = []
+    if not args.skip_comparison:
+        results += bench_comparison.run(args.sizes, args.repeats, args.threads)
+    if not args.skip_optimization:
+        import bench_optimization
+        results += bench_optimization.run(args.budget, args.delay, args.resolution, args.runs, optimizer_names=args.optimizers)
+    output = {"metadata": metadata(), "arguments": vars(args), "results": results}
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(output, output_file, indent=1)
+        print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
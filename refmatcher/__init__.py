@@ -14,12 +14,13 @@ bl_info = {
 
 import importlib
 
-from refmatcher import properties, operators, hmi, image_comparison, dependencies, optimization, matching_variables, server
-for module in [properties, operators, hmi, image_comparison, dependencies, optimization, matching_variables, server]:
+from refmatcher import properties, operators, hmi, image_comparison, dependencies, optimization, matching_variables, server, render_capture, fidelity, evaluation_cache, evaluation_log, workers, bayesian, profiling, region, checkpoint, render_backend, sensitivity, cost_model, animation_batch, evaluation_archive
+for module in [properties, operators, hmi, region, image_comparison, render_capture, fidelity, evaluation_cache, evaluation_log, workers, bayesian, profiling, checkpoint, render_backend, sensitivity, cost_model, animation_batch, evaluation_archive, dependencies, optimization, matching_variables, server]:
     importlib.reload(module)
 
 def register():
     properties.register()
+    matching_variables.register()
     operators.register()
     hmi.register()
 
@@ -27,4 +28,5 @@ def register():
 def unregister():
     hmi.unregister()
     operators.unregister()
+    matching_variables.unregister()
     properties.unregister()
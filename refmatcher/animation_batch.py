@@ -0,0 +1,125 @@
+import bpy
+from bpy.types import Context, ID, Action, AnimData
+import numpy as np
+import os
+from refmatcher import image_comparison, matching_variables
+from refmatcher.properties import MatchingProperty, MATCHING_PROPERTIES_PROPNAME
+from refmatcher.render_backend import RenderBackend
+from typing import Iterable
+
+SCRATCH_ACTION_NAME = "RefMatcher Batch"
+FRAME_FILE_PREFIX = "frame_"
+# prefixes of data paths going through an embedded ID, which is animated by its own animation data
+EMBEDDED_ID_PREFIXES = ("node_tree.", "shape_keys.")
+
+def animated_target(datablock: ID, data_path: str) -> tuple[ID, str]:
+    """(ID, data path) under which the property is keyframed: fcurves of embedded IDs live on the embedded ID"""
+    for prefix in EMBEDDED_ID_PREFIXES:
+        if data_path.startswith(prefix):
+            embedded = getattr(datablock, prefix[:-1], None)
+            if embedded is not None:
+                return embedded, data_path[len(prefix):]
+    return datablock, data_path
+
+def create_scratch_action(target: ID, animation_data: AnimData) -> tuple[Action, bpy.types.bpy_prop_collection]:
+    """
+    Assigns a new scratch action to the animation data, and returns it with the collection to create its fcurves in.
+    Layered actions (Blender 4.4+) keep the fcurves in the channelbag of the slot animating the ID, legacy actions
+    keep them directly, and the legacy fcurves API is gone from Blender 5.0.
+    """
+    action = bpy.data.actions.new(SCRATCH_ACTION_NAME)
+    animation_data.action = action
+    if not hasattr(action, "layers"):
+        return action, action.fcurves
+    slot = action.slots.new(id_type=target.id_type, name=target.name)
+    animation_data.action_slot = slot
+    strip = action.layers.new("Layer").strips.new(type='KEYFRAME')
+    return action, strip.channelbag(slot, ensure=True).fcurves
+
+class AnimationBatch:
+    """
+    Renders a batch of parameter vectors as the frames of one animation render job, instead of one render job each.
+
+    Each matching variable is keyframed with one constant key per candidate, on scratch actions replacing the actions of
+    the animated IDs for the duration of the job, so that the render engine is set up once for the whole batch. Frames
+    start at the current frame, the scene must be static across the frames apart from the matching variables.
+    """
+    def __init__(self, work_dir: str):
+        self.work_dir = work_dir
+        self.pixel_buffers = image_comparison.PixelBuffers()
+        # (ID, had animation data, previous action, previous action slot, scratch action)
+        self.restore: list[tuple[ID, bool, Action | None, bpy.types.ActionSlot | None, Action]] = []
+
+    def keyframe(self, context: Context, xs: list[np.ndarray]):
+        """Keyframes the parameter vectors on consecutive frames from the current frame"""
+        self.clear()
+        frame_start = context.scene.frame_current
+        frames = np.arange(frame_start, frame_start + len(xs), dtype=np.float32)
+        values = np.array(xs, dtype=np.float32).reshape(len(xs), -1)
+        fcurves_by_target: dict[int, bpy.types.bpy_prop_collection] = {}
+        matching_properties: Iterable[MatchingProperty] = getattr(context.scene, MATCHING_PROPERTIES_PROPNAME)
+        for variable, matching_property in enumerate(matching_properties):
+            data_path, index = matching_variables.split_data_path_indexed(matching_property.data_path_indexed)
+            target, data_path = animated_target(matching_property.datablock, data_path)
+            fcurves = fcurves_by_target.get(target.as_pointer())
+            if fcurves is None:
+                had_animation_data = target.animation_data is not None
+                animation_data = target.animation_data or target.animation_data_create()
+                previous_action, previous_slot = animation_data.action, getattr(animation_data, "action_slot", None)
+                action, fcurves = create_scratch_action(target, animation_data)
+                fcurves_by_target[target.as_pointer()] = fcurves
+                self.restore.append((target, had_animation_data, previous_action, previous_slot, action))
+            fcurve = fcurves.new(data_path, index=max(index, 0))
+            fcurve.keyframe_points.add(len(xs))
+            fcurve.keyframe_points.foreach_set("co", np.column_stack([frames, values[:, variable]]).ravel())
+            for keyframe_point in fcurve.keyframe_points:
+                keyframe_point.interpolation = 'CONSTANT'
+            fcurve.update()
+
+    def render(self, context: Context, backend: RenderBackend, frames: int) -> list[str]:
+        """Renders the keyframed frames to the work directory, and returns the path of each frame"""
+        scene = context.scene
+        render = scene.render
+        image_settings = render.image_settings
+        frame_current = scene.frame_current
+        previous = (scene.frame_start, scene.frame_end, scene.frame_step, render.filepath, render.use_motion_blur, render.use_persistent_data,
+                    render.use_overwrite, render.use_file_extension, image_settings.file_format, image_settings.color_mode, image_settings.color_depth)
+        os.makedirs(self.work_dir, exist_ok=True)
+        try:
+            scene.frame_start, scene.frame_end, scene.frame_step = frame_current, frame_current + frames - 1, 1
+            render.filepath = os.path.join(self.work_dir, FRAME_FILE_PREFIX)
+            render.use_motion_blur = False # would blend neighboring candidates
+            render.use_persistent_data = True # keeps the render engine data between frames
+            render.use_overwrite = render.use_file_extension = True
+            # 8 bit PNGs load display encoded, like the file capture and the reference, 16 bit ones would load scene linear
+            image_settings.file_format, image_settings.color_mode, image_settings.color_depth = 'PNG', 'RGBA', '8'
+            backend.render(context, animation=True)
+            return [render.frame_path(frame=frame) for frame in range(frame_current, frame_current + frames)]
+        finally:
+            (scene.frame_start, scene.frame_end, scene.frame_step, render.filepath, render.use_motion_blur, render.use_persistent_data,
+             render.use_overwrite, render.use_file_extension, image_settings.file_format, image_settings.color_mode, image_settings.color_depth) = previous
+            scene.frame_set(frame_current)
+
+    def read(self, path: str) -> np.ndarray:
+        """Loads a rendered frame as a (height, width, 4) matrix, valid until the next read of a frame of the same size"""
+        image = bpy.data.images.load(path)
+        try:
+            return image_comparison.image_to_matrix(image, self.pixel_buffers)
+        finally:
+            bpy.data.images.remove(image)
+
+    def clear(self):
+        """Restores the actions replaced by the last keyframe call"""
+        for target, had_animation_data, previous_action, previous_slot, action in reversed(self.restore):
+            if had_animation_data:
+                target.animation_data.action = previous_action
+                if previous_slot is not None:
+                    target.animation_data.action_slot = previous_slot
+            else:
+                target.animation_data_clear()
+            bpy.data.actions.remove(action)
+        self.restore = []
+
+    def teardown(self):
+        self.clear()
+        self.pixel_buffers.clear()
@@ -0,0 +1,127 @@
+import scipy.optimize as opt
+from scipy.linalg import cho_factor, cho_solve, solve_triangular, LinAlgError
+from scipy.stats import norm, qmc
+import numpy as np
+
+# Gaussian process surrogate and expected improvement acquisition, working in the unit hypercube.
+
+LOG_LENGTHSCALE_BOUNDS = (np.log(1e-2), np.log(10.0))
+LOG_SIGNAL_BOUNDS = (np.log(1e-2), np.log(1e2))
+LOG_NOISE_BOUNDS = (np.log(1e-6), np.log(1.0)) # renders are noisy, let the likelihood decide how much
+JITTER = 1e-8
+
+def latin_hypercube(n: int, dimension: int, rng: np.random.Generator) -> np.ndarray:
+    if n <= 0:
+        return np.empty((0, dimension))
+    return qmc.LatinHypercube(d=dimension, seed=rng).random(n)
+
+def matern52(a: np.ndarray, b: np.ndarray, lengthscales: np.ndarray, signal: float) -> np.ndarray:
+    scaled_distance = np.sqrt(np.sum(((a[:, np.newaxis, :] - b[np.newaxis, :, :]) / lengthscales) ** 2, axis=-1)) * np.sqrt(5)
+    return signal * (1 + scaled_distance + scaled_distance ** 2 / 3) * np.exp(-scaled_distance)
+
+def finite_scores(y: np.ndarray) -> np.ndarray:
+    """Replaces infinite distances (no histogram overlap) by a value worse than every finite one"""
+    finite = np.isfinite(y)
+    if finite.all():
+        return y
+    if not finite.any():
+        return np.zeros_like(y)
+    worst = y[finite].max()
+    return np.where(finite, y, worst + max(np.ptp(y[finite]), 1.0))
+
+class GaussianProcess:
+    """Gaussian process regression with an ARD Matern 5/2 kernel, hyperparameters fitted by maximum likelihood"""
+    def __init__(self, dimension: int):
+        self.dimension = dimension
+        self.log_parameters = np.concatenate([np.full(dimension, np.log(0.3)), [0.0, np.log(1e-3)]])
+        self.x = np.empty((0, dimension))
+        self.y_mean = 0.0
+        self.y_std = 1.0
+        self.cholesky = None
+        self.alpha = None
+
+    @property
+    def lengthscales(self) -> np.ndarray:
+        return np.exp(self.log_parameters[:self.dimension])
+
+    @property
+    def signal(self) -> float:
+        return np.exp(self.log_parameters[self.dimension])
+
+    @property
+    def noise(self) -> float:
+        return np.exp(self.log_parameters[self.dimension + 1])
+
+    def fit(self, x: np.ndarray, y: np.ndarray, optimize_hyperparameters: bool = True):
+        self.x = x
+        self.y_mean = y.mean()
+        self.y_std = y.std() if y.std() > 0 else 1.0
+        standardized_y = (y - self.y_mean) / self.y_std
+        if optimize_hyperparameters and len(y) > 1:
+            bounds = [LOG_LENGTHSCALE_BOUNDS] * self.dimension + [LOG_SIGNAL_BOUNDS, LOG_NOISE_BOUNDS]
+            result = opt.minimize(self._negative_log_likelihood, self.log_parameters, args=(x, standardized_y), method="L-BFGS-B", bounds=bounds)
+            if np.isfinite(result.fun):
+                self.log_parameters = result.x
+        self.cholesky = cho_factor(self._covariance(x, self.log_parameters), lower=True)
+        self.alpha = cho_solve(self.cholesky, standardized_y)
+
+    def _covariance(self, x: np.ndarray, log_parameters: np.ndarray) -> np.ndarray:
+        lengthscales = np.exp(log_parameters[:self.dimension])
+        signal, noise = np.exp(log_parameters[self.dimension:])
+        return matern52(x, x, lengthscales, signal) + (noise + JITTER) * np.eye(len(x))
+
+    def _negative_log_likelihood(self, log_parameters: np.ndarray, x: np.ndarray, y: np.ndarray) -> float:
+        try:
+            cholesky = cho_factor(self._covariance(x, log_parameters), lower=True)
+        except LinAlgError:
+            return 1e10
+        alpha = cho_solve(cholesky, y)
+        return 0.5 * y @ alpha + np.sum(np.log(np.diag(cholesky[0]))) + 0.5 * len(y) * np.log(2 * np.pi)
+
+    def predict(self, x: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Returns the posterior mean and standard deviation, in the scale of the fitted scores"""
+        cross_covariance = matern52(x, self.x, self.lengthscales, self.signal)
+        mean = cross_covariance @ self.alpha
+        v = solve_triangular(self.cholesky[0], cross_covariance.T, lower=True)
+        variance = np.maximum(self.signal - np.sum(v ** 2, axis=0), 1e-12)
+        return self.y_mean + mean * self.y_std, np.sqrt(variance) * self.y_std
+
+def expected_improvement(gp: GaussianProcess, x: np.ndarray, best: float, xi: float = 0.01) -> np.ndarray:
+    """Expected improvement below best (scores are minimized)"""
+    mean, std = gp.predict(x)
+    improvement = best - mean - xi * gp.y_std
+    z = improvement / std
+    return improvement * norm.cdf(z) + std * norm.pdf(z)
+
+def maximize_expected_improvement(gp: GaussianProcess, best: float, best_x: np.ndarray, rng: np.random.Generator,
+                                  candidates: int = 2048, local_starts: int = 5) -> np.ndarray:
+    """Random and local candidates on the surrogate, refined with L-BFGS-B from the most promising ones"""
+    dimension = gp.dimension
+    random_candidates = rng.random((candidates, dimension))
+    local_candidates = np.clip(best_x + rng.normal(scale=0.05, size=(candidates // 4, dimension)), 0, 1)
+    all_candidates = np.vstack([random_candidates, local_candidates])
+    values = expected_improvement(gp, all_candidates, best)
+    best_candidate, best_value = all_candidates[np.argmax(values)], values.max()
+    for start in all_candidates[np.argsort(values)[-local_starts:]]:
+        result = opt.minimize(lambda x: -expected_improvement(gp, x[np.newaxis, :], best)[0], start, method="L-BFGS-B", bounds=[(0, 1)] * dimension)
+        if -result.fun > best_value:
+            best_candidate, best_value = result.x, -result.fun
+    return np.clip(best_candidate, 0, 1)
+
+def propose_batch(gp: GaussianProcess, x: np.ndarray, y: np.ndarray, batch_size: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    Proposes batch_size points to evaluate concurrently, with the constant liar heuristic: each proposal is added to the
+    data with the best observed score as a fake observation, so that the following proposals explore elsewhere.
+    gp must already be fitted on (x, y).
+    """
+    best = y.min()
+    best_x = x[np.argmin(y)]
+    proposals = []
+    for i in range(batch_size):
+        proposal = maximize_expected_improvement(gp, best, best_x, rng)
+        proposals.append(proposal)
+        if i < batch_size - 1:
+            x = np.vstack([x, proposal])
+            y = np.append(y, best)
+            gp.fit(x, y, optimize_hyperparameters=False)
+    return np.array(proposals)
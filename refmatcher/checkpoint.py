@@ -0,0 +1,117 @@
+from typing import TextIO
+import json
+import time
+import os
+import numpy as np
+
+CHECKPOINT_EXTENSION = ".checkpoint.ndjson"
+CHECKPOINT_VERSION = 2
+
+def render_key(x, fidelity_label: str) -> tuple:
+    return (tuple(float(value) for value in x), fidelity_label)
+
+class Checkpoint:
+    """
+    State of an optimization run appended as it goes, to resume it after a crash or a stop.
+
+    Runs are seeded, so an optimizer restarted with the same seed, initial parameters and bounds asks for the same
+    parameter vectors as long as it gets the same scores. The checkpoint keeps the score of every render, which is
+    replayed to the restarted optimizer instead of rendering again, until it reaches the point where the run stopped.
+    Optimizer specific state (DE population, annealing state) is saved as well, for inspection.
+
+    The file is NDJSON: a header record with the run settings, then one record per render, optimizer state or end
+    of run. Records are buffered and flushed every save_every records or save_interval seconds, so that saving costs
+    the same whatever the length of the run. A partially written last line, after a crash, is ignored by load.
+    """
+    def __init__(self, path: str, save_every: int = 10, save_interval: float = 30.0):
+        self.path = path
+        self.save_every = save_every
+        self.save_interval = save_interval
+        self.file: TextIO | None = None
+        self.unsaved = 0
+        self.last_save = 0.0
+
+    def start(self, signature: str, seed: int, x0: list[float], bounds: list[tuple[float, float]], renders: list | None = None):
+        """Starts a new checkpoint, with the renders of the resumed run if any"""
+        self.close()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temporary_path = self.path + ".tmp"
+        with open(temporary_path, 'w', encoding="utf-8") as checkpoint_file:
+            write_record(checkpoint_file, {
+                "type": "header",
+                "version": CHECKPOINT_VERSION,
+                "signature": signature,
+                "seed": seed,
+                "x0": [float(value) for value in x0],
+                "bounds": [[float(minimum), float(maximum)] for minimum, maximum in bounds],
+            })
+            for render in renders or []: # [x, fidelity label, score]
+                write_record(checkpoint_file, {"type": "render", "render": render})
+        os.replace(temporary_path, self.path) # the checkpoint being resumed is kept until its renders are copied
+        self.file = open(self.path, 'a', encoding="utf-8")
+        self.unsaved = 0
+        self.last_save = time.monotonic()
+
+    def _append(self, record: dict):
+        if self.file is None:
+            return
+        write_record(self.file, record)
+        self.unsaved += 1
+        if self.unsaved >= self.save_every or time.monotonic() - self.last_save >= self.save_interval:
+            self.save()
+
+    def add_render(self, x: np.ndarray, fidelity_label: str, score: float):
+        self._append({"type": "render", "render": [[float(value) for value in x], fidelity_label, float(score)]})
+
+    def set_optimizer_state(self, optimizer_state: dict):
+        self._append({"type": "optimizer_state", "optimizer_state": optimizer_state})
+
+    def save(self, finished: bool = False):
+        """Flushes the buffered records, finished marks the end of a run which has nothing left to resume"""
+        if self.file is None:
+            return
+        if finished:
+            write_record(self.file, {"type": "end", "finished": True})
+        self.file.flush()
+        self.unsaved = 0
+        self.last_save = time.monotonic()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+def write_record(checkpoint_file: TextIO, record: dict):
+    checkpoint_file.write(json.dumps(record, separators=(",", ":")) + "\n") # non-finite scores are written as Infinity, which json reads back
+
+def load(path: str) -> dict | None:
+    """Returns the saved state, or None if there is no valid checkpoint"""
+    try:
+        with open(path, 'rb') as checkpoint_file:
+            data = checkpoint_file.read()
+    except OSError:
+        return None
+    state = None
+    for line in data[:data.rfind(b"\n") + 1].splitlines(): # ignore a partially written last line
+        try:
+            record = json.loads(line)
+        except ValueError:
+            return None
+        if record.get("type") == "header":
+            if record.get("version") != CHECKPOINT_VERSION:
+                return None
+            state = {key: value for key, value in record.items() if key != "type"}
+            state.update(renders=[], optimizer_state={}, finished=False)
+        elif state is None:
+            return None
+        elif record["type"] == "render":
+            state["renders"].append(record["render"])
+        elif record["type"] == "optimizer_state":
+            state["optimizer_state"] = record["optimizer_state"]
+        elif record["type"] == "end":
+            state["finished"] = record["finished"]
+    return state
+
+def replay_table(state: dict) -> dict[tuple, float]:
+    """Scores of the checkpointed renders, by render_key"""
+    return {render_key(x, fidelity_label): score for x, fidelity_label, score in state["renders"]}
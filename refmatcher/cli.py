@@ -0,0 +1,283 @@
+import bpy
+from bpy.types import Context, Scene, Image
+from refmatcher import properties, optimization, matching_variables, workers, checkpoint, evaluation_archive
+import argparse
+import json
+import math
+import os
+import shutil
+import time
+import traceback
+
+# Headless batch matching, for render farm nodes:
+# blender -b scene.blend -P refmatcher_cli.py -- --job job.json
+# blender -b -P refmatcher_cli.py -- --queue queue.json --output summary.json
+#
+# A job is a JSON object:
+# {
+#     "blend": "scene.blend",                 optional, the file opened by Blender otherwise
+#     "scene": "Scene",                       optional, the active scene otherwise
+#     "reference": "reference.png",           optional, the scene reference image otherwise
+#     "variables": [                          optional, the scene matching variables otherwise
+#         {"collection": "objects", "datablock": "Cube", "data_path": "location[0]", "minimum": -1.0, "maximum": 1.0}
+#     ],
+#     "optimizer": "BAYESIAN", "iterations": 100, ...   optional, any key of JOB_SETTINGS
+#     "output": "result.json",                optional, next to the job file otherwise. The job checkpoint is written next to it
+#     "save_blend": true,                     optional, true saves the matched values in the .blend, a path saves a copy there
+#     "rescore": [{"channel": "LUMINANCE", "distance": "EARTH_MOVERS"}]   optional, best archived evaluation under other settings, with "archive": true
+# }
+# A queue is a JSON list of jobs, or of paths to job files. Relative paths are relative to the file they are written in.
+# The exit code is 0 if every job succeeded, 1 otherwise.
+
+JOB_SETTINGS = {
+    "optimizer": properties.OPTIMIZER_PROPNAME,
+    "iterations": properties.ITERATIONS_PROPNAME,
+    "channel": properties.CHANNEL_PROPNAME,
+    "distance": properties.DISTANCE_PROPNAME,
+    "capture": properties.CAPTURE_PROPNAME,
+    "histogram_threads": properties.HISTOGRAM_THREADS_PROPNAME,
+    "multi_fidelity": properties.MULTI_FIDELITY_PROPNAME,
+    "use_cache": properties.USE_CACHE_PROPNAME,
+    "workers": properties.WORKERS_PROPNAME,
+    "progressive": properties.PROGRESSIVE_PROPNAME,
+    "profile_slowest": properties.PROFILE_SLOWEST_PROPNAME,
+    "backend": properties.RENDER_BACKEND_PROPNAME,
+    "screening_backend": properties.SCREENING_BACKEND_PROPNAME,
+    "sensitivity_trajectories": properties.SENSITIVITY_TRAJECTORIES_PROPNAME,
+    "sensitivity_threshold": properties.SENSITIVITY_THRESHOLD_PROPNAME,
+    "hybrid_global": properties.HYBRID_GLOBAL_PROPNAME,
+    "hybrid_local": properties.HYBRID_LOCAL_PROPNAME,
+    "hybrid_global_fraction": properties.HYBRID_GLOBAL_FRACTION_PROPNAME,
+    "time_budget": properties.TIME_BUDGET_PROPNAME,
+    "animation_batches": properties.ANIMATION_BATCH_PROPNAME,
+    "archive": properties.ARCHIVE_PROPNAME,
+}
+
+class JobError(Exception):
+    pass
+
+def parse_arguments(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="refmatcher_cli.py", description="Runs Ref Matcher jobs in background Blender.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--job", nargs="+", help="Job JSON files, run one after another")
+    source.add_argument("--queue", help="Queue JSON file, a list of jobs or job file paths")
+    parser.add_argument("--output", help="Summary JSON of every job result")
+    parser.add_argument("--dashboard", action="store_true", help="Serve the progress dashboard while matching")
+    parser.add_argument("--resume", action="store_true", help="Resume a job from the checkpoint of its stopped or crashed run, if there is one")
+    parser.add_argument("--stop-on-error", action="store_true", help="Skip the remaining jobs after a failed one")
+    return parser.parse_args(argv)
+
+def read_json(path: str):
+    with open(path, encoding="utf-8") as json_file:
+        return json.load(json_file)
+
+def write_json(path: str, data):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding="utf-8") as json_file:
+        json.dump(data, json_file, indent=2)
+
+def load_jobs(args: argparse.Namespace) -> list[tuple[dict, str]]:
+    """Returns the jobs with the path of the file they come from, which relative paths are resolved against"""
+    if args.job:
+        return [(read_json(path), os.path.abspath(path)) for path in args.job]
+    queue_path = os.path.abspath(args.queue)
+    jobs = []
+    for entry in read_json(queue_path):
+        if isinstance(entry, str):
+            job_path = resolve_path(entry, queue_path)
+            jobs.append((read_json(job_path), job_path))
+        else:
+            jobs.append((entry, queue_path))
+    return jobs
+
+def resolve_path(path: str, relative_to_file: str) -> str:
+    return os.path.normpath(os.path.join(os.path.dirname(relative_to_file), bpy.path.native_pathsep(path)))
+
+def open_blend(path: str) -> bool:
+    """Opens the file, unless it is already the open one: consecutive jobs on the same file reuse its loaded data.
+    Returns True if the file was opened."""
+    if os.path.normcase(os.path.abspath(bpy.data.filepath or "")) == os.path.normcase(path):
+        return False
+    if not os.path.isfile(path):
+        raise JobError(f"No blend file {path}")
+    bpy.ops.wm.open_mainfile(filepath=path)
+    return True
+
+def get_scene(name: str | None) -> Scene:
+    if name is None:
+        return bpy.context.scene
+    scene = bpy.data.scenes.get(name)
+    if scene is None:
+        raise JobError(f"No scene {name}")
+    return scene
+
+def snapshot_scene(scene: Scene) -> dict:
+    """State changed by a job, restored afterwards so that consecutive jobs on the same file are independent"""
+    matching_properties = getattr(scene, properties.MATCHING_PROPERTIES_PROPNAME)
+    return {
+        "settings": {propname: getattr(scene, propname) for propname in JOB_SETTINGS.values()},
+        "reference": getattr(scene, properties.REFERENCE_IMAGE_PROPNAME),
+        "variables": [(matching_property.datablock, matching_property.data_path_indexed, matching_property.minimum, matching_property.maximum,
+                       matching_variables.get_value(matching_property.datablock, matching_property.data_path_indexed))
+                      for matching_property in matching_properties],
+    }
+
+def restore_scene(context: Context, snapshot: dict, job_initial_values: list[tuple]):
+    scene = context.scene
+    for propname, value in snapshot["settings"].items():
+        setattr(scene, propname, value)
+    setattr(scene, properties.REFERENCE_IMAGE_PROPNAME, snapshot["reference"])
+    # values of the job variables first, then the variables of the file with their values before the job
+    for datablock, data_path_indexed, value in job_initial_values:
+        matching_variables.set_value(datablock, data_path_indexed, value)
+    getattr(scene, properties.MATCHING_PROPERTIES_PROPNAME).clear()
+    for datablock, data_path_indexed, minimum, maximum, value in snapshot["variables"]:
+        matching_variables.add_matching_variable(context, datablock, data_path_indexed, minimum, maximum)
+        matching_variables.set_value(datablock, data_path_indexed, value)
+
+def apply_job(context: Context, job: dict, job_path: str):
+    scene = context.scene
+    for key, propname in JOB_SETTINGS.items():
+        if key in job:
+            try:
+                setattr(scene, propname, job[key])
+            except (TypeError, ValueError) as error:
+                raise JobError(f"Invalid {key}: {error}")
+    if "reference" in job:
+        reference_path = resolve_path(job["reference"], job_path)
+        if not os.path.isfile(reference_path):
+            raise JobError(f"No reference image {reference_path}")
+        reference: Image = bpy.data.images.load(reference_path, check_existing=True)
+        setattr(scene, properties.REFERENCE_IMAGE_PROPNAME, reference)
+    if getattr(scene, properties.REFERENCE_IMAGE_PROPNAME) is None:
+        raise JobError("No reference image")
+    if "variables" in job:
+        getattr(scene, properties.MATCHING_PROPERTIES_PROPNAME).clear()
+        for variable in job["variables"]:
+            try:
+                datablock = getattr(bpy.data, variable["collection"])[variable["datablock"]]
+                matching_variables.add_matching_variable(context, datablock, variable["data_path"], variable["minimum"], variable["maximum"])
+            except (AttributeError, KeyError, TypeError) as error:
+                raise JobError(f"Invalid variable {variable}: {error!r}")
+    if len(getattr(scene, properties.MATCHING_PROPERTIES_PROPNAME)) == 0:
+        raise JobError("No matching variables")
+    if not matching_variables.check_matching_values(context):
+        raise JobError("A matching variable can't be resolved")
+
+def current_values(context: Context) -> list[tuple]:
+    return [(matching_property.datablock, matching_property.data_path_indexed,
+             matching_variables.get_value(matching_property.datablock, matching_property.data_path_indexed))
+            for matching_property in getattr(context.scene, properties.MATCHING_PROPERTIES_PROPNAME)]
+
+def variable_results(context: Context) -> list[dict]:
+    return [{"id_type": datablock.id_type, "datablock": datablock.name, "data_path": data_path_indexed, "value": value}
+            for datablock, data_path_indexed, value in current_values(context)]
+
+def rescore_results(context: Context, rescores: list[dict]) -> list[dict]:
+    """Best archived evaluation of the job under each channel and distance combination"""
+    results = []
+    for rescore in rescores:
+        channel = rescore.get("channel", getattr(context.scene, properties.CHANNEL_PROPNAME))
+        distance = rescore.get("distance", getattr(context.scene, properties.DISTANCE_PROPNAME))
+        try:
+            xs, scores, full_quality = optimization.rescore_archive(context, channel, distance)
+        except (ValueError, KeyError) as error:
+            raise JobError(f"Can't rescore with {channel} {distance}: {error}")
+        best = evaluation_archive.best_evaluation(scores, full_quality)
+        results.append({
+            "channel": channel,
+            "distance": distance,
+            "evaluations": len(scores),
+            "best_evaluation": best,
+            "best_score": float(scores[best]) if best is not None else None,
+            "x": [float(value) for value in xs[best]] if best is not None else None,
+        })
+    return results
+
+def run_job(job: dict, job_path: str, args: argparse.Namespace, previous_optimizer: optimization.Optimizer | None) -> tuple[dict, optimization.Optimizer | None]:
+    """Runs a job and returns its result, with the optimizer whose reference profile can be reused by the next job"""
+    start = time.time()
+    name = job.get("name", os.path.splitext(os.path.basename(job_path))[0])
+    output_path = resolve_path(job["output"], job_path) if "output" in job else os.path.splitext(job_path)[0] + ".result.json"
+    result = {"name": name, "job": job_path, "output": output_path}
+    optimizer = None
+    try:
+        if "blend" in job and open_blend(resolve_path(job["blend"], job_path)):
+            previous_optimizer = None # its reference image is gone with the previous file
+        scene = get_scene(job.get("scene"))
+        with bpy.context.temp_override(scene=scene):
+            context = bpy.context
+            snapshot = snapshot_scene(scene)
+            job_initial_values = []
+            try:
+                apply_job(context, job, job_path)
+                job_initial_values = current_values(context)
+                # next to the job output, so that jobs of a queue and jobs run concurrently have their own checkpoint
+                checkpoint_path = os.path.splitext(output_path)[0] + checkpoint.CHECKPOINT_EXTENSION
+                optimizer = optimization.create_optimizer(context, dashboard=args.dashboard, checkpoint_path=checkpoint_path)
+                if previous_optimizer is not None:
+                    optimizer.reference_profile = previous_optimizer.reference_profile # kept if still valid for this job
+                state = checkpoint.load(checkpoint_path) if args.resume else None
+                if state is not None and not state.get("finished"):
+                    try:
+                        optimizer.resume(state)
+                        print(f"Resuming {name} from its checkpoint.")
+                    except ValueError as error:
+                        print(f"Not resuming {name}: {error}")
+                x = optimizer.optimize()
+                matching_variables.set_matching_values(context, x)
+                result.update({
+                    "status": "success",
+                    "x": [float(value) for value in x],
+                    "best_score": float(optimizer.lowest_score) if math.isfinite(optimizer.lowest_score) else None,
+                    "evaluations": optimizer.current_iteration,
+                    "stopped": optimizer.stop,
+                    "variables": variable_results(context),
+                    "sensitivity": [{"variable": name, "sensitivity": value, "frozen": frozen} for name, value, frozen in optimizer.sensitivity_ranking()],
+                })
+                if "rescore" in job:
+                    result["rescores"] = rescore_results(context, job["rescore"])
+                if os.path.isfile(optimization.LOG_PATH):
+                    log_path = os.path.splitext(output_path)[0] + ".ndjson"
+                    os.makedirs(os.path.dirname(log_path), exist_ok=True)
+                    shutil.copy(optimization.LOG_PATH, log_path)
+                    result["log"] = log_path
+                save_blend = job.get("save_blend", False)
+                if save_blend is True:
+                    bpy.ops.wm.save_mainfile()
+                    result["saved_blend"] = bpy.data.filepath
+                elif save_blend:
+                    saved_path = resolve_path(save_blend, job_path)
+                    bpy.ops.wm.save_as_mainfile(filepath=saved_path, copy=True)
+                    result["saved_blend"] = saved_path
+            finally:
+                restore_scene(context, snapshot, job_initial_values)
+    except JobError as error:
+        result.update(status="failed", error=str(error))
+    except Exception as error:
+        result.update(status="failed", error=repr(error), traceback=traceback.format_exc())
+    result["duration_s"] = round(time.time() - start, 3)
+    write_json(output_path, result)
+    print(f"Job {name}: {result['status']}" + (f", {result['error']}" if "error" in result else f", best score {result['best_score']}"))
+    return result, optimizer
+
+def main(argv: list[str]) -> int:
+    args = parse_arguments(argv)
+    workers.ensure_registered()
+    try:
+        jobs = load_jobs(args)
+    except (OSError, ValueError) as error:
+        print(f"Can't read jobs: {error}")
+        return 1
+    results = []
+    optimizer = None
+    for job, job_path in jobs:
+        result, optimizer = run_job(job, job_path, args, optimizer)
+        results.append(result)
+        if result["status"] != "success" and args.stop_on_error:
+            break
+    succeeded = sum(result["status"] == "success" for result in results)
+    print(f"{succeeded} of {len(jobs)} jobs succeeded.")
+    if args.output:
+        write_json(args.output, results)
+    return 0 if succeeded == len(jobs) else 1
@@ -0,0 +1,67 @@
+from collections import deque
+import numpy as np
+
+class CostModel:
+    """
+    Wall clock cost of evaluations, for remaining time estimates and time budgets.
+
+    Render costs (the timed phases of rendered evaluations) are fitted with a ridge regression on the normalized
+    parameters, since render time often depends on them (samples, subdivisions, light bounces, volumes...). Costs are
+    predicted in the region the optimizer explored lately, where its next candidates are. Time spent outside of
+    renders (optimizer, logging, cache hits) is spread evenly over evaluations.
+    """
+    def __init__(self, bounds: list[tuple[float, float]], window: int = 100, recent: int = 10, regularization: float = 1e-2):
+        lower, upper = np.array(bounds, dtype=float).reshape(-1, 2).T
+        self.lower = lower
+        self.span = np.where(upper > lower, upper - lower, 1.0)
+        self.recent = recent
+        self.regularization = regularization
+        self.points: deque[np.ndarray] = deque(maxlen=window)
+        self.render_costs: deque[float] = deque(maxlen=window)
+        self.total_render_cost = 0.0
+        self.renders = 0
+        self.coefficients: np.ndarray | None = None
+
+    def record(self, x: np.ndarray, render_cost: float):
+        self.points.append((np.asarray(x, dtype=float) - self.lower) / self.span)
+        self.render_costs.append(render_cost)
+        self.total_render_cost += render_cost
+        self.renders += 1
+        self.coefficients = None
+
+    def _fit(self) -> np.ndarray | None:
+        """Intercept and slopes, None until there are more renders than coefficients"""
+        if self.coefficients is None and len(self.render_costs) > len(self.lower) + 1:
+            design = np.column_stack([np.ones(len(self.points)), np.array(self.points)])
+            penalty = self.regularization * len(self.points) * np.eye(design.shape[1])
+            penalty[0, 0] = 0 # the mean cost is not shrunk
+            self.coefficients = np.linalg.solve(design.T @ design + penalty, design.T @ np.array(self.render_costs))
+        return self.coefficients
+
+    def _predict_points(self, points: np.ndarray) -> np.ndarray:
+        if not self.render_costs:
+            return np.zeros(len(points))
+        coefficients = self._fit()
+        if coefficients is None:
+            return np.full(len(points), np.mean(self.render_costs))
+        return np.maximum(coefficients[0] + points @ coefficients[1:], min(self.render_costs))
+
+    def predict(self, xs: list[np.ndarray]) -> np.ndarray:
+        """Render cost of each parameter vector"""
+        return self._predict_points((np.array(xs, dtype=float).reshape(len(xs), -1) - self.lower) / self.span)
+
+    def _costs(self, render_costs: np.ndarray, elapsed: float, evaluations: int) -> np.ndarray:
+        if evaluations == 0:
+            return render_costs
+        overhead = max(elapsed - self.total_render_cost, 0.0) / evaluations
+        return self.renders / evaluations * render_costs + overhead
+
+    def costs(self, xs: list[np.ndarray], elapsed: float, evaluations: int) -> np.ndarray:
+        """Expected wall clock cost of evaluating each parameter vector"""
+        return self._costs(self.predict(xs), elapsed, evaluations)
+
+    def expected_cost(self, elapsed: float, evaluations: int) -> float:
+        """Expected wall clock cost of the next evaluations, 0 before any measurement"""
+        if not self.points:
+            return elapsed / evaluations if evaluations > 0 else 0.0
+        return float(np.mean(self._costs(self._predict_points(np.array(self.points)[-self.recent:]), elapsed, evaluations)))
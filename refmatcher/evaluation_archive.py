@@ -0,0 +1,127 @@
+from typing import Iterable, Iterator
+import numpy as np
+import json
+import time
+import os
+import shutil
+
+METADATA_FILENAME = "archive.json"
+CHUNK_SIZE = 1024
+CHUNK_SUFFIXES = ("_x.npy", "_histograms.npy", "_full_quality.npy")
+
+class EvaluationArchive:
+    """
+    Parameter vectors and histograms of the rendered evaluations of a run, to score them again under another channel
+    or distance without rendering.
+
+    Evaluations are buffered and written as .npy chunks of chunk_size evaluations: the (evaluations, variables)
+    parameters, the (evaluations, channels, bins) histograms and the full quality flags. The chunk being filled is
+    rewritten every save_interval seconds, so that a crash loses at most that much of the archive. Chunks are read
+    back memory-mapped, so that large archives are scored chunk by chunk without being loaded at once.
+    """
+    def __init__(self, directory: str, chunk_size: int = CHUNK_SIZE, save_interval: float = 30.0):
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.save_interval = save_interval
+        self.xs: list[np.ndarray] = []
+        self.histograms: list[np.ndarray] = []
+        self.full_quality: list[bool] = []
+        self.unsaved = False
+        self.last_save = 0.0
+        self.chunks = 0
+        self.evaluations = 0
+
+    def open(self, run: str, channels: Iterable[str], variable_names: Iterable[str], region_key: tuple | None, reference_name: str, resume: bool = False):
+        """
+        Starts a new archive, a new run replaces the archive of the previous one. A resumed run appends to the archive
+        of the run it resumes, identified by run, which already holds the evaluations replayed from its checkpoint.
+        """
+        # through json, so that the metadata compares equal to the one read back
+        metadata = json.loads(json.dumps({"run": run, "channels": list(channels), "variables": list(variable_names),
+                                          "region": region_key, "reference": reference_name}))
+        self.xs, self.histograms, self.full_quality = [], [], []
+        self.unsaved = False
+        self.last_save = time.monotonic()
+        self.chunks = 0
+        self.evaluations = 0
+        if resume and read_metadata(self.directory) == metadata:
+            for chunk_xs, chunk_histograms, chunk_full_quality in read_chunks(self.directory):
+                self.evaluations += len(chunk_xs)
+                if len(chunk_xs) < self.chunk_size: # the last chunk, which is filled further
+                    self.xs, self.histograms, self.full_quality = list(np.array(chunk_xs)), list(np.array(chunk_histograms)), [bool(flag) for flag in chunk_full_quality]
+                else:
+                    self.chunks += 1
+            return
+        shutil.rmtree(self.directory, ignore_errors=True)
+        os.makedirs(self.directory)
+        with open(os.path.join(self.directory, METADATA_FILENAME), 'w', encoding="utf-8") as metadata_file:
+            json.dump(metadata, metadata_file)
+
+    def append(self, x: np.ndarray, histograms: np.ndarray, is_full_quality: bool):
+        self.xs.append(np.asarray(x, dtype=np.float64))
+        self.histograms.append(np.asarray(histograms, dtype=np.float32))
+        self.full_quality.append(is_full_quality)
+        self.evaluations += 1
+        self.unsaved = True
+        if len(self.xs) >= self.chunk_size or time.monotonic() - self.last_save >= self.save_interval:
+            self.flush()
+
+    def flush(self):
+        """Writes the chunk being filled, and starts the next one if it is full"""
+        if self.unsaved:
+            prefix = os.path.join(self.directory, f"{self.chunks:05d}")
+            for suffix, array in zip(CHUNK_SUFFIXES, (np.stack(self.xs), np.stack(self.histograms), np.array(self.full_quality, dtype=bool))):
+                save_array(prefix + suffix, array)
+            self.unsaved = False
+            self.last_save = time.monotonic()
+        if len(self.xs) >= self.chunk_size:
+            self.xs, self.histograms, self.full_quality = [], [], []
+            self.chunks += 1
+
+    def close(self):
+        self.flush()
+
+def save_array(path: str, array: np.ndarray):
+    """Replaces the .npy file at once, so that a crash leaves either the previous or the new array"""
+    temporary_path = path + ".tmp"
+    with open(temporary_path, 'wb') as array_file:
+        np.save(array_file, array)
+    os.replace(temporary_path, path)
+
+def read_metadata(directory: str) -> dict | None:
+    path = os.path.join(directory, METADATA_FILENAME)
+    if not os.path.isfile(path):
+        return None
+    with open(path, encoding="utf-8") as metadata_file:
+        return json.load(metadata_file)
+
+def read_chunks(directory: str) -> Iterator[tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """Memory-mapped (parameters, histograms, full quality flags) of each chunk of the archive, in evaluation order"""
+    chunk = 0
+    while all(os.path.isfile(os.path.join(directory, f"{chunk:05d}{suffix}")) for suffix in CHUNK_SUFFIXES):
+        prefix = os.path.join(directory, f"{chunk:05d}")
+        arrays = [np.load(prefix + suffix, mmap_mode='r') for suffix in CHUNK_SUFFIXES]
+        length = min(len(array) for array in arrays) # a crash between the writes of a chunk leaves arrays of different lengths
+        yield tuple(array[:length] for array in arrays)
+        chunk += 1
+
+def rescore(directory: str, score_batch) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Scores every archived evaluation with score_batch, which takes a (evaluations, channels, bins) stack of histograms,
+    like ReferenceProfile.compare_histograms_batch. Returns the parameters, the scores and the full quality flags.
+    """
+    xs, scores, full_quality = [], [], []
+    for chunk_xs, chunk_histograms, chunk_full_quality in read_chunks(directory):
+        xs.append(np.asarray(chunk_xs))
+        scores.append(score_batch(chunk_histograms))
+        full_quality.append(np.asarray(chunk_full_quality))
+    if not xs:
+        return np.empty((0, 0)), np.empty(0), np.empty(0, dtype=bool)
+    return np.concatenate(xs), np.concatenate(scores), np.concatenate(full_quality)
+
+def best_evaluation(scores: np.ndarray, full_quality: np.ndarray) -> int | None:
+    """Index of the lowest finite score, among full quality renders if there are any, None if there is none"""
+    candidates = full_quality & np.isfinite(scores) if np.any(full_quality & np.isfinite(scores)) else np.isfinite(scores)
+    if not np.any(candidates):
+        return None
+    return int(np.flatnonzero(candidates)[np.argmin(scores[candidates])])
@@ -0,0 +1,95 @@
+from typing import Iterable
+import numpy as np
+import hashlib
+import sqlite3
+import time
+import os
+
+def fingerprint(parts: Iterable) -> str:
+    """Hashes everything, other than the matching variables, that the score of an evaluation depends on"""
+    sha = hashlib.sha1()
+    for part in parts:
+        sha.update(part if isinstance(part, bytes) else repr(part).encode())
+        sha.update(b"\0")
+    return sha.hexdigest()
+
+class EvaluationCache:
+    """
+    Persistent cache of evaluation scores, stored in a SQLite database.
+
+    Keys combine a fingerprint of the evaluation settings with the parameter vector quantized to the given steps,
+    so that numerically indistinguishable vectors share an entry. Least recently used entries are evicted above max_entries,
+    a tenth of max_entries at a time. Changes are written on commit, once per batch of evaluations, and on close.
+    """
+    def __init__(self, path: str, max_entries: int = 100000, store_histograms: bool = False):
+        self.path = path
+        self.max_entries = max_entries
+        self.store_histograms = store_histograms
+        self.connection: sqlite3.Connection | None = None
+        self.entries = 0 # upper bound of the entry count, puts replacing an entry count as new ones
+        self.hits = 0
+        self.misses = 0
+
+    def open(self):
+        if self.connection is not None:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.connection = sqlite3.connect(self.path)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS evaluations (key TEXT PRIMARY KEY, score REAL, histograms BLOB, shape TEXT, last_used REAL)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS evaluations_last_used ON evaluations (last_used)")
+        self.connection.commit()
+        self.entries = self.connection.execute("SELECT COUNT(*) FROM evaluations").fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+
+    def commit(self):
+        if self.connection is not None:
+            self.connection.commit()
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.commit()
+            self.connection.close()
+            self.connection = None
+
+    @staticmethod
+    def key(fingerprint: str, x: Iterable[float], steps: Iterable[float]) -> str:
+        quantized = [int(round(value / step)) for value, step in zip(x, steps)]
+        return fingerprint + ":" + ",".join(map(str, quantized))
+
+    def get(self, key: str) -> tuple[float, np.ndarray | None] | None:
+        row = self.connection.execute("SELECT score, histograms, shape FROM evaluations WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.connection.execute("UPDATE evaluations SET last_used = ? WHERE key = ?", (time.time(), key))
+        score, histograms_blob, shape = row
+        histograms = None
+        if histograms_blob is not None:
+            histograms = np.frombuffer(histograms_blob, dtype=np.float32).reshape(tuple(int(size) for size in shape.split(",")))
+        return score, histograms
+
+    def put(self, key: str, score: float, histograms: np.ndarray | None = None):
+        histograms_blob, shape = None, None
+        if self.store_histograms and histograms is not None:
+            histograms_blob = histograms.astype(np.float32).tobytes()
+            shape = ",".join(map(str, histograms.shape))
+        self.connection.execute("INSERT OR REPLACE INTO evaluations VALUES (?, ?, ?, ?, ?)", (key, score, histograms_blob, shape, time.time()))
+        self.entries += 1
+        if self.entries > self.max_entries:
+            self.entries = self.connection.execute("SELECT COUNT(*) FROM evaluations").fetchone()[0]
+            if self.entries > self.max_entries:
+                evicted = self.entries - self.max_entries + self.max_entries // 10
+                self.connection.execute("DELETE FROM evaluations WHERE key IN (SELECT key FROM evaluations ORDER BY last_used LIMIT ?)", (evicted,))
+                self.entries -= evicted
+
+    def clear(self):
+        opened = self.connection is None
+        self.open()
+        self.connection.execute("DELETE FROM evaluations")
+        self.connection.commit()
+        self.entries = 0
+        self.connection.execute("VACUUM")
+        if opened:
+            self.close()
@@ -0,0 +1,72 @@
+from typing import Iterable, TextIO
+import json
+import time
+import csv
+import os
+
+LOG_FILENAME = "evaluations.ndjson"
+
+class EvaluationLog:
+    """
+    Append-only log of evaluations, one JSON record per line.
+
+    Records are buffered and flushed every flush_every records or flush_interval seconds, whichever comes first.
+    Readers only consume complete lines, so the log can be read while it is written.
+    """
+    def __init__(self, path: str, flush_every: int = 10, flush_interval: float = 1.0):
+        self.path = path
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.file = None
+        self.pending = 0
+        self.last_flush = 0.0
+
+    def open(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.file = open(self.path, 'w', encoding="utf-8") # a new run starts a new log
+        self.pending = 0
+        self.last_flush = time.monotonic()
+
+    def append(self, record: dict):
+        self.file.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self.pending += 1
+        if self.pending >= self.flush_every or time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        if self.file is not None:
+            self.file.flush()
+            self.pending = 0
+            self.last_flush = time.monotonic()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+def read_records(path: str, offset: int = 0) -> tuple[list[dict], int]:
+    """Reads the complete records written after byte offset, and returns them with the offset to read from next time"""
+    if not os.path.isfile(path):
+        return [], 0
+    if offset > os.path.getsize(path): # the log was restarted by a new run
+        offset = 0
+    with open(path, 'rb') as log_file:
+        log_file.seek(offset)
+        data = log_file.read()
+    end = data.rfind(b"\n") + 1 # ignore a partially written last line
+    records = [json.loads(line) for line in data[:end].splitlines() if line]
+    return records, offset + end
+
+def write_csv(csv_file: TextIO, records: Iterable[dict]):
+    """Writes evaluation records as CSV, with one column per parameter"""
+    records = list(records)
+    parameter_count = max((len(record["x"]) for record in records), default=0)
+    writer = csv.writer(csv_file)
+    writer.writerow(["iteration", "time", "score", "fidelity", "full_quality"] + [f"x{i}" for i in range(parameter_count)])
+    for record in records:
+        writer.writerow([record["iteration"], record["time"], record["score"], record["fidelity"], record["full_quality"]] + record["x"])
+
+def export_csv(log_path: str, csv_path: str):
+    records, _ = read_records(log_path)
+    with open(csv_path, 'w', newline="") as csv_file:
+        write_csv(csv_file, records)
@@ -0,0 +1,148 @@
+from bpy.types import Scene
+from typing import NamedTuple
+import numpy as np
+
+EEVEE_ENGINES = {'BLENDER_EEVEE', 'BLENDER_EEVEE_NEXT'}
+
+class Fidelity(NamedTuple):
+    resolution_percentage: int
+    samples: int | None # None when the render engine has no sample count (Workbench)
+    engine: str | None = None # render engine of the sample count, the samples of other engines are left alone
+
+    def label(self) -> str:
+        return f"{self.resolution_percentage}%" + (f", {self.samples} samples" if self.samples is not None else "")
+
+def get_samples(scene: Scene) -> int | None:
+    engine = scene.render.engine
+    if engine == 'CYCLES':
+        return scene.cycles.samples
+    if engine in EEVEE_ENGINES:
+        return scene.eevee.taa_render_samples
+    return None
+
+def set_samples(scene: Scene, samples: int | None, samples_engine: str | None = None):
+    """Sets the sample count of the scene engine, unless it is the sample count of another engine"""
+    engine = scene.render.engine
+    if samples is None or (samples_engine is not None and samples_engine != engine):
+        return
+    if engine == 'CYCLES':
+        scene.cycles.samples = samples
+    elif engine in EEVEE_ENGINES:
+        scene.eevee.taa_render_samples = samples
+
+def get_fidelity(scene: Scene) -> Fidelity:
+    return Fidelity(scene.render.resolution_percentage, get_samples(scene), scene.render.engine)
+
+def apply_fidelity(scene: Scene, fidelity: Fidelity):
+    """Applies the resolution, and the sample count if the scene renders with its engine: a render backend switching
+    the engine (EEVEE renders of a Cycles scene) renders with the samples of its own engine"""
+    if scene.render.resolution_percentage != fidelity.resolution_percentage:
+        scene.render.resolution_percentage = fidelity.resolution_percentage
+    if get_samples(scene) != fidelity.samples:
+        set_samples(scene, fidelity.samples, fidelity.engine)
+
+class FidelityStage(NamedTuple):
+    until_progress: float # fraction of the evaluation budget until which this stage is used
+    resolution_factor: float # relative to the scene resolution percentage
+    max_samples: int
+
+DEFAULT_STAGES = (
+    FidelityStage(0.3, 0.25, 16),
+    FidelityStage(0.7, 0.5, 64),
+)
+
+class FidelitySchedule:
+    """
+    Coarse-to-fine render settings along an optimization run.
+
+    Early evaluations are rendered with reduced resolution and samples, the final stretch of the run at full fidelity.
+    Scores are kept per fidelity since they are not comparable across fidelities. A reduced fidelity candidate is
+    promising when it ranks in the best promote_fraction of its fidelity, and should then be confirmed by a full render.
+    """
+    def __init__(self, full_fidelity: Fidelity, stages: tuple[FidelityStage, ...] = DEFAULT_STAGES, promote_fraction: float = 0.1):
+        self.full_fidelity = full_fidelity
+        self.stages = stages
+        self.promote_fraction = promote_fraction
+        self.scores: dict[Fidelity, list[float]] = {}
+
+    def fidelity_at(self, progress: float) -> Fidelity:
+        for stage in self.stages:
+            if progress < stage.until_progress:
+                resolution_percentage = max(int(round(self.full_fidelity.resolution_percentage * stage.resolution_factor)), 1)
+                samples = min(self.full_fidelity.samples, stage.max_samples) if self.full_fidelity.samples is not None else None
+                return self.full_fidelity._replace(resolution_percentage=resolution_percentage, samples=samples)
+        return self.full_fidelity
+
+    def is_full(self, fidelity: Fidelity) -> bool:
+        return fidelity == self.full_fidelity
+
+    def is_promising(self, fidelity: Fidelity, score: float) -> bool:
+        """Check if score ranks in the best promote_fraction of the scores recorded for this fidelity. Call after recording
+        score and the rest of its batch, so that candidates are ranked within their batch as well."""
+        scores = self.scores.get(fidelity)
+        if not scores:
+            return True
+        return score <= np.quantile(scores, self.promote_fraction)
+
+    def record(self, fidelity: Fidelity, score: float):
+        self.scores.setdefault(fidelity, []).append(score)
+
+    def render_count(self) -> int:
+        return sum(len(scores) for scores in self.scores.values())
+
+class ProgressiveScreening:
+    """
+    Early abort of clearly losing candidates: each candidate is first rendered with few samples, or with a faster
+    render backend, and only rendered at full quality if its screening score is not worse than the incumbent by more
+    than the margin.
+
+    Screening scores are biased and noisy compared to full quality scores. Both are calibrated on survivors, which
+    are rendered at both fidelities: the margin grows with the observed noise, and rejected candidates are given
+    their bias corrected screening score.
+    """
+    def __init__(self, full_fidelity: Fidelity, screening_samples: int = 16, margin: float = 0.05, noise_factor: float = 2.0, calibration_samples: int = 3, screening_fidelity: Fidelity | None = None):
+        self.full_fidelity = full_fidelity
+        self.fidelity = screening_fidelity or full_fidelity._replace(samples=min(full_fidelity.samples, screening_samples))
+        self.margin = margin
+        self.noise_factor = noise_factor
+        self.calibration_samples = calibration_samples
+        self.differences: list[float] = [] # screening score - full score, of survivors
+        self.screened = 0
+        self.aborted = 0
+        self.screening_time = 0.0
+        self.full_time = 0.0
+        self.full_renders = 0
+
+    @property
+    def bias(self) -> float:
+        finite_differences = [difference for difference in self.differences if np.isfinite(difference)]
+        return float(np.mean(finite_differences)) if finite_differences else 0.0
+
+    @property
+    def noise(self) -> float:
+        finite_differences = [difference for difference in self.differences if np.isfinite(difference)]
+        return float(np.std(finite_differences)) if len(finite_differences) > 1 else 0.0
+
+    def estimate(self, screening_score: float) -> float:
+        """Estimated full quality score of a screened candidate"""
+        return screening_score - self.bias
+
+    def is_losing(self, screening_score: float, incumbent: float) -> bool:
+        if len(self.differences) < self.calibration_samples or not np.isfinite(incumbent):
+            return False
+        return self.estimate(screening_score) > incumbent + max(self.margin, self.noise_factor * self.noise)
+
+    def calibrate(self, screening_score: float, full_score: float):
+        self.differences.append(screening_score - full_score)
+
+    def record(self, screened: int, aborted: int, screening_time: float, full_time: float):
+        self.screened += screened
+        self.aborted += aborted
+        self.screening_time += screening_time
+        self.full_time += full_time
+        self.full_renders += screened - aborted
+
+    def time_saved(self) -> float:
+        """Full renders skipped, minus the time spent on screening renders"""
+        mean_full_time = self.full_time / self.full_renders if self.full_renders > 0 else 0.0
+        return self.aborted * mean_full_time - self.screening_time
@@ -17,6 +17,8 @@ class REFMATCHER_UL_MatchingProperties(UIList):
         readonly.prop(item, "data_path_indexed", text="")
         layout.prop(item, "minimum", text="Min")
         layout.prop(item, "maximum", text="Max")
+        if item.sensitivity >= 0: # screened by the last match
+            layout.label(text=f"{item.sensitivity:.2f}", icon='FREEZE' if item.frozen else 'NONE')
 
 class REFMATCHER_PT_MainPanel(Panel):
     bl_idname = "REFMATCHER_PT_MainPanel"
@@ -48,10 +50,16 @@ class REFMATCHER_PT_MainPanel(Panel):
         interactive_layout = layout.column(align=True)
         interactive_layout.enabled = dependencies_ok
         interactive_layout.label(text="Parameters")
-        interactive_layout.prop(context.scene, properties.ITERATIONS_PROPNAME)
+        iterations_row = interactive_layout.row(align=True)
+        iterations_row.prop(context.scene, properties.ITERATIONS_PROPNAME)
+        iterations_row.prop(context.scene, properties.TIME_BUDGET_PROPNAME)
         interactive_layout.prop(context.scene, properties.CHANNEL_PROPNAME)
         interactive_layout.prop(context.scene, properties.DISTANCE_PROPNAME)
         interactive_layout.prop(context.scene, properties.OPTIMIZER_PROPNAME)
+        if getattr(context.scene, properties.OPTIMIZER_PROPNAME) == 'HYBRID':
+            interactive_layout.prop(context.scene, properties.HYBRID_GLOBAL_PROPNAME)
+            interactive_layout.prop(context.scene, properties.HYBRID_LOCAL_PROPNAME)
+            interactive_layout.prop(context.scene, properties.HYBRID_GLOBAL_FRACTION_PROPNAME)
         interactive_layout.separator()
 
         interactive_layout.label(text="Reference")
@@ -63,7 +71,70 @@ class REFMATCHER_PT_MainPanel(Panel):
         interactive_layout.operator(operators.REFMATCHER_OT_RemoveMatchingVariableFromList.bl_idname, icon='REMOVE', text="")
         interactive_layout.separator()
 
-        interactive_layout.operator(operators.REFMATCHER_OT_MatchReference.bl_idname)
+        match_row = interactive_layout.row(align=True)
+        match_row.operator(operators.REFMATCHER_OT_MatchReference.bl_idname)
+        match_row.operator(operators.REFMATCHER_OT_ResumeMatch.bl_idname, icon='RECOVER_LAST')
+        interactive_layout.operator(operators.REFMATCHER_OT_ExportProgressCSV.bl_idname, icon='EXPORT')
+
+class REFMATCHER_PT_PerformancePanel(Panel):
+    bl_idname = "REFMATCHER_PT_PerformancePanel"
+    bl_label = "Performance"
+    bl_space_type = 'PROPERTIES'
+    bl_region_type = 'WINDOW'
+    bl_context = "render"
+    bl_parent_id = REFMATCHER_PT_MainPanel.bl_idname
+    bl_options = {'DEFAULT_CLOSED'}
+
+    def draw(self, context: Context):
+        layout = self.layout
+        layout.enabled = dependencies.check_dependencies()
+        layout.use_property_split = True
+        layout.prop(context.scene, properties.RENDER_BACKEND_PROPNAME)
+        layout.prop(context.scene, properties.SCREENING_BACKEND_PROPNAME)
+        layout.prop(context.scene, properties.CAPTURE_PROPNAME)
+        layout.prop(context.scene, properties.HISTOGRAM_THREADS_PROPNAME)
+        layout.prop(context.scene, properties.MULTI_FIDELITY_PROPNAME)
+        layout.prop(context.scene, properties.PROGRESSIVE_PROPNAME)
+        row = layout.row(align=True)
+        row.prop(context.scene, properties.USE_CACHE_PROPNAME)
+        row.operator(operators.REFMATCHER_OT_ClearEvaluationCache.bl_idname, icon='TRASH', text="")
+        row = layout.row(align=True)
+        row.prop(context.scene, properties.ARCHIVE_PROPNAME)
+        row.operator(operators.REFMATCHER_OT_RescoreArchive.bl_idname, icon='FILE_REFRESH', text="")
+        layout.prop(context.scene, properties.WORKERS_PROPNAME)
+        animation_row = layout.row()
+        animation_row.enabled = getattr(context.scene, properties.WORKERS_PROPNAME) == 0 # workers render batches themselves
+        animation_row.prop(context.scene, properties.ANIMATION_BATCH_PROPNAME)
+        layout.prop(context.scene, properties.SENSITIVITY_TRAJECTORIES_PROPNAME)
+        threshold_row = layout.row()
+        threshold_row.enabled = getattr(context.scene, properties.SENSITIVITY_TRAJECTORIES_PROPNAME) > 0
+        threshold_row.prop(context.scene, properties.SENSITIVITY_THRESHOLD_PROPNAME)
+        layout.prop(context.scene, properties.PROFILE_SLOWEST_PROPNAME)
+
+class REFMATCHER_PT_RegionPanel(Panel):
+    bl_idname = "REFMATCHER_PT_RegionPanel"
+    bl_label = "Region of Interest"
+    bl_space_type = 'PROPERTIES'
+    bl_region_type = 'WINDOW'
+    bl_context = "render"
+    bl_parent_id = REFMATCHER_PT_MainPanel.bl_idname
+    bl_options = {'DEFAULT_CLOSED'}
+
+    def draw(self, context: Context):
+        layout = self.layout
+        layout.enabled = dependencies.check_dependencies()
+        layout.use_property_split = True
+        mode = getattr(context.scene, properties.ROI_MODE_PROPNAME)
+        layout.prop(context.scene, properties.ROI_MODE_PROPNAME)
+        if mode == 'RECTANGLE':
+            column = layout.column(align=True)
+            column.prop(context.scene, properties.ROI_MIN_X_PROPNAME)
+            column.prop(context.scene, properties.ROI_MAX_X_PROPNAME)
+            column.prop(context.scene, properties.ROI_MIN_Y_PROPNAME)
+            column.prop(context.scene, properties.ROI_MAX_Y_PROPNAME)
+            layout.operator(operators.REFMATCHER_OT_RegionFromRenderBorder.bl_idname, icon='SELECT_SET')
+        elif mode == 'MASK':
+            layout.template_ID(context.scene, properties.ROI_MASK_PROPNAME, new="image.new", open="image.open")
 
 def draw_variable_menu(self: Menu, context: Context):
     if not matching_variables.check_context(context):
@@ -103,9 +174,13 @@ def draw_variable_menu(self: Menu, context: Context):
 def register():
     bpy.utils.register_class(REFMATCHER_UL_MatchingProperties)
     bpy.utils.register_class(REFMATCHER_PT_MainPanel)
+    bpy.utils.register_class(REFMATCHER_PT_PerformancePanel)
+    bpy.utils.register_class(REFMATCHER_PT_RegionPanel)
     bpy.types.UI_MT_button_context_menu.append(draw_variable_menu)
 
 def unregister():
     bpy.types.UI_MT_button_context_menu.remove(draw_variable_menu)
+    bpy.utils.unregister_class(REFMATCHER_PT_RegionPanel)
+    bpy.utils.unregister_class(REFMATCHER_PT_PerformancePanel)
     bpy.utils.unregister_class(REFMATCHER_PT_MainPanel)
     bpy.utils.unregister_class(REFMATCHER_UL_MatchingProperties)
\ No newline at end of file
@@ -1,7 +1,10 @@
 import bpy
 from bpy.types import Image
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable
 import numpy as np
 import os
+from refmatcher.region import RegionOfInterest
 
 
 def rendered_image(render_path: str) -> Image:
@@ -15,29 +18,129 @@ def rendered_image(render_path: str) -> Image:
         bpy.data.images.remove(bpy.data.images[filename])
     return bpy.data.images.load(filepath, check_existing=True)
 
-def image_to_matrix(image: Image) -> np.ndarray:
-    pixels = np.array(image.pixels[:])
-    return pixels.reshape(image.size[1], image.size[0], 4)
+class PixelBuffers:
+    """Preallocated float32 pixel buffers keyed by image size, reused across evaluations.
+    Matrices returned by read are views on these buffers: they are overwritten by the next read of an image of the same size."""
+    def __init__(self):
+        self.buffers: dict[tuple[int, int, int], np.ndarray] = {}
 
+    def get(self, width: int, height: int, channels: int) -> np.ndarray:
+        key = (width, height, channels)
+        buffer = self.buffers.get(key)
+        if buffer is None:
+            buffer = np.empty(width * height * channels, dtype=np.float32)
+            self.buffers[key] = buffer
+        return buffer
 
-# histogram functions
+    def read(self, image: Image) -> np.ndarray:
+        width, height = image.size
+        channels = image.channels
+        buffer = self.get(width, height, channels)
+        image.pixels.foreach_get(buffer) # fills the buffer directly, without building a list of Python floats
+        return buffer.reshape(height, width, channels)
+
+    def clear(self):
+        self.buffers.clear()
+
+def image_to_matrix(image: Image, buffers: PixelBuffers | None = None) -> np.ndarray:
+    if buffers is not None:
+        return buffers.read(image)
+    width, height = image.size
+    pixels = np.empty(width * height * image.channels, dtype=np.float32)
+    image.pixels.foreach_get(pixels)
+    return pixels.reshape(height, width, image.channels)
+
+
+# histogram engine
+
+HISTOGRAM_RESOLUTION = 256
+LUMINANCE_WEIGHTS = np.array([0.2126, 0.7152, 0.0722], dtype=np.float32)
+COLOR_CHANNEL_INDEX = {'RED': 0, 'GREEN': 1, 'BLUE': 2}
+
+CHANNELS_BY_CHANNEL = {
+    'RED': ('RED',),
+    'GREEN': ('GREEN',),
+    'BLUE': ('BLUE',),
+    'RGB': ('RED', 'GREEN', 'BLUE'),
+    'LUMINANCE': ('LUMINANCE',)
+}
+# the histograms of every channel option, kept to compare renders under other channels afterwards
+ALL_CHANNELS = ('RED', 'GREEN', 'BLUE', 'LUMINANCE')
+
+class HistogramEngine:
+    """
+    Computes normalized histograms of several channels in a single pass.
+
+    Values are quantized once to integer bin indices, offset by channel, and counted with a single np.bincount per chunk of rows,
+    so that peak memory is bounded by the chunk size rather than by the image size. Chunks can be split across a thread pool.
+    Bins match np.histogram(a, bins=256, range=(0, 1)): values outside [0, 1] are ignored, as well as pixels outside of an optional mask.
+    """
+    def __init__(self, channels: Iterable[str], chunk_pixels: int = 1 << 18, threads: int = 1):
+        self.channels = tuple(channels)
+        self.chunk_pixels = chunk_pixels
+        self.threads = threads
+        self.pool: ThreadPoolExecutor | None = None
+        self.offsets = (np.arange(len(self.channels)) * HISTOGRAM_RESOLUTION)[:, np.newaxis]
+        self.discard_bin = len(self.channels) * HISTOGRAM_RESOLUTION # out of range values are counted here, then dropped
+
+    def compute(self, matrix: np.ndarray, mask: np.ndarray | None = None) -> np.ndarray:
+        """Returns a (channels, bins) array of histograms of a (height, width, 4) image matrix, each one summing to 1.
+        mask is an optional boolean (height, width) array of the pixels to count."""
+        chunk_rows = max(self.chunk_pixels // max(matrix.shape[1], 1), 1)
+        starts = range(0, matrix.shape[0], chunk_rows)
+        chunks = [matrix[start:start + chunk_rows] for start in starts]
+        mask_chunks = [mask[start:start + chunk_rows] if mask is not None else None for start in starts]
+        if self.threads > 1 and len(chunks) > 1:
+            if self.pool is None:
+                self.pool = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="refmatcher_histogram")
+            counts = sum(self.pool.map(self._count, chunks, mask_chunks))
+        else:
+            counts = sum(map(self._count, chunks, mask_chunks))
+        counts = counts[:self.discard_bin].reshape(len(self.channels), HISTOGRAM_RESOLUTION)
+        totals = counts.sum(axis=-1, keepdims=True)
+        return np.divide(counts, totals, out=np.zeros(counts.shape), where=totals > 0)
+
+    def _count(self, chunk: np.ndarray, mask_chunk: np.ndarray | None = None) -> np.ndarray:
+        pixels = chunk.reshape(-1, chunk.shape[-1])
+        values = np.empty((len(self.channels), len(pixels)), dtype=np.float32)
+        for row, channel in zip(values, self.channels):
+            if channel == 'LUMINANCE':
+                row[:] = pixels[:, :3] @ LUMINANCE_WEIGHTS
+            else:
+                row[:] = pixels[:, COLOR_CHANNEL_INDEX[channel]]
+        values *= HISTOGRAM_RESOLUTION
+        out_of_range = ~((values >= 0) & (values <= HISTOGRAM_RESOLUTION)) # also catches NaN
+        if mask_chunk is not None:
+            out_of_range |= ~mask_chunk.reshape(-1)
+        with np.errstate(invalid='ignore'):
+            indices = values.astype(np.intp)
+        np.minimum(indices, HISTOGRAM_RESOLUTION - 1, out=indices) # 1.0 belongs to the last bin, like np.histogram
+        indices += self.offsets
+        indices[out_of_range] = self.discard_bin
+        return np.bincount(indices.ravel(), minlength=self.discard_bin + 1)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+
+# histogram functions, one channel at a time through the histogram engine
 
 def histogram(a: np.ndarray) -> np.ndarray:
-    resolution = 256
-    return np.histogram(a, bins=resolution, range=(0, 1), density=True)[0] / resolution
+    return HistogramEngine(('RED',)).compute(a[:, :, np.newaxis])[0] # the values as the only channel of a matrix
 
 def red_histogram(image: np.ndarray) -> np.ndarray:
-    return histogram(image[:, :, 0])
+    return HistogramEngine(('RED',)).compute(image)[0]
 
 def green_histogram(image: np.ndarray) -> np.ndarray:
-    return histogram(image[:, :, 1])
+    return HistogramEngine(('GREEN',)).compute(image)[0]
 
 def blue_histogram(image: np.ndarray) -> np.ndarray:
-    return histogram(image[:, :, 2])
+    return HistogramEngine(('BLUE',)).compute(image)[0]
 
 def luminance_histogram(image: np.ndarray) -> np.ndarray:
-    luminance = 0.2126 * image[:, :, 0] + 0.7152 * image[:, :, 1] + 0.0722 * image[:, :, 2] # TODO: check if this is correct
-    return histogram(luminance)
+    return HistogramEngine(('LUMINANCE',)).compute(image)[0]
 
 HISTOGRAM_FUNCTIONS_BY_CHANNEL = {
     'RED': {red_histogram},
@@ -50,16 +153,19 @@ HISTOGRAM_FUNCTIONS_BY_CHANNEL = {
 
 # distance functions
 
-def bhattacharyya_distance(histogram1: np.ndarray, histogram2: np.ndarray) -> float:
-    bhattacharyya_coefficient = np.sum(np.sqrt(histogram1 * histogram2))
-    return -np.log(bhattacharyya_coefficient) if bhattacharyya_coefficient > 0 else np.inf
+# histograms are compared along their last axis, leading axes (channels, candidates) are broadcast
+
+def bhattacharyya_distance(histogram1: np.ndarray, histogram2: np.ndarray) -> float | np.ndarray:
+    bhattacharyya_coefficient = np.sum(np.sqrt(histogram1 * histogram2), axis=-1)
+    with np.errstate(divide='ignore'):
+        return np.where(bhattacharyya_coefficient > 0, -np.log(bhattacharyya_coefficient), np.inf)
 
-def earth_movers_distance(histogram1: np.ndarray, histogram2: np.ndarray) -> float:
-    assert len(histogram1) == len(histogram2)
+def earth_movers_distance(histogram1: np.ndarray, histogram2: np.ndarray) -> float | np.ndarray:
+    assert histogram1.shape[-1] == histogram2.shape[-1]
     diff_array = histogram1 - histogram2
-    cumulative_sum = np.cumsum(diff_array)
+    cumulative_sum = np.cumsum(diff_array, axis=-1)
     absolute_cumulative_sum = np.abs(cumulative_sum)
-    emd_output = np.sum(absolute_cumulative_sum) / (len(histogram1) - 1)
+    emd_output = np.sum(absolute_cumulative_sum, axis=-1) / (histogram1.shape[-1] - 1)
     return emd_output
 
 DISTANCE_FUNCTIONS_BY_NAME = {
@@ -68,9 +174,75 @@ DISTANCE_FUNCTIONS_BY_NAME = {
 }
 
 
+# reference profile
+
+class ReferenceProfile:
+    """
+    Reference histograms, with their square roots and cumulative sums, computed once per optimization run.
+    With a region of interest, the reference is cropped to the region, and compared matrices are expected to cover it.
+    Histograms can be computed for more channels than the compared ones (histogram_channels), the others are ignored by comparisons.
+    """
+    def __init__(self, reference_image: Image, channel: str, distance: str, histogram_threads: int = 1, region: RegionOfInterest | None = None,
+                 histogram_channels: Iterable[str] | None = None):
+        self.reference_image = reference_image
+        self.channel = channel
+        self.distance = distance
+        self.region = region
+        self.histogram_channels = tuple(histogram_channels) if histogram_channels is not None else CHANNELS_BY_CHANNEL[channel]
+        # rows of the computed histograms which are compared, a slice when they all are to avoid copies
+        compared_rows = [self.histogram_channels.index(compared) for compared in CHANNELS_BY_CHANNEL[channel]]
+        self.compared_rows = slice(None) if compared_rows == list(range(len(self.histogram_channels))) else compared_rows
+        self.histogram_engine = HistogramEngine(self.histogram_channels, threads=histogram_threads)
+        matrix = image_to_matrix(reference_image)
+        if region is not None:
+            matrix = region.crop(matrix)
+        self.histograms = self.compute_histograms(matrix)[self.compared_rows] # (channels, bins)
+        self.sqrt_histograms = np.sqrt(self.histograms) # Bhattacharyya coefficient is a dot product of square roots
+        self.cumulative_histograms = np.cumsum(self.histograms, axis=-1) # Earth mover's distance compares cumulative sums
+
+    def is_valid_for(self, reference_image: Image, channel: str, distance: str, region: RegionOfInterest | None = None, histogram_channels: Iterable[str] | None = None) -> bool:
+        histogram_channels = tuple(histogram_channels) if histogram_channels is not None else CHANNELS_BY_CHANNEL[channel]
+        return self.reference_image == reference_image and self.channel == channel and self.distance == distance and self.region == region \
+            and self.histogram_channels == histogram_channels
+
+    def compute_histograms(self, matrix: np.ndarray) -> np.ndarray:
+        return self.histogram_engine.compute(matrix, self.region.mask_for(matrix) if self.region is not None else None)
+
+    def compare(self, matrix: np.ndarray) -> float:
+        """Distance between the reference and the given (height, width, 4) image matrix"""
+        return self.compare_histograms(self.compute_histograms(matrix))
+
+    def compare_histograms(self, histograms: np.ndarray) -> float:
+        """Distance between the reference and histograms computed with compute_histograms"""
+        distance_values = PROFILE_DISTANCE_FUNCTIONS_BY_NAME[self.distance](self, histograms[self.compared_rows])
+        return float(np.mean(distance_values))
+
+    def compare_histograms_batch(self, histograms: np.ndarray) -> np.ndarray:
+        """Distances between the reference and a (candidates, channels, bins) stack of histograms, in one vectorized pass"""
+        distance_values = PROFILE_DISTANCE_FUNCTIONS_BY_NAME[self.distance](self, histograms[:, self.compared_rows]) # (candidates, channels)
+        return np.mean(distance_values, axis=-1)
+
+    def close(self):
+        self.histogram_engine.close()
+
+def profile_bhattacharyya_distance(profile: ReferenceProfile, histograms: np.ndarray) -> np.ndarray:
+    bhattacharyya_coefficients = np.sum(np.sqrt(histograms) * profile.sqrt_histograms, axis=-1)
+    with np.errstate(divide='ignore'):
+        return np.where(bhattacharyya_coefficients > 0, -np.log(bhattacharyya_coefficients), np.inf)
+
+def profile_earth_movers_distance(profile: ReferenceProfile, histograms: np.ndarray) -> np.ndarray:
+    absolute_cumulative_sum = np.abs(profile.cumulative_histograms - np.cumsum(histograms, axis=-1))
+    return np.sum(absolute_cumulative_sum, axis=-1) / (histograms.shape[-1] - 1)
+
+PROFILE_DISTANCE_FUNCTIONS_BY_NAME = {
+    'BHATTACHARYYA': profile_bhattacharyya_distance,
+    'EARTH_MOVERS': profile_earth_movers_distance
+}
+
+
 # comparison function
 
-def compare_images(image1: Image, image2: Image, channel: str, distance: str) -> float:
+def compare_images(image1: Image, image2: Image, channel: str, distance: str, region: RegionOfInterest | None = None) -> float:
     """
     Compare two images based on specified channels and distance function.
 
@@ -79,21 +251,39 @@ def compare_images(image1: Image, image2: Image, channel: str, distance: str) ->
         image2 (Image): The second image to compare.
         channel (str): The channel to use for comparison.
         distance (str): The distance to use for comparison.
+        region (RegionOfInterest | None): Only compare the pixels of both images in this region.
 
     Returns:
         float: The distance value between the two images.
 
     """
-    matrix1 = image_to_matrix(image1)
-    matrix2 = image_to_matrix(image2)
+    return compare_matrices(image_to_matrix(image1), image_to_matrix(image2), channel, distance, region)
 
-    distance_function = DISTANCE_FUNCTIONS_BY_NAME[distance]
+def compare_matrices(matrix1: np.ndarray, matrix2: np.ndarray, channel: str, distance: str, region: RegionOfInterest | None = None) -> float:
+    """
+    Compare two (height, width, 4) image matrices based on specified channels and distance function.
+
+    Args:
+        matrix1 (np.ndarray): The first image matrix to compare.
+        matrix2 (np.ndarray): The second image matrix to compare.
+        channel (str): The channel to use for comparison.
+        distance (str): The distance to use for comparison.
+        region (RegionOfInterest | None): Only compare the pixels of both full frame matrices in this region.
 
-    distance_values = []
-    for histogram_function in HISTOGRAM_FUNCTIONS_BY_CHANNEL[channel]:
-        histogram1 = histogram_function(matrix1)
-        histogram2 = histogram_function(matrix2)
+    Returns:
+        float: The distance value between the two images.
+
+    """
+    distance_function = DISTANCE_FUNCTIONS_BY_NAME[distance]
+    histogram_engine = HistogramEngine(CHANNELS_BY_CHANNEL[channel])
+    if region is not None:
+        matrix1, matrix2 = region.crop(matrix1), region.crop(matrix2)
+        histograms1 = histogram_engine.compute(matrix1, region.mask_for(matrix1))
+        histograms2 = histogram_engine.compute(matrix2, region.mask_for(matrix2))
+    else:
+        histograms1 = histogram_engine.compute(matrix1)
+        histograms2 = histogram_engine.compute(matrix2)
 
-        distance_values.append(distance_function(histogram1, histogram2))
+    distance_values = distance_function(histograms1, histograms2) # one value per channel
 
-    return np.mean(distance_values)
\ No newline at end of file
+    return float(np.mean(distance_values))
@@ -4,28 +4,96 @@ from refmatcher.properties import MatchingProperty, MATCHING_PROPERTIES_PROPNAME
 from typing import Iterable
 import re
 
-def node_tree_data_collection() -> Iterable[Iterable[ID]]:
-    # TODO: access through context.blend_data instead of bpy.data ?
-    yield bpy.data.materials
-    yield bpy.data.worlds
-    yield bpy.data.textures
-    yield bpy.data.linestyles
-    yield bpy.data.lights
-    yield bpy.data.scenes
+# (bpy.data collection, attribute) of the datablocks owning embedded IDs
+EMBEDDED_ID_OWNERS = (
+    ("materials", "node_tree"),
+    ("worlds", "node_tree"),
+    ("textures", "node_tree"),
+    ("linestyles", "node_tree"),
+    ("lights", "node_tree"),
+    ("scenes", "node_tree"),
+    ("scenes", "collection"), # scene master collection
+)
+OWNER_TYPES = (bpy.types.Material, bpy.types.World, bpy.types.Texture, bpy.types.FreestyleLineStyle, bpy.types.Light, bpy.types.Scene)
 
+class EmbeddedIDIndex:
+    """
+    Reverse index from embedded IDs to their (owner, path), built lazily on the first lookup.
+
+    Handlers invalidate the index when a file is loaded, on undo and redo, and when a datablock unknown to the index is
+    updated, which happens when a potential owner is added. Entries of removed owners are detected on lookup, and trigger
+    a rebuild. Embedded IDs still without owner after the rebuild are remembered until the next invalidation.
+    """
+    def __init__(self):
+        self.owners: dict[int, tuple[ID, str]] | None = None # embedded ID pointer: (owner, path)
+        self.owner_pointers: set[int] = set()
+        self.misses: set[int] = set() # embedded ID pointers without owner
+
+    def build(self):
+        self.owners = {}
+        self.owner_pointers = set()
+        self.misses = set()
+        # TODO: access through context.blend_data instead of bpy.data ?
+        for collection_name, path in EMBEDDED_ID_OWNERS:
+            for owner in getattr(bpy.data, collection_name):
+                self.owner_pointers.add(owner.as_pointer())
+                embedded = getattr(owner, path, None)
+                if embedded is not None:
+                    self.owners[embedded.as_pointer()] = (owner, path)
+
+    def invalidate(self):
+        self.owners = None
+
+    def is_known(self, datablock: ID) -> bool:
+        return self.owners is None or datablock.as_pointer() in self.owner_pointers
+
+    def _lookup(self, datablock: ID) -> tuple[ID, str] | None:
+        entry = self.owners.get(datablock.as_pointer())
+        if entry is None:
+            return None
+        owner, path = entry
+        try:
+            return entry if getattr(owner, path) == datablock else None
+        except ReferenceError: # owner was removed
+            return None
+
+    def get_owner(self, datablock: ID) -> tuple[ID, str] | None:
+        if self.owners is not None:
+            if datablock.as_pointer() in self.misses:
+                return None
+            entry = self._lookup(datablock)
+            if entry is not None:
+                return entry
+        self.build() # first lookup or stale index, rebuild once
+        entry = self._lookup(datablock)
+        if entry is None:
+            self.misses.add(datablock.as_pointer())
+        return entry
+
+embedded_id_index = EmbeddedIDIndex()
+
+@bpy.app.handlers.persistent
+def invalidate_embedded_id_index_on_load(*args): # also on undo and redo, which reload the datablocks
+    embedded_id_index.invalidate()
+
+@bpy.app.handlers.persistent
+def invalidate_embedded_id_index_on_update(scene: bpy.types.Scene, depsgraph: bpy.types.Depsgraph):
+    for update in depsgraph.updates:
+        datablock = update.id.original
+        if isinstance(datablock, OWNER_TYPES) and not embedded_id_index.is_known(datablock):
+            embedded_id_index.invalidate()
+            return
 
 def get_root_ID_from_embedded_ID(datablock: ID) -> tuple[ID, str]:
     """Tries to fix embedded data which are handled in this function and returns a tuple (root_id, path_to_embedded_id), raise a ValueError otherwise."""
+    if datablock.id_type == 'KEY': # shape keys belong to the mesh, curve or lattice using them
+        return (datablock.user, "shape_keys")
     if not datablock.is_embedded_data:
         return (datablock, "")
-    # TODO: find a better and generic way to access root ID. Might cause lags in huge Blender projects ?
-    if datablock.id_type == 'NODETREE':
-        for data_collection in node_tree_data_collection():
-            for data in data_collection:
-                node_tree = getattr(data, "node_tree")
-                if node_tree is datablock:
-                    return (data, "node_tree")
-    raise ValueError(f"Unable to get parent data of embedded data {datablock}")
+    owner = embedded_id_index.get_owner(datablock)
+    if owner is None:
+        raise ValueError(f"Unable to get parent data of embedded data {datablock}")
+    return owner
 
 def check_ID(datablock: ID) -> bool:
     """Check if this datablock is usable for matching variables"""
@@ -67,7 +135,7 @@ def get_hovered_data(context: Context) -> tuple[bpy.types.AnyType, str, int] | N
             return None
 
     datablock, _, array_index = context.property # data_path isn't taken from context.property since it doesn't return full data path on modifiers or nodes.
-    if datablock.is_embedded_data:
+    if datablock.is_embedded_data or datablock.id_type == 'KEY':
         try:
             root_datablock, path = get_root_ID_from_embedded_ID(datablock)
             return (root_datablock, ".".join([path, data_path]), array_index)
@@ -83,6 +151,15 @@ def is_array(property: Property, array_index: int) -> bool:
 def get_value(datablock: ID, data_path_indexed: str) -> float | None:
     return datablock.path_resolve(data_path_indexed)
 
+def get_precision(datablock: ID, data_path_indexed: str, default: int = 3) -> int:
+    """Returns the number of displayed digits of the property, as defined by its RNA definition"""
+    data_path = re.sub("\\[[0-9]+\\]$", "", data_path_indexed)
+    try:
+        owner = datablock.path_resolve(data_path, False).data
+        return owner.bl_rna.properties[data_path.split(".")[-1]].precision
+    except (ValueError, AttributeError, KeyError): # custom properties have no RNA definition
+        return default
+
 def set_value(datablock: ID, data_path_indexed: str, value: float):
     match = re.match("^(.*)\\[([0-9]+)\\]$", data_path_indexed) # check if the data path is indexed
     if match:
@@ -102,6 +179,100 @@ def set_matching_values(context: Context, values: Iterable[float]):
         datablock, data_path_indexed = matching_property.datablock, matching_property.data_path_indexed
         set_value(datablock, data_path_indexed, value)
 
+def set_sensitivities(context: Context, sensitivity: Iterable[float] | None, frozen_variables: Iterable[int]):
+    """Stores the result of a sensitivity screening in the matching variables, None resets it"""
+    matching_properties: Iterable[MatchingProperty] = getattr(context.scene, MATCHING_PROPERTIES_PROPNAME)
+    frozen_variables = set(int(i) for i in frozen_variables)
+    for i, matching_property in enumerate(matching_properties):
+        matching_property.sensitivity = sensitivity[i] if sensitivity is not None else -1.0
+        matching_property.frozen = i in frozen_variables
+
+def split_data_path_indexed(data_path_indexed: str) -> tuple[str, int]:
+    """(data_path, array index) of a matching variable path, the index is -1 for a scalar"""
+    match = re.match("^(.*)\\[([0-9]+)\\]$", data_path_indexed)
+    return (match.group(1), int(match.group(2))) if match else (data_path_indexed, -1)
+
+# compiled bindings, for the evaluation loop
+
+class PropertyBinding:
+    """
+    A property resolved once to its owner struct: owner.attribute, or owner[key] for custom properties.
+    Array components of the same property share a binding, so that the array is written at once.
+    """
+    def __init__(self, datablock: ID, data_path: str):
+        self.datablock = datablock
+        self.key: str | None = None
+        self.attribute: str | None = None
+        if data_path.endswith('"]'): # custom property, or geometry nodes modifier input
+            owner_path, _, key = data_path[:-2].rpartition('["')
+            self.key = key
+        else:
+            owner_path, _, self.attribute = data_path.rpartition(".")
+        self.owner = datablock.path_resolve(owner_path) if owner_path else datablock
+        self.indices: list[int] = [] # array indices of the bound components, -1 for a scalar
+        self.variables: list[int] = [] # index of each component in the parameter vector
+
+    def get(self):
+        return self.owner[self.key] if self.key is not None else getattr(self.owner, self.attribute)
+
+    def set(self, value):
+        if self.key is not None:
+            self.owner[self.key] = value
+        else:
+            setattr(self.owner, self.attribute, value)
+
+class MatchingBindings:
+    """
+    Matching variables compiled once per run: paths are parsed and resolved once, writes of a parameter vector
+    skip unchanged values and write each changed property once. Bindings are only valid while the scene structure
+    does not change, which holds during an optimization run.
+    """
+    def __init__(self, context: Context):
+        self.bindings: list[PropertyBinding] = []
+        bindings_by_property: dict[tuple[int, str], PropertyBinding] = {}
+        matching_properties: Iterable[MatchingProperty] = getattr(context.scene, MATCHING_PROPERTIES_PROPNAME)
+        for variable, matching_property in enumerate(matching_properties):
+            datablock, data_path_indexed = matching_property.datablock, matching_property.data_path_indexed
+            data_path, index = split_data_path_indexed(data_path_indexed)
+            property_key = (datablock.as_pointer(), data_path)
+            binding = bindings_by_property.get(property_key)
+            if binding is None:
+                binding = bindings_by_property[property_key] = PropertyBinding(datablock, data_path)
+                self.bindings.append(binding)
+            binding.indices.append(index)
+            binding.variables.append(variable)
+        self.values = [get_value(matching_property.datablock, matching_property.data_path_indexed) for matching_property in matching_properties]
+
+    def apply(self, values: Iterable[float]) -> int:
+        """Writes the values which changed since the last call, and returns the number of written properties"""
+        values = [float(value) for value in values]
+        assert len(values) == len(self.values)
+        tagged: set[int] = set()
+        written = 0
+        for binding in self.bindings:
+            changed = [(index, values[variable]) for index, variable in zip(binding.indices, binding.variables) if values[variable] != self.values[variable]]
+            if not changed:
+                continue
+            if changed[0][0] < 0:
+                binding.set(changed[0][1])
+            else:
+                array = list(binding.get())
+                for index, value in changed:
+                    array[index] = value
+                binding.set(array) # one write, so one update of the property, for all its changed components
+            written += 1
+            # RNA writes tag their datablock through update callbacks, custom property writes don't
+            if binding.key is not None and binding.datablock.as_pointer() not in tagged:
+                binding.datablock.update_tag()
+                tagged.add(binding.datablock.as_pointer())
+        for variable, value in enumerate(values):
+            self.values[variable] = value
+        return written
+
+    def invalidate(self):
+        """Makes the next apply write every value, after the properties were changed by something else, like animation"""
+        self.values = [float("nan")] * len(self.values)
+
 def check_matching_values(context: Context):
     matching_properties: Iterable[MatchingProperty] = getattr(context.scene, MATCHING_PROPERTIES_PROPNAME)
     for matching_property in matching_properties:
@@ -148,4 +319,17 @@ def remove_matching_variables(context: Context, datablock: ID, data_pathes_index
     # backward iteration since we are removing elements. Convert to list because enumerate returns a generator, which can't be reversed.
     for i, matching_property in reversed(list(enumerate(matching_properties))):
         if matching_property.datablock is datablock and matching_property.data_path_indexed in data_pathes_indexed:
-            matching_properties.remove(i)
\ No newline at end of file
+            matching_properties.remove(i)
+
+def register():
+    bpy.app.handlers.load_post.append(invalidate_embedded_id_index_on_load)
+    bpy.app.handlers.undo_post.append(invalidate_embedded_id_index_on_load)
+    bpy.app.handlers.redo_post.append(invalidate_embedded_id_index_on_load)
+    bpy.app.handlers.depsgraph_update_post.append(invalidate_embedded_id_index_on_update)
+
+def unregister():
+    bpy.app.handlers.depsgraph_update_post.remove(invalidate_embedded_id_index_on_update)
+    bpy.app.handlers.redo_post.remove(invalidate_embedded_id_index_on_load)
+    bpy.app.handlers.undo_post.remove(invalidate_embedded_id_index_on_load)
+    bpy.app.handlers.load_post.remove(invalidate_embedded_id_index_on_load)
+    embedded_id_index.invalidate()
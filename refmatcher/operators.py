@@ -1,10 +1,11 @@
 import bpy
 from bpy.types import Operator, Context, Image, Event
-from bpy.props import FloatProperty
-from refmatcher import dependencies, optimization, matching_variables
-from refmatcher.properties import REFERENCE_IMAGE_PROPNAME, CHANNEL_PROPNAME, DISTANCE_PROPNAME, OPTIMIZER_PROPNAME, \
-    ITERATIONS_PROPNAME, MATCHING_PROPERTIES_PROPNAME, MATCHING_PROPERTIES_INDEX_PROPNAME, INCLUDE_ALPHA_PROPNAME, \
-    get_scene_vector_propname, get_scene_propname
+from bpy.props import FloatProperty, StringProperty, EnumProperty, BoolProperty
+from bpy_extras.io_utils import ExportHelper
+from refmatcher import dependencies, optimization, matching_variables, evaluation_cache, evaluation_log, evaluation_archive, checkpoint
+import os
+from refmatcher.properties import CHANNEL_ITEMS, DISTANCE_ITEMS, CHANNEL_PROPNAME, DISTANCE_PROPNAME, REFERENCE_IMAGE_PROPNAME, MATCHING_PROPERTIES_PROPNAME, MATCHING_PROPERTIES_INDEX_PROPNAME, \
+    INCLUDE_ALPHA_PROPNAME, ROI_MIN_X_PROPNAME, ROI_MIN_Y_PROPNAME, ROI_MAX_X_PROPNAME, ROI_MAX_Y_PROPNAME, get_scene_vector_propname, get_scene_propname
 
 class REFMATCHER_OT_InstallDependencies(Operator):
     bl_idname = "refmatcher.install_dependencies"
@@ -35,15 +36,125 @@ class REFMATCHER_OT_MatchReference(Operator):
             matching_variables.check_matching_values()
 
     def execute(self, context: Context):
-        reference_image: Image = getattr(context.scene, REFERENCE_IMAGE_PROPNAME)
-        channel: str = getattr(context.scene, CHANNEL_PROPNAME)
-        distance: str = getattr(context.scene, DISTANCE_PROPNAME)
-        iterations: int = getattr(context.scene, ITERATIONS_PROPNAME)
-        optimizer_name = getattr(context.scene, OPTIMIZER_PROPNAME)
-        optimizer_class = optimization.OPTIMIZER_BY_NAME[optimizer_name]
-        optimizer: optimization.Optimizer = optimizer_class(channel, distance, reference_image, iterations, context)
+        try:
+            optimizer = optimization.create_optimizer(context)
+        except ValueError as error:
+            self.report({'ERROR'}, str(error))
+            return {'CANCELLED'}
         result = optimizer.optimize()
         matching_variables.set_matching_values(context, result)
+        matching_variables.set_sensitivities(context, optimizer.sensitivity, optimizer.frozen_variables)
+        return {'FINISHED'}
+
+class REFMATCHER_OT_ResumeMatch(Operator):
+    bl_idname = "refmatcher.resume_match"
+    bl_category = 'View'
+    bl_label = "Resume match"
+    bl_description = "Continues the last stopped or crashed match from its checkpoint, without rendering already evaluated parameters again"
+    bl_options = {'REGISTER'}
+
+    @classmethod
+    def poll(cls, context: Context) -> bool:
+        return REFMATCHER_OT_MatchReference.poll(context) and os.path.isfile(optimization.scene_checkpoint_path(context.scene))
+
+    def execute(self, context: Context):
+        state = checkpoint.load(optimization.scene_checkpoint_path(context.scene))
+        if state is None:
+            self.report({'ERROR'}, "No valid checkpoint to resume")
+            return {'CANCELLED'}
+        try:
+            optimizer = optimization.create_optimizer(context)
+            optimizer.resume(state)
+        except ValueError as error:
+            self.report({'ERROR'}, str(error))
+            return {'CANCELLED'}
+        result = optimizer.optimize()
+        matching_variables.set_matching_values(context, result)
+        matching_variables.set_sensitivities(context, optimizer.sensitivity, optimizer.frozen_variables)
+        return {'FINISHED'}
+
+class REFMATCHER_OT_ClearEvaluationCache(Operator):
+    bl_idname = "refmatcher.clear_evaluation_cache"
+    bl_category = 'View'
+    bl_label = "Clear evaluation cache"
+    bl_description = "Removes all cached evaluation scores"
+    bl_options = {'REGISTER'}
+
+    def execute(self, context: Context):
+        evaluation_cache.EvaluationCache(optimization.CACHE_PATH).clear()
+        self.report({'INFO'}, "Evaluation cache cleared")
+        return {'FINISHED'}
+
+class REFMATCHER_OT_RegionFromRenderBorder(Operator):
+    bl_idname = "refmatcher.region_from_render_border"
+    bl_category = 'View'
+    bl_label = "From render border"
+    bl_description = "Sets the region rectangle to the render border drawn in the camera view (Ctrl+B)"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    def execute(self, context: Context):
+        render = context.scene.render
+        setattr(context.scene, ROI_MIN_X_PROPNAME, render.border_min_x)
+        setattr(context.scene, ROI_MIN_Y_PROPNAME, render.border_min_y)
+        setattr(context.scene, ROI_MAX_X_PROPNAME, render.border_max_x)
+        setattr(context.scene, ROI_MAX_Y_PROPNAME, render.border_max_y)
+        return {'FINISHED'}
+
+class REFMATCHER_OT_ExportProgressCSV(Operator, ExportHelper):
+    bl_idname = "refmatcher.export_progress_csv"
+    bl_category = 'View'
+    bl_label = "Export progress CSV"
+    bl_description = "Exports the evaluations of the last match as a CSV file"
+    bl_options = {'REGISTER'}
+
+    filename_ext = ".csv"
+    filter_glob: StringProperty(default="*.csv", options={'HIDDEN'}) # type: ignore
+
+    @classmethod
+    def poll(cls, context: Context) -> bool:
+        return os.path.isfile(optimization.LOG_PATH)
+
+    def execute(self, context: Context):
+        evaluation_log.export_csv(optimization.LOG_PATH, self.filepath)
+        self.report({'INFO'}, f"Exported progress to {self.filepath}")
+        return {'FINISHED'}
+
+class REFMATCHER_OT_RescoreArchive(Operator):
+    bl_idname = "refmatcher.rescore_archive"
+    bl_category = 'View'
+    bl_label = "Rescore archive"
+    bl_description = "Scores the evaluations archived by the last match under another channel or distance, without rendering"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    channel: EnumProperty(name="Channel", items=CHANNEL_ITEMS) # type: ignore
+    distance: EnumProperty(name="Distance", items=DISTANCE_ITEMS) # type: ignore
+    apply: BoolProperty(name="Apply best", description="Set the matching variables to the best rescored evaluation", default=False) # type: ignore
+
+    @classmethod
+    def poll(cls, context: Context) -> bool:
+        return os.path.isfile(os.path.join(optimization.ARCHIVE_DIR, evaluation_archive.METADATA_FILENAME))
+
+    def invoke(self, context: Context, event: Event):
+        self.channel = getattr(context.scene, CHANNEL_PROPNAME)
+        self.distance = getattr(context.scene, DISTANCE_PROPNAME)
+        return context.window_manager.invoke_props_dialog(self)
+
+    def execute(self, context: Context):
+        try:
+            xs, scores, full_quality = optimization.rescore_archive(context, self.channel, self.distance)
+        except ValueError as error:
+            self.report({'ERROR'}, str(error))
+            return {'CANCELLED'}
+        best = evaluation_archive.best_evaluation(scores, full_quality)
+        if best is None:
+            self.report({'WARNING'}, f"No valid score among the {len(scores)} archived evaluations")
+            return {'CANCELLED'}
+        if self.apply:
+            if xs.shape[1] != len(getattr(context.scene, MATCHING_PROPERTIES_PROPNAME)):
+                self.report({'ERROR'}, "The matching variables changed since the archived match")
+                return {'CANCELLED'}
+            matching_variables.set_matching_values(context, list(xs[best]))
+        self.report({'INFO'}, f"Best of {len(scores)} archived evaluations: evaluation {best}, score {scores[best]:.5f}" + (", applied" if self.apply else ""))
         return {'FINISHED'}
 
 class REFMATCHER_OT_AddMatchingVariableFloat(Operator):
@@ -226,6 +337,11 @@ class REFMATCHER_OT_RemoveMatchingVariableFromList(Operator):
 OPERATORS = [
     REFMATCHER_OT_InstallDependencies,
     REFMATCHER_OT_MatchReference,
+    REFMATCHER_OT_ResumeMatch,
+    REFMATCHER_OT_ClearEvaluationCache,
+    REFMATCHER_OT_RegionFromRenderBorder,
+    REFMATCHER_OT_ExportProgressCSV,
+    REFMATCHER_OT_RescoreArchive,
     REFMATCHER_OT_AddMatchingVariableFloat,
     REFMATCHER_OT_AddMatchingVariableVector,
     REFMATCHER_OT_RemoveMatchingVariable,
@@ -1,9 +1,9 @@
 # TODO: think about using scikit-optimize optimizers. Bayesian optimization could be interesting. https://scikit-opt.github.io/scikit-opt/#/en/README
 
 import bpy
-from bpy.types import Image, Context
+from bpy.types import Image, Context, Scene
 from abc import ABC, abstractmethod
-from refmatcher import properties, matching_variables, server
+from refmatcher import properties, matching_variables, server, render_capture, fidelity, evaluation_cache, evaluation_log, workers, bayesian, profiling, region, checkpoint, render_backend, sensitivity, cost_model, animation_batch, evaluation_archive
 
 from refmatcher import dependencies, image_comparison
 dependencies_ok = dependencies.check_dependencies()
@@ -11,12 +11,19 @@ if not dependencies_ok:
     dependencies.install_dependencies() # TODO: if kept this way, delete the install_dependencies call from operators.py and the HMI code.
 import scipy.optimize as opt
 import numpy as np
-import csv
+import contextlib
 import os
 import time
 
 WORK_DIR = os.path.join(bpy.app.tempdir, "refmatcher")
-CSV_PATH = os.path.join(WORK_DIR, "progress.csv")
+LOG_PATH = os.path.join(WORK_DIR, evaluation_log.LOG_FILENAME)
+# bpy.app.tempdir is deleted when Blender exits, data which must survive a restart or a crash goes in the user data
+# directory of the addon, which is not shared between users like the system temp dir
+PERSISTENT_DIR = bpy.utils.user_resource('DATAFILES', path="refmatcher")
+CACHE_PATH = os.path.join(PERSISTENT_DIR, "evaluation_cache.sqlite")
+PROFILES_DIR = os.path.join(WORK_DIR, "profiles")
+ARCHIVE_DIR = os.path.join(WORK_DIR, "archive")
+CHECKPOINTS_DIR = os.path.join(PERSISTENT_DIR, "checkpoints")
 
 def format_time(time_s: float) -> str:
     if time_s > 604800: # 7 days = 604800 seconds
@@ -35,22 +42,88 @@ def format_time(time_s: float) -> str:
 class UserInterrupt(Exception):
     pass
 
+class BudgetExhausted(Exception):
+    """Raised by evaluations past the render limit, to stop an algorithm which doesn't count renders itself"""
+    pass
+
+class DeadlineReached(Exception):
+    """Raised by evaluations which wouldn't finish before the deadline of a time budget"""
+    pass
+
 class Optimizer(ABC):
-    def __init__(self, channel: str, distance: str, reference_image: Image, iterations: int, context: Context):
+    supports_batch_evaluation = False # True if the algorithm evaluates populations through evaluate_batch
+
+    def __init__(self, channel: str, distance: str, reference_image: Image, iterations: int, context: Context, capture: str = 'VIEWER_NODE', histogram_threads: int = 1, multi_fidelity: bool = False, use_cache: bool = False, render_workers: int = 0, progressive: bool = False, dashboard: bool = True, profile_slowest: int = 0, region_of_interest: region.RegionOfInterest | None = None, use_checkpoint: bool = True, seed: int | None = None, backend: str = 'FULL', screening_backend: str | None = None, sensitivity_trajectories: int = 0, sensitivity_threshold: float = 0.05, time_budget: float = 0.0, animation_batches: bool = False, archive: bool = False, checkpoint_path: str | None = None):
         self.channel = channel
         self.distance = distance
         self.reference_image = reference_image
         self.iterations = iterations
+        self.requested_iterations = iterations # iterations is adapted to the measured cost with a time budget
         self.context = context
+        self.capture = capture
+        self.render_capture: render_capture.RenderCapture = render_capture.RENDER_CAPTURE_BY_NAME[capture](WORK_DIR)
+        self.file_capture = render_capture.FileCapture(WORK_DIR) # for backends which don't run the compositor
+        self.backend = backend
+        self.screening_backend = screening_backend # candidates are screened with it before being rendered with backend, if set
+        # renders are captured from memory or saved by the capture itself, they are not written to the scene output path
+        self.render_backends: dict[str, render_backend.RenderBackend] = {name: render_backend.RENDER_BACKEND_BY_NAME[name](write_still=False)
+                                                                         for name in {backend, screening_backend} if name is not None}
+        self.histogram_threads = histogram_threads
+        self.reference_profile: image_comparison.ReferenceProfile | None = None
+        self.region_of_interest = region_of_interest
+        self.multi_fidelity = multi_fidelity
+        self.fidelity_schedule: fidelity.FidelitySchedule | None = None
+        self.current_fidelity: fidelity.Fidelity | None = None
+        self.full_fidelity: fidelity.Fidelity | None = None
+        self.progressive = progressive
+        self.progressive_screening: fidelity.ProgressiveScreening | None = None
+        # the archive needs the histograms of cache hits
+        self.cache = evaluation_cache.EvaluationCache(CACHE_PATH, store_histograms=archive) if use_cache else None
+        self.cache_fingerprint = ""
+        # histograms of every channel of the rendered evaluations, to score them again under other settings
+        self.archive = evaluation_archive.EvaluationArchive(ARCHIVE_DIR) if archive else None
+        self.cache_steps: list[float] = []
+        self.render_workers = render_workers
+        self.worker_pool: workers.WorkerPool | None = None
+        # batches rendered locally as the frames of one animation render job
+        self.animation_batch = animation_batch.AnimationBatch(os.path.join(WORK_DIR, "frames")) if animation_batches else None
+        self.profile_slowest = profile_slowest
+        self.bindings: matching_variables.MatchingBindings | None = None
+        self.profiler = profiling.EvaluationProfiler(profile_slowest=profile_slowest)
+        self.checkpoint = checkpoint.Checkpoint(checkpoint_path or scene_checkpoint_path(context.scene)) if use_checkpoint else None
+        self.resume_state: dict | None = None
+        self.replay: dict[tuple, float] = {}
+        self.replayed = 0
+        self.fixed_seed = seed # random for every run when None
+        self.sensitivity_trajectories = sensitivity_trajectories # 0 disables sensitivity screening
+        self.sensitivity_threshold = sensitivity_threshold
+        self.sensitivity: np.ndarray | None = None # mu* of each variable relative to the largest one, after screening
+        self.frozen_variables = np.array([], dtype=np.intp)
+        self.frozen_values: np.ndarray | None = None
+        self.active_variables: np.ndarray | None = None # indices of the searched variables, None when all are searched
+        self.variable_names: list[str] = []
+        self.render_limit: int | None = None # hard limit on renders, None when algorithms stop by themselves
+        # renders asked for, including confirmations, screenings, cache hits and replays, so that a run takes the same path
+        # whether its renders are cached, replayed from a checkpoint or not
+        self.renders = 0
+        self.time_budget = time_budget # seconds, 0 for no time budget
+        self.deadline: float | None = None
+        self.cost_model: cost_model.CostModel | None = None
+        self.seed = 0
         self.current_iteration = 0
         self.start_time = 0
         self.stop = False
+        self.dashboard = dashboard
         self.server = None
         self.scores = []
+        self.evaluation_log = evaluation_log.EvaluationLog(LOG_PATH)
         self.lowest_score = np.inf
         self.best_input = np.array([])
 
     def initial_parameters(self) -> tuple[list[float], list[tuple[float, float]]]:
+        if self.resume_state is not None:
+            # the scene values may have been set to the result of the stopped run, restart from the same point
+            return list(self.resume_state["x0"]), [tuple(bound) for bound in self.resume_state["bounds"]]
         x0: list[float] = []
         bounds: list[tuple[float, float]] = []
         for matching_property in getattr(self.context.scene, properties.MATCHING_PROPERTIES_PROPNAME):
@@ -61,28 +134,378 @@ class Optimizer(ABC):
             bounds.append((min, max))
         return x0, bounds
 
+    def search_parameters(self) -> tuple[list[float], list[tuple[float, float]]]:
+        """Initial parameters and bounds of the variables searched by the algorithm, without the frozen ones"""
+        x0, bounds = self.initial_parameters()
+        if self.active_variables is None:
+            return x0, bounds
+        return [x0[i] for i in self.active_variables], [bounds[i] for i in self.active_variables]
+
+    def reduce_parameters(self, x: np.ndarray) -> np.ndarray:
+        """Parameter vector of the searched variables, from a vector of every variable"""
+        return x if self.active_variables is None else x[self.active_variables]
+
+    def full_parameters(self, x: np.ndarray) -> np.ndarray:
+        """Parameter vector of every variable, from a vector of the searched ones"""
+        if self.active_variables is None or len(x) == len(self.frozen_values):
+            return x
+        full_x = self.frozen_values.copy()
+        full_x[self.active_variables] = x
+        return full_x
+
     def evaluate(self, x: np.ndarray) -> float:
+        return self.evaluate_batch([x])[0]
+
+    def evaluate_batch(self, xs: list[np.ndarray]) -> list[float]:
+        """Evaluates several parameter vectors at once, concurrently when a worker pool is running"""
         if self.stop:
             raise UserInterrupt
-        matching_variables.set_matching_values(self.context, x)
-        bpy.ops.render.render(write_still=True)
-        rendered_image = image_comparison.rendered_image(WORK_DIR)
-        result = image_comparison.compare_images(self.reference_image, rendered_image, self.channel, self.distance)
-        self.current_iteration += 1
-        self.scores.append(result)
-        if result < self.lowest_score:
-            self.lowest_score = result
-            self.best_input = x
-        self.update_csv_file()
+        xs = [self.full_parameters(np.asarray(x, dtype=float)) for x in xs]
+        exhausted: type[Exception] | None = None
+        if self.render_limit is not None and len(xs) > self.renders_left(): # every evaluation renders at least once
+            exhausted = BudgetExhausted
+            xs = xs[:self.renders_left()]
+        if self.deadline is not None and xs:
+            affordable = self.affordable_evaluations(xs)
+            if affordable < len(xs):
+                exhausted = DeadlineReached
+                xs = xs[:affordable]
+        if exhausted is not None and not xs:
+            raise exhausted
+        schedule = self.fidelity_schedule
+        if schedule is None or schedule.is_full(schedule.fidelity_at(self.current_iteration / self.iterations)):
+            self.current_fidelity = self.full_fidelity
+            results, full_quality = self.render_and_compare_full_batch(xs)
+        else:
+            self.current_fidelity = schedule.fidelity_at(self.current_iteration / self.iterations)
+            results = self.render_and_compare_batch(xs, self.current_fidelity)
+            full_quality = [False] * len(xs)
+            for result in results:
+                schedule.record(self.current_fidelity, result)
+            # confirm promising candidates with a full quality render, so that the best input is always backed by one,
+            # ranked with the batch recorded so that a first batch isn't confirmed entirely
+            promising = sorted((i for i, result in enumerate(results) if schedule.is_promising(self.current_fidelity, result)), key=results.__getitem__)[:self.renders_left()]
+            full_results, full_results_quality = self.render_and_compare_full_batch([xs[i] for i in promising])
+            for i, full_result, is_full_quality in zip(promising, full_results, full_results_quality):
+                if is_full_quality:
+                    self.update_best(xs[i], full_result)
+        for x, result, is_full_quality in zip(xs, results, full_quality):
+            self.current_iteration += 1
+            self.scores.append(result)
+            if is_full_quality:
+                self.update_best(x, result)
+            self.log_evaluation(x, result, is_full_quality)
+            print(f"x: {x}, result: {result}")
+        if self.deadline is not None: # budget adapted to the measured cost, for the schedules and algorithms based on it
+            self.iterations = self.current_iteration + self.affordable_evaluations()
         self.context.window_manager.progress_update(self.current_iteration)
-        print(f"x: {x}, result: {result}")
-        return result
+        if exhausted is None and self.renders_left() == 0:
+            exhausted = BudgetExhausted
+        if exhausted is not None:
+            raise exhausted
+        return results
+
+    def affordable_evaluations(self, xs: list[np.ndarray] | None = None) -> int:
+        """Number of the given evaluations, or of average evaluations if xs is None, which fit before the deadline"""
+        now = time.time()
+        time_left = self.deadline - now
+        if time_left <= 0:
+            return 0
+        elapsed = now - self.start_time
+        if xs is None:
+            cost = self.cost_model.expected_cost(elapsed, self.current_iteration)
+            return int(time_left // cost) if cost > 0 else self.requested_iterations
+        cumulative_costs = np.cumsum(self.cost_model.costs(xs, elapsed, self.current_iteration))
+        return int(np.searchsorted(cumulative_costs, time_left, side='right'))
+
+    def renders_left(self) -> int | None:
+        """Renders left before the render limit, None without a limit"""
+        if self.render_limit is None:
+            return None
+        return max(self.render_limit - self.renders, 0)
+
+    def remaining_evaluations(self) -> int:
+        """Evaluations left in the budget once screening and calibration are done, at least one for the starting point"""
+        return max(self.iterations - self.current_iteration, 1)
+
+    def remaining_time(self) -> float | None:
+        """Expected time left in the run, None before the first evaluation"""
+        if self.current_iteration == 0 or self.cost_model is None:
+            return None
+        now = time.time()
+        remaining = self.cost_model.expected_cost(now - self.start_time, self.current_iteration) * max(self.iterations - self.current_iteration, 0)
+        if self.deadline is not None:
+            remaining = min(remaining, max(self.deadline - now, 0.0))
+        return remaining
+
+    def calibrate(self):
+        """Evaluates the initial parameters to measure the evaluation cost, and fits the iterations to the time budget"""
+        x0, _ = self.initial_parameters()
+        print(f"Measuring the evaluation cost for a time budget of {format_time(self.time_budget)}.")
+        self.evaluate(np.array(x0, dtype=float))
+        print(f"Evaluations cost about {self.cost_model.expected_cost(time.time() - self.start_time, self.current_iteration):.2f}s, "
+              f"{self.iterations - self.current_iteration} more fit in the time budget.")
+
+    def screen_variables(self):
+        """Morris screening of the variables influence, freezing the insensitive ones at their initial value for the main run"""
+        x0, bounds = self.initial_parameters()
+        lower, upper = np.array(bounds, dtype=float).T
+        dimension = len(bounds)
+        self.variable_names = self.matching_variable_names()
+        points, orders, steps = sensitivity.morris_trajectories(self.sensitivity_trajectories, dimension, np.random.default_rng(self.seed))
+        print(f"Screening the sensitivity of {dimension} variables with {points.shape[0] * points.shape[1]} renders.")
+        # effects are differences of scores, which must all come from the same render settings
+        fidelity_schedule, progressive_screening = self.fidelity_schedule, self.progressive_screening
+        self.fidelity_schedule = self.progressive_screening = None
+        try:
+            scores = self.evaluate_batch(list(lower + points.reshape(-1, dimension) * (upper - lower)))
+        finally:
+            self.fidelity_schedule, self.progressive_screening = fidelity_schedule, progressive_screening
+        mu_star, _ = sensitivity.elementary_effects(np.array(scores).reshape(points.shape[:2]), orders, steps)
+        largest = np.max(mu_star)
+        self.sensitivity = mu_star / largest if largest > 0 else mu_star
+        self.frozen_variables = sensitivity.insensitive_variables(mu_star, self.sensitivity_threshold)
+        if len(self.frozen_variables) > 0:
+            self.frozen_values = np.array(x0, dtype=float)
+            self.active_variables = np.setdiff1d(np.arange(dimension), self.frozen_variables)
+        for name, value, frozen in self.sensitivity_ranking():
+            print(f"Sensitivity {value:.3f}{' (frozen)' if frozen else ''}: {name}")
+
+    def matching_variable_names(self) -> list[str]:
+        matching_properties = getattr(self.context.scene, properties.MATCHING_PROPERTIES_PROPNAME)
+        return [f"{matching_property.datablock.name} {matching_property.data_path_indexed}" for matching_property in matching_properties]
+
+    def sensitivity_ranking(self) -> list[tuple[str, float, bool]]:
+        """(name, relative sensitivity, frozen) of the screened variables, most influential first"""
+        if self.sensitivity is None:
+            return []
+        return [(self.variable_names[i], float(self.sensitivity[i]), i in self.frozen_variables) for i in np.argsort(-self.sensitivity, kind='stable')]
+
+    def render_and_compare_full_batch(self, xs: list[np.ndarray]) -> tuple[list[float], list[bool]]:
+        """Evaluates at full fidelity, and returns the scores with flags telling which ones come from a full quality render.
+        With progressive screening, candidates which are clearly worse than the incumbent are not rendered at full quality."""
+        screening = self.progressive_screening
+        if screening is None:
+            results = self.render_and_compare_batch(xs, self.full_fidelity)
+            full_quality = [True] * len(xs)
+        else:
+            start = time.perf_counter()
+            screening_results = self.render_and_compare_batch(xs, screening.fidelity, self.screening_backend or self.backend)
+            screening_time = time.perf_counter() - start
+            survivors = [i for i, result in enumerate(screening_results) if not screening.is_losing(result, self.lowest_score)]
+            aborted = len(xs) - len(survivors)
+            survivors = survivors[:self.renders_left()] # survivors past the render limit keep their screening estimate
+            start = time.perf_counter()
+            survivor_results = self.render_and_compare_batch([xs[i] for i in survivors], self.full_fidelity)
+            screening.record(len(xs), aborted, screening_time, time.perf_counter() - start)
+            results = [screening.estimate(result) for result in screening_results]
+            full_quality = [False] * len(xs)
+            for i, survivor_result in zip(survivors, survivor_results):
+                screening.calibrate(screening_results[i], survivor_result)
+                results[i] = survivor_result
+                full_quality[i] = True
+        if self.fidelity_schedule is not None:
+            for result, is_full_quality in zip(results, full_quality):
+                if is_full_quality:
+                    self.fidelity_schedule.record(self.full_fidelity, result)
+        return results, full_quality
+
+    def batches_evaluations(self) -> bool:
+        """True if evaluating candidates together is faster than one at a time"""
+        return self.worker_pool is not None or self.animation_batch is not None
+
+    def evaluate_vectorized(self, x: np.ndarray) -> np.ndarray:
+        """Vectorized objective for scipy: evaluates the (parameters, candidates) array x in one batch"""
+        x = np.asarray(x)
+        if x.ndim == 1: # differential evolution polishes its result one candidate at a time
+            return self.evaluate(x)
+        return np.array(self.evaluate_batch(list(x.T)))
+
+    def render_and_compare_batch(self, xs: list[np.ndarray], render_fidelity: fidelity.Fidelity | None = None, backend: str | None = None) -> list[float]:
+        backend = backend or self.backend
+        results: list[float | None] = [None] * len(xs)
+        cache_keys: list[str | None] = [None] * len(xs)
+        archived_histograms: dict[int, np.ndarray] = {} # by index in xs
+        fidelity_label = self.render_label(render_fidelity, backend)
+        self.renders += len(xs)
+        # renders of a resumed run which were already done before it stopped, its archive holds them already
+        replayed = {i for i, x in enumerate(xs) if checkpoint.render_key(x, fidelity_label) in self.replay}
+        for i in replayed:
+            results[i] = self.replay[checkpoint.render_key(xs[i], fidelity_label)]
+        self.replayed += len(replayed)
+        if self.cache is not None:
+            for i, x in enumerate(xs):
+                if i in replayed:
+                    continue
+                cache_keys[i] = self.cache.key(self.cache_fingerprint + fidelity_label, x, self.cache_steps)
+                with self.profiler.phase('cache'):
+                    cached = self.cache.get(cache_keys[i])
+                if cached is not None:
+                    results[i] = cached[0]
+                    if cached[1] is not None:
+                        archived_histograms[i] = cached[1]
+        missing = [i for i, result in enumerate(results) if result is None]
+        batch_timings: dict[str, float] = {} # wall clock of the phases run once for the whole batch
+        # local renders of the batch share a backend session, workers have their own backends
+        with self.render_backends[backend].session(self.context) if self.worker_pool is None and missing else contextlib.nullcontext():
+            if self.worker_pool is not None:
+                start = time.perf_counter()
+                histograms_list = self.worker_pool.map([xs[i] for i in missing], render_fidelity, backend)
+                batch_timings['workers'] = time.perf_counter() - start
+            elif self.animation_batch is not None and len(missing) > 1:
+                histograms_list = self.render_histograms_animation([xs[i] for i in missing], render_fidelity, backend, batch_timings)
+            else:
+                histograms_list = []
+            for n, i in enumerate(missing):
+                self.profiler.start_evaluation()
+                if batch_timings:
+                    for phase, duration in batch_timings.items(): # share of each evaluation of the batch
+                        self.profiler.add(phase, duration / len(missing))
+                else:
+                    histograms_list.append(self.render_histograms(xs[i], render_fidelity, backend))
+                self.profiler.finish_evaluation(xs[i].tobytes())
+        if missing:
+            # the whole batch is scored against the reference in one pass
+            start = time.perf_counter()
+            scores = self.reference_profile.compare_histograms_batch(np.stack(histograms_list))
+            self.profiler.add_shared('distance', time.perf_counter() - start, [xs[i].tobytes() for i in missing])
+        for n, i in enumerate(missing):
+            results[i] = float(scores[n])
+            if cache_keys[i] is not None:
+                with self.profiler.phase('cache'):
+                    self.cache.put(cache_keys[i], results[i], histograms_list[n])
+        if self.cache is not None:
+            with self.profiler.phase('cache'):
+                self.cache.commit() # hits and new entries of the whole batch in one transaction
+        if self.archive is not None:
+            is_full_quality = backend == self.backend and render_fidelity in (None, self.full_fidelity)
+            archived_histograms.update(zip(missing, histograms_list))
+            for i in sorted(archived_histograms):
+                self.archive.append(xs[i], archived_histograms[i], is_full_quality)
+        if self.checkpoint is not None:
+            for i, x in enumerate(xs):
+                if i not in replayed:
+                    self.checkpoint.add_render(x, fidelity_label, results[i])
+        return results
+
+    def render_label(self, render_fidelity: fidelity.Fidelity | None, backend: str | None = None) -> str:
+        """Render settings a score depends on, scores with different labels are not comparable"""
+        label = render_fidelity.label() if render_fidelity else ""
+        if backend is not None and backend != self.backend:
+            label += f", {self.render_backends[backend].label}"
+        return label
+
+    def render_histograms(self, x: np.ndarray, render_fidelity: fidelity.Fidelity | None = None, backend: str | None = None) -> np.ndarray:
+        """Renders the parameter vector in this Blender instance"""
+        backend = self.render_backends[backend or self.backend]
+        with self.profiler.phase('set_values'):
+            if self.bindings is None: # compiled on first use, after any scene change made by the caller
+                self.bindings = matching_variables.MatchingBindings(self.context)
+            self.bindings.apply(x)
+            if render_fidelity is not None:
+                fidelity.apply_fidelity(self.context.scene, render_fidelity)
+        with self.profiler.phase('render'):
+            backend.render(self.context)
+        with self.profiler.phase('capture'):
+            capture = self.render_capture if backend.uses_compositor else self.file_capture
+            rendered_matrix = capture.capture(self.context.scene)
+        with self.profiler.phase('histogram'):
+            return self.reference_profile.compute_histograms(rendered_matrix)
 
-    def update_csv_file(self):
-        # TODO: think about opening the file each time vs opening it once, and closing it after optimize is done
-        with open(CSV_PATH, 'w', newline="") as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow(self.scores)
+    def render_histograms_animation(self, xs: list[np.ndarray], render_fidelity: fidelity.Fidelity | None, backend: str | None, timings: dict[str, float]) -> list[np.ndarray]:
+        """Renders the parameter vectors as the frames of one animation render job, and adds the duration of each phase to timings"""
+        backend = self.render_backends[backend or self.backend]
+        def timed(phase: str, start: float):
+            timings[phase] = timings.get(phase, 0.0) + time.perf_counter() - start
+        start = time.perf_counter()
+        if self.bindings is None:
+            self.bindings = matching_variables.MatchingBindings(self.context)
+        self.animation_batch.keyframe(self.context, xs)
+        if render_fidelity is not None:
+            fidelity.apply_fidelity(self.context.scene, render_fidelity)
+        timed('set_values', start)
+        try:
+            start = time.perf_counter()
+            frame_paths = self.animation_batch.render(self.context, backend, len(xs))
+            timed('render', start)
+        finally:
+            self.animation_batch.clear()
+            self.bindings.invalidate() # the properties hold the values of the last frame
+        histograms_list = []
+        for frame_path in frame_paths:
+            start = time.perf_counter()
+            rendered_matrix = self.animation_batch.read(frame_path)
+            timed('capture', start)
+            start = time.perf_counter()
+            histograms_list.append(self.reference_profile.compute_histograms(rendered_matrix))
+            timed('histogram', start)
+        return histograms_list
+
+    def scene_fingerprint(self) -> str:
+        """Fingerprint of the settings the scores depend on, for the evaluation cache"""
+        scene = self.context.scene
+        render = scene.render
+        view_settings = scene.view_settings
+        matching_properties = getattr(scene, properties.MATCHING_PROPERTIES_PROPNAME)
+        return evaluation_cache.fingerprint([
+            bpy.data.filepath, scene.name, scene.camera.name if scene.camera else None, scene.frame_current,
+            render.engine, self.backend, render.resolution_x, render.resolution_y, render.film_transparent,
+            view_settings.view_transform, view_settings.look, view_settings.exposure, view_settings.gamma,
+            self.reference_image.name, self.reference_image.filepath, self.reference_profile.histograms.tobytes(),
+            self.region_of_interest.key() if self.region_of_interest is not None else None,
+            self.channel, self.distance,
+            [(matching_property.datablock.name, matching_property.data_path_indexed) for matching_property in matching_properties],
+        ])
+
+    def run_signature(self) -> str:
+        """Fingerprint of the settings a checkpoint can only be resumed with"""
+        return evaluation_cache.fingerprint([self.scene_fingerprint(), type(self).__name__, self.iterations, self.multi_fidelity, self.progressive, self.screening_backend,
+                                           self.sensitivity_trajectories, self.sensitivity_threshold])
+
+    def resume(self, state: dict):
+        """Makes the next optimize call continue the run saved in a checkpoint state, raises ValueError if it can't"""
+        if state.get("finished"):
+            raise ValueError("The last match finished, there is nothing to resume")
+        self.reference_profile = self.create_reference_profile()
+        if state["signature"] != self.run_signature():
+            raise ValueError("The scene or the match settings changed since the last match, it can't be resumed")
+        self.resume_state = state
+
+    def histogram_channels(self) -> tuple[str, ...] | None:
+        """Channels of the computed histograms, None for the compared channels only"""
+        return image_comparison.ALL_CHANNELS if self.archive is not None else None
+
+    def create_reference_profile(self) -> image_comparison.ReferenceProfile:
+        return image_comparison.ReferenceProfile(self.reference_image, self.channel, self.distance, self.histogram_threads, self.region_of_interest, self.histogram_channels())
+
+    def update_best(self, x: np.ndarray, score: float):
+        if score < self.lowest_score:
+            self.lowest_score = score
+            self.best_input = np.copy(x)
+
+    def log_evaluation(self, x: np.ndarray, score: float, is_full_quality: bool):
+        if is_full_quality:
+            fidelity_label = self.render_label(self.full_fidelity)
+        elif self.current_fidelity != self.full_fidelity:
+            fidelity_label = self.render_label(self.current_fidelity)
+        else:
+            fidelity_label = self.render_label(self.progressive_screening.fidelity, self.screening_backend)
+        timings = self.profiler.pop_timings(x.tobytes())
+        if timings and self.cost_model is not None: # cache hits and replayed renders cost nothing
+            self.cost_model.record(x, sum(timings.values()))
+        record = {
+            "iteration": self.current_iteration,
+            "time": round(time.time() - self.start_time, 3),
+            "x": [float(value) for value in x],
+            "score": float(score) if np.isfinite(score) else None, # keep the log valid JSON
+            "fidelity": fidelity_label,
+            "full_quality": is_full_quality,
+            "timings": {phase: round(duration, 6) for phase, duration in timings.items()},
+        }
+        with self.profiler.phase('log'):
+            self.evaluation_log.append(record)
+            if self.server is not None:
+                self.server.publish("evaluation", record)
 
     def optimize(self) -> list[float]:
         self.current_iteration = 0
@@ -90,29 +513,144 @@ class Optimizer(ABC):
         self.stop = False
         self.lowest_score = np.inf
         self.best_input = []
+        if self.reference_profile is None or not self.reference_profile.is_valid_for(self.reference_image, self.channel, self.distance, self.region_of_interest, self.histogram_channels()):
+            self.reference_profile = self.create_reference_profile()
+        self.scores = []
+        self.profiler = profiling.EvaluationProfiler(profile_slowest=self.profile_slowest)
+        self.replay = checkpoint.replay_table(self.resume_state) if self.resume_state is not None else {}
+        self.bindings = None
+        self.replayed = 0
+        self.sensitivity = None
+        self.frozen_variables = np.array([], dtype=np.intp)
+        self.frozen_values = self.active_variables = None
+        self.render_limit = None
+        self.renders = 0
+        self.iterations = self.requested_iterations
+        self.cost_model = cost_model.CostModel(self.initial_parameters()[1])
+        self.deadline = self.start_time + self.time_budget if self.time_budget > 0 else None
+        if self.resume_state is not None:
+            self.seed = self.resume_state["seed"]
+        else:
+            self.seed = self.fixed_seed if self.fixed_seed is not None else int(np.random.default_rng().integers(2 ** 31))
+        self.evaluation_log.open()
+        if self.archive is not None:
+            self.archive.open(evaluation_cache.fingerprint([self.run_signature(), self.seed]), self.reference_profile.histogram_channels, self.matching_variable_names(),
+                              self.region_of_interest.key() if self.region_of_interest is not None else None, self.reference_image.name, resume=self.resume_state is not None)
         # TODO: add addon parameter with default port
         # TODO: create server object only once, and just start it in this method
-        self.server = server.OptimizeViewServer(8000, WORK_DIR, self.get_optimize_data, self.stop_optimization)
-        self.server.start()
-        self.scores = []
-        self.update_csv_file()
+        if self.dashboard:
+            self.server = server.OptimizeViewServer(8000, WORK_DIR, self.get_optimize_data, self.stop_optimization, self.get_metrics)
+            self.server.start()
+        self.full_fidelity = full_fidelity = fidelity.get_fidelity(self.context.scene)
+        self.fidelity_schedule = fidelity.FidelitySchedule(full_fidelity) if self.multi_fidelity else None
+        if self.screening_backend is not None:
+            self.progressive_screening = fidelity.ProgressiveScreening(full_fidelity, screening_fidelity=full_fidelity)
+        elif self.progressive and full_fidelity.samples is not None: # sample screening needs a sample count to reduce
+            self.progressive_screening = fidelity.ProgressiveScreening(full_fidelity)
+        else:
+            self.progressive_screening = None
+        if self.cache is not None:
+            self.cache.open()
+            self.cache_fingerprint = self.scene_fingerprint()
+            if self.archive is not None: # entries with the histograms of every channel, not shared with runs storing none
+                self.cache_fingerprint = evaluation_cache.fingerprint([self.cache_fingerprint, self.reference_profile.histogram_channels])
+            self.cache_steps = [10 ** -(matching_variables.get_precision(matching_property.datablock, matching_property.data_path_indexed) + 1)
+                                for matching_property in getattr(self.context.scene, properties.MATCHING_PROPERTIES_PROPNAME)]
+        previous_border = region.get_border(self.context.scene)
+        if self.region_of_interest is not None:
+            # before starting workers, so that the border is saved in their .blend copy
+            region.apply_region(self.context.scene, self.region_of_interest)
+        if self.checkpoint is not None:
+            x0, bounds = self.initial_parameters()
+            self.checkpoint.start(self.run_signature(), self.seed, x0, bounds, self.resume_state["renders"] if self.resume_state is not None else None)
+        self.render_capture.setup(self.context.scene)
+        finished = False
         try:
-            result = self._run_optimize_algorithm().x
+            if self.render_workers > 0 and self.supports_batch_evaluation:
+                self.worker_pool = workers.WorkerPool(self.render_workers, os.path.join(WORK_DIR, "workers"))
+                self.worker_pool.start(self.reference_profile.histogram_engine.channels, self.capture, self.histogram_threads, self.region_of_interest)
+            if self.sensitivity_trajectories > 0:
+                self.screen_variables()
+            if self.deadline is not None and self.cost_model.renders == 0:
+                self.calibrate()
+            result = self.full_parameters(np.asarray(self._run_optimize_algorithm().x))
+            finished = True
+            if self.fidelity_schedule is not None or self.progressive_screening is not None:
+                # the optimizer result may come from a reduced fidelity score
+                result = self.best_input
+        except DeadlineReached:
+            print(f"Time budget of {format_time(self.time_budget)} reached.")
+            result = self.best_input if len(self.best_input) > 0 else self.initial_parameters()[0]
+            finished = True
         except UserInterrupt:
             result = self.best_input if len(self.best_input) > 0 else self.initial_parameters()[0]
-        self.server.shutdown()
-        self.server = None
+        finally:
+            self.render_capture.teardown(self.context.scene)
+            self.file_capture.teardown(self.context.scene)
+            if self.animation_batch is not None:
+                self.animation_batch.teardown()
+            self.reference_profile.close()
+            fidelity.apply_fidelity(self.context.scene, full_fidelity)
+            region.set_border(self.context.scene, previous_border)
+            self.evaluation_log.close()
+            if self.archive is not None:
+                self.archive.close()
+            if self.cache is not None:
+                self.cache.close()
+            if self.worker_pool is not None:
+                self.worker_pool.shutdown()
+                self.worker_pool = None
+            if self.profile_slowest > 0:
+                self.profiler.save_profiles(PROFILES_DIR)
+            if self.checkpoint is not None:
+                self.checkpoint.save(finished)
+                self.checkpoint.close()
+            self.resume_state = None
+        if self.server is not None:
+            self.server.shutdown()
+            self.server = None
         return list(result)
 
     def get_optimize_data(self) -> dict:
         elapsed = time.time() - self.start_time
-        remaining = elapsed * self.iterations / self.current_iteration if self.current_iteration > 0 else None
-        remaining_str = format_time(remaining) if remaining else "?"
-        return {
+        remaining = self.remaining_time()
+        remaining_str = format_time(remaining) if remaining is not None else "?"
+        data = {
             "Elapsed": format_time(elapsed),
             "Remaining": remaining_str,
             "Iteration": f"{self.current_iteration} / ~{self.iterations}",
         }
+        if self.deadline is not None:
+            data["Time budget"] = f"{format_time(elapsed)} / {format_time(self.time_budget)}"
+        if self.cache is not None:
+            data["Cache hits"] = f"{self.cache.hits} / {self.cache.hits + self.cache.misses}"
+        if self.fidelity_schedule is not None:
+            data["Fidelity"] = self.current_fidelity.label() if self.current_fidelity else "?"
+            data["Renders"] = str(self.fidelity_schedule.render_count())
+            data["Full quality renders"] = str(len(self.fidelity_schedule.scores.get(self.fidelity_schedule.full_fidelity, [])))
+        if self.progressive_screening is not None:
+            data["Aborted renders"] = f"{self.progressive_screening.aborted} / {self.progressive_screening.screened}"
+            data["Time saved"] = format_time(self.progressive_screening.time_saved())
+        if self.replayed > 0:
+            data["Replayed renders"] = str(self.replayed)
+        if self.sensitivity is not None:
+            data["Frozen variables"] = f"{len(self.frozen_variables)} / {len(self.sensitivity)}"
+            data["Sensitivity"] = ", ".join(f"{name} {value:.2f}" + (" (frozen)" if frozen else "") for name, value, frozen in self.sensitivity_ranking())
+        data.update(self.profiler.summary())
+        return data
+
+    def get_metrics(self) -> str:
+        """Prometheus metrics of the run"""
+        metrics = profiling.format_metric("refmatcher_evaluations_total", "counter", "Evaluations of the current run", [({}, self.current_iteration)])
+        metrics += profiling.format_metric("refmatcher_iterations_target", "gauge", "Target number of evaluations", [({}, self.iterations)])
+        if np.isfinite(self.lowest_score):
+            metrics += profiling.format_metric("refmatcher_best_score", "gauge", "Lowest full quality score", [({}, self.lowest_score)])
+        if self.cache is not None:
+            metrics += profiling.format_metric("refmatcher_cache_lookups_total", "counter", "Evaluation cache lookups",
+                                               [({"result": "hit"}, self.cache.hits), ({"result": "miss"}, self.cache.misses)])
+        if self.progressive_screening is not None:
+            metrics += profiling.format_metric("refmatcher_aborted_renders_total", "counter", "Candidates not rendered at full quality", [({}, self.progressive_screening.aborted)])
+        return metrics + self.profiler.prometheus_metrics()
 
     def stop_optimization(self):
         self.stop = True
@@ -122,27 +660,193 @@ class Optimizer(ABC):
         raise NotImplementedError()
 
 class DifferentialEvolutionOptimizer(Optimizer):
+    supports_batch_evaluation = True
+    MIN_GENERATIONS = 5 # with a time budget
+
     def callback(self, intermediate_result: opt.OptimizeResult):
         print(f"Intermediate result: {intermediate_result}")
+        if self.checkpoint is not None:
+            self.checkpoint.set_optimizer_state({
+                "population": intermediate_result.population.tolist(),
+                "population_energies": [float(energy) for energy in intermediate_result.population_energies],
+                "x": [float(value) for value in intermediate_result.x],
+                "fun": float(intermediate_result.fun),
+            })
 
     def _run_optimize_algorithm(self) -> opt.OptimizeResult:
-        x0, bounds = self.initial_parameters()
+        x0, bounds = self.search_parameters()
+        budget = self.remaining_evaluations()
         population_multiplier = 15
-        generations = max(self.iterations // (len(bounds) * population_multiplier), 1)
-        print(f"Starting differential evolution optimization. Target call to evaluation function: {self.iterations}, with population size {len(bounds) * population_multiplier} and {generations} generations.")
-        self.context.window_manager.progress_begin(0, len(bounds) * population_multiplier * generations)
-        result = opt.differential_evolution(self.evaluate, bounds, maxiter=generations, popsize=population_multiplier, disp=True, x0=x0, callback=self.callback)
+        if self.deadline is not None: # smaller populations, so that enough generations fit in the time budget
+            population_multiplier = int(np.clip(budget // (len(bounds) * (self.MIN_GENERATIONS + 1)), 2, population_multiplier))
+        generations = max(budget // (len(bounds) * population_multiplier), 1)
+        print(f"Starting differential evolution optimization. Target call to evaluation function: {budget}, with population size {len(bounds) * population_multiplier} and {generations} generations.")
+        self.context.window_manager.progress_begin(0, self.current_iteration + len(bounds) * population_multiplier * generations)
+        # with a worker pool or animation batches, a whole generation is evaluated at once through the vectorized objective
+        parallel_options = {'vectorized': True, 'updating': 'deferred'} if self.batches_evaluations() else {}
+        objective = self.evaluate_vectorized if self.batches_evaluations() else self.evaluate
+        result = opt.differential_evolution(objective, bounds, maxiter=generations, popsize=population_multiplier, disp=True, x0=x0, callback=self.callback, seed=self.seed, **parallel_options)
         self.context.window_manager.progress_end()
         print(f"Optimization finished.\n{result}")
         return result
 
 class DualAnnealingOptimizer(Optimizer):
+    def callback(self, x: np.ndarray, f: float, context: int):
+        if self.checkpoint is not None:
+            self.checkpoint.set_optimizer_state({"x": [float(value) for value in x], "fun": float(f), "context": context})
+
     def _run_optimize_algorithm(self) -> opt.OptimizeResult:
-        x0, bounds = self.initial_parameters()
-        print(f"Starting dual annealing optimization. Target call to evaluation function: {self.iterations}.")
+        x0, bounds = self.search_parameters()
+        budget = self.remaining_evaluations()
+        print(f"Starting dual annealing optimization. Target call to evaluation function: {budget}.")
+        self.context.window_manager.progress_begin(0, self.iterations)
+        result = opt.dual_annealing(self.evaluate, bounds, maxfun=budget, x0=x0, seed=self.seed, callback=self.callback)
+        self.context.window_manager.progress_end()
+        print(f"Optimization finished.\n{result}")
+        return result
+
+class BayesianOptimizer(Optimizer):
+    """Gaussian process surrogate with expected improvement, for small evaluation budgets"""
+    supports_batch_evaluation = True
+
+    def _run_optimize_algorithm(self) -> opt.OptimizeResult:
+        x0, bounds = self.search_parameters()
+        lower, upper = np.array(bounds, dtype=float).T
+        span = np.where(upper > lower, upper - lower, 1.0)
+        dimension = len(bounds)
+        batch_size = max(self.render_workers, 1) # proposals rendered concurrently by the worker pool
+        budget = self.remaining_evaluations()
+        initial_samples = min(max(2 * dimension + 1, 5), budget)
+        rng = np.random.default_rng(self.seed)
+        print(f"Starting bayesian optimization. Target call to evaluation function: {budget}, with {initial_samples} initial samples and batches of {batch_size}.")
+        self.context.window_manager.progress_begin(0, self.iterations)
+        # work in the unit hypercube, the initial design is x0 plus a latin hypercube
+        x = np.vstack([np.clip((np.array(x0) - lower) / span, 0, 1), bayesian.latin_hypercube(initial_samples - 1, dimension, rng)])
+        y = np.array(self.evaluate_batch(list(lower + x * span)))
+        gp = bayesian.GaussianProcess(dimension)
+        iterations = 0
+        while len(y) < budget:
+            finite_y = bayesian.finite_scores(y)
+            gp.fit(x, finite_y)
+            if self.checkpoint is not None:
+                self.checkpoint.set_optimizer_state({"gp_log_parameters": gp.log_parameters.tolist()})
+            proposals = bayesian.propose_batch(gp, x, finite_y, min(batch_size, budget - len(y)), rng)
+            x = np.vstack([x, proposals])
+            y = np.append(y, self.evaluate_batch(list(lower + proposals * span)))
+            iterations += 1
+        self.context.window_manager.progress_end()
+        best = np.argmin(y)
+        result = opt.OptimizeResult(x=lower + x[best] * span, fun=y[best], nfev=len(y), nit=iterations, success=True, message="Evaluation budget reached")
+        print(f"Optimization finished.\n{result}")
+        return result
+
+class HybridOptimizer(Optimizer):
+    """
+    Global search, then derivative-free local refinement of its best result, within a hard render budget.
+
+    The iterations are the total render budget: every render counts against it, including the screening and
+    calibration renders done before the search, the confirmation renders of multi-fidelity runs and the full renders
+    of progressive screening. The global phase gets global_fraction of the renders left for the search and is not
+    polished, since finite difference gradients of a noisy render objective cost 2n+1 renders each. The local phase
+    gets what the global phase left. Both phases search the unit hypercube of the bounds, and are stopped by the
+    render limit if they don't stop by themselves. With a time budget, the iterations are an estimate and the deadline
+    stops the run as well.
+    """
+    LOCAL_METHODS = {'NELDER_MEAD': 'Nelder-Mead', 'POWELL': 'Powell'}
+    LOCAL_RADIUS = 0.1 # initial Nelder-Mead simplex size, in the unit hypercube
+    PHASE_LABELS = {'global': "Global", 'local': "Local"}
+
+    def __init__(self, *args, global_method: str = 'DIFFERENTIAL_EVOLUTION', local_method: str = 'NELDER_MEAD', global_fraction: float = 0.7, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.global_method = global_method
+        self.local_method = local_method
+        self.global_fraction = global_fraction
+        self.supports_batch_evaluation = global_method == 'DIFFERENTIAL_EVOLUTION'
+        self.phase: str | None = None
+        self.phase_starts: dict[str, int] = {}
+        self.global_budget = 0
+        self.local_budget = 0
+        self.start_render = 0
+
+    def run_signature(self) -> str:
+        return evaluation_cache.fingerprint([super().run_signature(), self.global_method, self.local_method, self.global_fraction])
+
+    def phase_usage(self, phase: str) -> int:
+        if phase not in self.phase_starts:
+            return 0
+        end = self.phase_starts['local'] if phase == 'global' and 'local' in self.phase_starts else self.renders
+        return end - self.phase_starts[phase]
+
+    def phase_budget(self, phase: str) -> int:
+        if phase == 'global':
+            return self.global_budget
+        if 'local' in self.phase_starts:
+            return self.local_budget
+        return max(self.iterations - self.start_render - self.global_budget, 0)
+
+    def remaining_renders(self) -> int:
+        return max(self.iterations - self.renders, 0)
+
+    def get_optimize_data(self) -> dict:
+        data = super().get_optimize_data()
+        if self.phase_starts:
+            data["Phase"] = self.PHASE_LABELS[self.phase] if self.phase is not None else "Finished"
+            for phase, label in self.PHASE_LABELS.items():
+                data[f"{label} budget"] = f"{self.phase_usage(phase)} / {self.phase_budget(phase)}"
+        return data
+
+    def _run_optimize_algorithm(self) -> opt.OptimizeResult:
+        x0, bounds = self.search_parameters()
+        lower, upper = np.array(bounds, dtype=float).T
+        span = np.where(upper > lower, upper - lower, 1.0)
+        dimension = len(bounds)
+        unit_bounds = [(0.0, 1.0)] * dimension
+        u0 = np.clip((np.array(x0, dtype=float) - lower) / span, 0, 1)
+        def objective(u: np.ndarray) -> float | np.ndarray:
+            return self.evaluate_vectorized((lower + np.asarray(u).T * span).T) # (variables,) or (variables, candidates)
+        self.start_render = self.renders
+        budget = max(self.remaining_renders(), 1) # the starting point is always evaluated
+        self.global_budget = max(int(budget * self.global_fraction), 1)
+        self.local_budget = 0
+        self.phase_starts = {}
+        print(f"Starting hybrid optimization. Render budget: {budget}, {self.global_budget} for the global phase.")
         self.context.window_manager.progress_begin(0, self.iterations)
-        result = opt.dual_annealing(self.evaluate, bounds, maxfun=self.iterations, x0=x0)
+        try:
+            self.phase = 'global'
+            self.phase_starts['global'] = self.renders
+            self.render_limit = self.renders + self.global_budget
+            try:
+                if self.global_method == 'DIFFERENTIAL_EVOLUTION':
+                    population_multiplier = 15
+                    generations = max(self.global_budget // (dimension * population_multiplier) - 1, 1) # the initial population is a generation
+                    parallel_options = {'vectorized': True, 'updating': 'deferred'} if self.batches_evaluations() else {}
+                    opt.differential_evolution(objective, unit_bounds, maxiter=generations, popsize=population_multiplier, x0=u0, polish=False, seed=self.seed, **parallel_options)
+                else:
+                    opt.dual_annealing(objective, unit_bounds, maxfun=self.global_budget, x0=u0, seed=self.seed)
+            except BudgetExhausted:
+                pass
+            u_best = (self.reduce_parameters(np.asarray(self.best_input)) - lower) / span if len(self.best_input) > 0 else u0
+            self.phase = 'local'
+            self.phase_starts['local'] = self.renders
+            self.local_budget = self.remaining_renders()
+            self.render_limit = self.renders + self.local_budget
+            print(f"Refining {u_best} with {self.LOCAL_METHODS[self.local_method]}, {self.local_budget} renders left.")
+            if self.local_budget > 0:
+                options = {'maxfev': self.local_budget}
+                if self.local_method == 'NELDER_MEAD':
+                    steps = np.where(u_best + self.LOCAL_RADIUS <= 1, self.LOCAL_RADIUS, -self.LOCAL_RADIUS)
+                    options.update(initial_simplex=np.vstack([u_best, u_best + np.diag(steps)]), xatol=1e-3)
+                try:
+                    opt.minimize(objective, u_best, method=self.LOCAL_METHODS[self.local_method], bounds=unit_bounds, options=options)
+                except BudgetExhausted:
+                    pass
+        finally:
+            self.render_limit = None
+            self.phase = None
         self.context.window_manager.progress_end()
+        x = self.reduce_parameters(np.asarray(self.best_input)) if len(self.best_input) > 0 else np.array(x0)
+        result = opt.OptimizeResult(x=x, fun=self.lowest_score, nfev=self.renders - self.start_render, success=True,
+                                    message=f"Global phase: {self.phase_usage('global')} renders, local phase: {self.phase_usage('local')} renders")
         print(f"Optimization finished.\n{result}")
         return result
 
@@ -150,4 +854,92 @@ class DualAnnealingOptimizer(Optimizer):
 OPTIMIZER_BY_NAME = {
     'DIFFERENTIAL_EVOLUTION': DifferentialEvolutionOptimizer,
     'DUAL_ANNEALING': DualAnnealingOptimizer,
-}
\ No newline at end of file
+    'BAYESIAN': BayesianOptimizer,
+    'HYBRID': HybridOptimizer,
+}
+
+def create_optimizer(context: Context, **options) -> Optimizer:
+    """Creates the optimizer configured in the scene settings. options override optimizer arguments, like dashboard=False."""
+    scene = context.scene
+    optimizer_class = OPTIMIZER_BY_NAME[getattr(scene, properties.OPTIMIZER_PROPNAME)]
+    arguments = dict(
+        capture=getattr(scene, properties.CAPTURE_PROPNAME),
+        histogram_threads=getattr(scene, properties.HISTOGRAM_THREADS_PROPNAME),
+        multi_fidelity=getattr(scene, properties.MULTI_FIDELITY_PROPNAME),
+        use_cache=getattr(scene, properties.USE_CACHE_PROPNAME),
+        render_workers=getattr(scene, properties.WORKERS_PROPNAME),
+        progressive=getattr(scene, properties.PROGRESSIVE_PROPNAME),
+        profile_slowest=getattr(scene, properties.PROFILE_SLOWEST_PROPNAME),
+        region_of_interest=scene_region(scene),
+        backend=getattr(scene, properties.RENDER_BACKEND_PROPNAME),
+        screening_backend=getattr(scene, properties.SCREENING_BACKEND_PROPNAME) if getattr(scene, properties.SCREENING_BACKEND_PROPNAME) != 'NONE' else None,
+        sensitivity_trajectories=getattr(scene, properties.SENSITIVITY_TRAJECTORIES_PROPNAME),
+        sensitivity_threshold=getattr(scene, properties.SENSITIVITY_THRESHOLD_PROPNAME),
+        time_budget=getattr(scene, properties.TIME_BUDGET_PROPNAME) * 60,
+        animation_batches=getattr(scene, properties.ANIMATION_BATCH_PROPNAME),
+        archive=getattr(scene, properties.ARCHIVE_PROPNAME),
+    )
+    if optimizer_class is HybridOptimizer:
+        arguments.update(
+            global_method=getattr(scene, properties.HYBRID_GLOBAL_PROPNAME),
+            local_method=getattr(scene, properties.HYBRID_LOCAL_PROPNAME),
+            global_fraction=getattr(scene, properties.HYBRID_GLOBAL_FRACTION_PROPNAME),
+        )
+    arguments.update(options)
+    return optimizer_class(
+        getattr(scene, properties.CHANNEL_PROPNAME),
+        getattr(scene, properties.DISTANCE_PROPNAME),
+        getattr(scene, properties.REFERENCE_IMAGE_PROPNAME),
+        getattr(scene, properties.ITERATIONS_PROPNAME),
+        context,
+        **arguments,
+    )
+
+def rescore_archive(context: Context, channel: str, distance: str) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Scores the evaluations archived by the last match against the scene reference image and region, under any channel
+    and distance, without rendering. Returns the parameters, the scores and the full quality flags of the evaluations.
+    Raises ValueError if there is no archive, if it lacks histograms of the channel, or if it was matched against
+    another reference image or region.
+    """
+    metadata = evaluation_archive.read_metadata(ARCHIVE_DIR)
+    if metadata is None:
+        raise ValueError("No evaluation archive, enable it before matching")
+    missing_channels = set(image_comparison.CHANNELS_BY_CHANNEL[channel]) - set(metadata["channels"])
+    if missing_channels:
+        raise ValueError(f"The evaluation archive has no histograms of {', '.join(sorted(missing_channels))}")
+    reference_image = getattr(context.scene, properties.REFERENCE_IMAGE_PROPNAME)
+    if reference_image is None:
+        raise ValueError("No reference image")
+    if reference_image.name != metadata.get("reference"):
+        raise ValueError(f"The evaluation archive was not matched against {reference_image.name}")
+    region_of_interest = scene_region(context.scene)
+    if (list(region_of_interest.key()) if region_of_interest is not None else None) != metadata.get("region"):
+        raise ValueError("The region of interest changed since the archived match")
+    reference_profile = image_comparison.ReferenceProfile(reference_image, channel, distance, region=region_of_interest, histogram_channels=metadata["channels"])
+    try:
+        return evaluation_archive.rescore(ARCHIVE_DIR, reference_profile.compare_histograms_batch)
+    finally:
+        reference_profile.close()
+
+def scene_checkpoint_path(scene: Scene) -> str:
+    """
+    Checkpoint of the matches of a scene of the open blend file, so that concurrent Blender processes don't overwrite
+    each other's checkpoint. The checkpoint of an unsaved file is only kept for its Blender process.
+    """
+    blend_key = os.path.abspath(bpy.data.filepath) if bpy.data.filepath else f"unsaved {os.getpid()}"
+    key = evaluation_cache.fingerprint([blend_key, scene.name])[:16]
+    return os.path.join(CHECKPOINTS_DIR, key + checkpoint.CHECKPOINT_EXTENSION)
+
+def scene_region(scene: Scene) -> region.RegionOfInterest | None:
+    """Region of interest configured in the scene settings, raises ValueError if it is invalid"""
+    mode = getattr(scene, properties.ROI_MODE_PROPNAME)
+    if mode == 'RECTANGLE':
+        return region.RegionOfInterest(getattr(scene, properties.ROI_MIN_X_PROPNAME), getattr(scene, properties.ROI_MIN_Y_PROPNAME),
+                                       getattr(scene, properties.ROI_MAX_X_PROPNAME), getattr(scene, properties.ROI_MAX_Y_PROPNAME))
+    if mode == 'MASK':
+        mask_image = getattr(scene, properties.ROI_MASK_PROPNAME)
+        if mask_image is None:
+            raise ValueError("No region of interest mask image")
+        return region.RegionOfInterest.from_mask(region.mask_from_matrix(image_comparison.image_to_matrix(mask_image)))
+    return None
@@ -0,0 +1,167 @@
+from collections import deque
+from contextlib import contextmanager
+import cProfile
+import pstats
+import heapq
+import itertools
+import io
+import os
+import threading
+import time
+import numpy as np
+
+# phases of an evaluation, in pipeline order, with their dashboard labels
+PHASE_LABELS = {
+    'cache': "Cache",
+    'set_values': "Set values",
+    'render': "Render",
+    'workers': "Worker render",
+    'capture': "Capture",
+    'histogram': "Histograms",
+    'distance': "Distance",
+    'log': "Log",
+    'evaluation': "Evaluation",
+}
+QUANTILES = (0.5, 0.9, 0.99)
+
+def format_duration(duration_s: float) -> str:
+    return f"{duration_s * 1000:.1f}ms" if duration_s < 1 else f"{duration_s:.2f}s"
+
+def format_metric(name: str, metric_type: str, help_text: str, samples: list[tuple[dict[str, str], float]]) -> str:
+    """Formats a metric in the Prometheus text exposition format"""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+    for labels, value in samples:
+        label_text = ",".join(f'{key}="{label}"' for key, label in labels.items())
+        lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+def quantiles(durations: list[float]) -> list[float]:
+    return [float(value) for value in np.quantile(durations, QUANTILES)]
+
+class EvaluationProfiler:
+    """
+    Monotonic timers around the phases of evaluations, keeping rolling windows of durations for percentiles.
+
+    Phases timed between start_evaluation and finish_evaluation are summed per evaluation, and kept as pending timings
+    of the parameter vector until the evaluation is logged. Phases timed outside of an evaluation are only recorded.
+    With profile_slowest > 0, every evaluation runs under cProfile and the profiles of the slowest ones are kept.
+    Recorded durations are read by the dashboard server threads from snapshots taken under a lock.
+    """
+    def __init__(self, window: int = 200, profile_slowest: int = 0):
+        self.window = window
+        self.profile_slowest = profile_slowest
+        self.durations: dict[str, deque[float]] = {}
+        self.totals: dict[str, float] = {}
+        self.counts: dict[str, int] = {}
+        self.lock = threading.Lock()
+        self.current: dict[str, float] | None = None
+        self.pending: dict[bytes, dict[str, float]] = {}
+        self.profile: cProfile.Profile | None = None
+        self.slowest: list[tuple[float, int, cProfile.Profile]] = [] # min-heap on evaluation duration
+        self.counter = itertools.count()
+
+    def add(self, phase: str, duration: float):
+        if self.current is not None:
+            self.current[phase] = self.current.get(phase, 0.0) + duration
+        else:
+            self.record(phase, duration)
+
+    def record(self, phase: str, duration: float):
+        with self.lock:
+            self.durations.setdefault(phase, deque(maxlen=self.window)).append(duration)
+            self.totals[phase] = self.totals.get(phase, 0.0) + duration
+            self.counts[phase] = self.counts.get(phase, 0) + 1
+
+    def add_shared(self, phase: str, duration: float, keys: list[bytes]):
+        """Splits the duration of a phase run once for several evaluations, like a batch distance, between them"""
+        share = duration / len(keys)
+        with self.lock:
+            durations = self.durations.setdefault(phase, deque(maxlen=self.window))
+            durations.extend([share] * len(keys))
+            self.totals[phase] = self.totals.get(phase, 0.0) + duration
+            self.counts[phase] = self.counts.get(phase, 0) + len(keys)
+        for key in keys:
+            pending = self.pending.setdefault(key, {})
+            pending[phase] = pending.get(phase, 0.0) + share
+
+    @contextmanager
+    def phase(self, phase: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(phase, time.perf_counter() - start)
+
+    def start_evaluation(self):
+        self.current = {}
+        if self.profile_slowest > 0:
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+
+    def finish_evaluation(self, key: bytes):
+        """Records the phases of the current evaluation, and adds them to the pending timings of key"""
+        if self.profile is not None:
+            self.profile.disable()
+        timings, self.current = self.current, None
+        total = sum(timings.values())
+        for phase, duration in timings.items():
+            self.record(phase, duration)
+        self.record('evaluation', total)
+        pending = self.pending.setdefault(key, {})
+        for phase, duration in timings.items():
+            pending[phase] = pending.get(phase, 0.0) + duration
+        if self.profile is not None:
+            entry = (total, next(self.counter), self.profile)
+            if len(self.slowest) < self.profile_slowest:
+                heapq.heappush(self.slowest, entry)
+            elif total > self.slowest[0][0]:
+                heapq.heapreplace(self.slowest, entry)
+            self.profile = None
+
+    def pop_timings(self, key: bytes) -> dict[str, float]:
+        """Timings of the evaluations of key since the last call, empty for cache hits"""
+        return self.pending.pop(key, {})
+
+    def snapshot(self) -> tuple[dict[str, list[float]], dict[str, float], dict[str, int]]:
+        """Copies of the durations windows, totals and counts of the timed phases, safe to read from another thread"""
+        with self.lock:
+            return {phase: list(durations) for phase, durations in self.durations.items() if durations}, dict(self.totals), dict(self.counts)
+
+    def percentiles(self, phase: str) -> list[float]:
+        durations, _, _ = self.snapshot()
+        return quantiles(durations[phase])
+
+    def summary(self) -> dict[str, str]:
+        """Median and 90th percentile of every timed phase, for the dashboard"""
+        durations, _, _ = self.snapshot()
+        summary = {}
+        for phase, label in PHASE_LABELS.items():
+            if phase in durations:
+                median, p90, _ = quantiles(durations[phase])
+                summary[f"{label} (p50 / p90)"] = f"{format_duration(median)} / {format_duration(p90)}"
+        return summary
+
+    def prometheus_metrics(self) -> str:
+        durations, totals, counts = self.snapshot()
+        phases = [phase for phase in PHASE_LABELS if phase in durations]
+        samples = []
+        for phase in phases:
+            samples += [({"phase": phase, "quantile": str(quantile)}, value) for quantile, value in zip(QUANTILES, quantiles(durations[phase]))]
+        text = format_metric("refmatcher_phase_seconds", "summary", f"Duration of evaluation phases, quantiles over the last {self.window} samples", samples)
+        # summary sums and counts share the metric family of the quantiles
+        text += "".join(f'refmatcher_phase_seconds_sum{{phase="{phase}"}} {totals[phase]}\n'
+                        f'refmatcher_phase_seconds_count{{phase="{phase}"}} {counts[phase]}\n' for phase in phases)
+        return text
+
+    def save_profiles(self, directory: str) -> list[str]:
+        """Writes the profiles of the slowest evaluations as pstats files, slowest first, and prints their top functions"""
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+        for rank, (total, _, profile) in enumerate(sorted(self.slowest, key=lambda entry: entry[0], reverse=True)):
+            path = os.path.join(directory, f"slowest_{rank}.prof")
+            profile.dump_stats(path)
+            paths.append(path)
+            stream = io.StringIO()
+            pstats.Stats(profile, stream=stream).sort_stats(pstats.SortKey.CUMULATIVE).print_stats(10)
+            print(f"Evaluation profile {rank} ({format_duration(total)}), saved to {path}:\n{stream.getvalue()}")
+        return paths
@@ -8,6 +8,8 @@ class MatchingProperty(PropertyGroup):
     data_path_indexed: StringProperty(name="Data Path") # type: ignore
     minimum: FloatProperty(name="Minimum") # type: ignore
     maximum: FloatProperty(name="Maximum") # type: ignore
+    sensitivity: FloatProperty(name="Sensitivity", description="Influence on the score measured by the last sensitivity screening, relative to the most influential variable. Negative if not screened", default=-1.0) # type: ignore
+    frozen: BoolProperty(name="Frozen", description="Frozen at its value by the last sensitivity screening", default=False) # type: ignore
 
 CHANNEL_PROPNAME = "refmatcher_channel"
 DISTANCE_PROPNAME = "refmatcher_distance"
@@ -17,31 +19,107 @@ MATCHING_PROPERTIES_INDEX_PROPNAME = "refmatcher_matching_properties_index"
 OPTIMIZER_PROPNAME = "refmatcher_optimizer"
 REFERENCE_IMAGE_PROPNAME = "refmatcher_reference_image"
 INCLUDE_ALPHA_PROPNAME = "refmatcher_use_alpha"
+CAPTURE_PROPNAME = "refmatcher_capture"
+HISTOGRAM_THREADS_PROPNAME = "refmatcher_histogram_threads"
+MULTI_FIDELITY_PROPNAME = "refmatcher_multi_fidelity"
+USE_CACHE_PROPNAME = "refmatcher_use_cache"
+WORKERS_PROPNAME = "refmatcher_workers"
+PROGRESSIVE_PROPNAME = "refmatcher_progressive"
+PROFILE_SLOWEST_PROPNAME = "refmatcher_profile_slowest"
+ROI_MODE_PROPNAME = "refmatcher_roi_mode"
+ROI_MIN_X_PROPNAME = "refmatcher_roi_min_x"
+ROI_MIN_Y_PROPNAME = "refmatcher_roi_min_y"
+ROI_MAX_X_PROPNAME = "refmatcher_roi_max_x"
+ROI_MAX_Y_PROPNAME = "refmatcher_roi_max_y"
+ROI_MASK_PROPNAME = "refmatcher_roi_mask"
+RENDER_BACKEND_PROPNAME = "refmatcher_render_backend"
+SCREENING_BACKEND_PROPNAME = "refmatcher_screening_backend"
+SENSITIVITY_TRAJECTORIES_PROPNAME = "refmatcher_sensitivity_trajectories"
+SENSITIVITY_THRESHOLD_PROPNAME = "refmatcher_sensitivity_threshold"
+HYBRID_GLOBAL_PROPNAME = "refmatcher_hybrid_global"
+HYBRID_LOCAL_PROPNAME = "refmatcher_hybrid_local"
+HYBRID_GLOBAL_FRACTION_PROPNAME = "refmatcher_hybrid_global_fraction"
+TIME_BUDGET_PROPNAME = "refmatcher_time_budget"
+ANIMATION_BATCH_PROPNAME = "refmatcher_animation_batch"
+ARCHIVE_PROPNAME = "refmatcher_archive"
+
+CHANNEL_ITEMS = [
+    ('LUMINANCE', "Luminance", "Luminance channel"),
+    ('RED', "Red", "Red channel"),
+    ('GREEN', "Green", "Green channel"),
+    ('BLUE', "Blue", "Blue channel"),
+    ('RGB', "RGB", "RGB channels"),
+]
+DISTANCE_ITEMS = [
+    ('BHATTACHARYYA', "Bhattacharyya", "Bhattacharyya distance"),
+    ('EARTH_MOVERS', "Earth Movers", "Earth Movers distance"),
+]
 
 SCENE_ATTRIBUTES = {
-    CHANNEL_PROPNAME: EnumProperty(name="Channel", description="Color channel to be used for comparison", default="RGB",
-                                   items=[
-                                        ('LUMINANCE', "Luminance", "Luminance channel"),
-                                        ('RED', "Red", "Red channel"),
-                                        ('GREEN', "Green", "Green channel"),
-                                        ('BLUE', "Blue", "Blue channel"),
-                                        ('RGB', "RGB", "RGB channels"),
-                                      ]),
-    DISTANCE_PROPNAME: EnumProperty(name="Distance", description="Distance metric to be used for comparison", default="BHATTACHARYYA",
-                                    items=[
-                                        ('BHATTACHARYYA', "Bhattacharyya", "Bhattacharyya distance"),
-                                        ('EARTH_MOVERS', "Earth Movers", "Earth Movers distance"),
-                                    ]),
+    CHANNEL_PROPNAME: EnumProperty(name="Channel", description="Color channel to be used for comparison", default="RGB", items=CHANNEL_ITEMS),
+    DISTANCE_PROPNAME: EnumProperty(name="Distance", description="Distance metric to be used for comparison", default="BHATTACHARYYA", items=DISTANCE_ITEMS),
     ITERATIONS_PROPNAME: IntProperty(name="Iterations", description="Target number of evaluations", default=10, min=1),
+    TIME_BUDGET_PROPNAME: FloatProperty(name="Time budget", description="Minutes within which the match must finish, with the best result so far. The iterations are then fitted to the measured evaluation cost. 0 disables the time budget", default=0.0, min=0.0, soft_max=600.0),
     MATCHING_PROPERTIES_PROPNAME: CollectionProperty(type=MatchingProperty, name="Variables", description="Variables to be optimized for matching"),
     MATCHING_PROPERTIES_INDEX_PROPNAME: IntProperty(name="Index", description="Index of the selected variable", default=-1),
     OPTIMIZER_PROPNAME: EnumProperty(name="Optimizer", description="Optimizer to be used for matching", default="DUAL_ANNEALING",
                                     items=[
                                         ('DUAL_ANNEALING', "Dual Annealing", "?"),
                                         ('DIFFERENTIAL_EVOLUTION', "Differential Evolution", "Good for large numbers of parameters ?"),
+                                        ('BAYESIAN', "Bayesian", "Gaussian process surrogate, needs few evaluations. Best for up to ~15 variables"),
+                                        ('HYBRID', "Hybrid", "Global search, then local refinement of its best result. Never renders more than the iterations"),
                                     ]),
+    HYBRID_GLOBAL_PROPNAME: EnumProperty(name="Global", description="Algorithm of the global phase of the hybrid optimizer", default="DIFFERENTIAL_EVOLUTION",
+                                         items=[
+                                             ('DIFFERENTIAL_EVOLUTION', "Differential Evolution", "Differential evolution, without gradient polishing"),
+                                             ('DUAL_ANNEALING', "Dual Annealing", "Dual annealing"),
+                                           ]),
+    HYBRID_LOCAL_PROPNAME: EnumProperty(name="Local", description="Derivative-free algorithm of the local phase of the hybrid optimizer", default="NELDER_MEAD",
+                                        items=[
+                                            ('NELDER_MEAD', "Nelder-Mead", "Simplex search, robust to noisy scores"),
+                                            ('POWELL', "Powell", "Line searches along conjugate directions"),
+                                          ]),
+    HYBRID_GLOBAL_FRACTION_PROPNAME: FloatProperty(name="Global share", description="Fraction of the iterations given to the global phase, the local phase gets the rest", default=0.7, min=0.05, max=1.0, subtype='FACTOR'),
     REFERENCE_IMAGE_PROPNAME: PointerProperty(name="Reference", description="Reference image", type=Image),
     INCLUDE_ALPHA_PROPNAME: BoolProperty(name="Include alpha", description="Include alpha channel", default=False),
+    CAPTURE_PROPNAME: EnumProperty(name="Capture", description="How the render result is read back for comparison", default="VIEWER_NODE",
+                                   items=[
+                                        ('VIEWER_NODE', "Viewer Node", "Read the float render result from a temporary compositor viewer node. Falls back to file with non-standard view transforms"),
+                                        ('FILE', "File", "Save the render result as PNG and load it back"),
+                                      ]),
+    HISTOGRAM_THREADS_PROPNAME: IntProperty(name="Histogram threads", description="Number of threads computing histograms of large renders", default=1, min=1, max=64),
+    MULTI_FIDELITY_PROPNAME: BoolProperty(name="Multi-fidelity", description="Explore with reduced resolution and samples first, and confirm promising candidates with full quality renders", default=False),
+    USE_CACHE_PROPNAME: BoolProperty(name="Evaluation cache", description="Reuse scores of already evaluated parameters, across runs. Changes to the scene outside of the matching variables are not detected: clear the cache after such changes", default=False),
+    WORKERS_PROPNAME: IntProperty(name="Render workers", description="Number of background Blender processes rendering a differential evolution generation concurrently. 0 renders in this Blender instance", default=0, min=0, soft_max=32),
+    ANIMATION_BATCH_PROPNAME: BoolProperty(name="Animation batches", description="Render a differential evolution generation as the frames of one animation render job, so that the render engine is set up once per generation. Only for scenes which are static across frames apart from the matching variables", default=False),
+    ARCHIVE_PROPNAME: BoolProperty(name="Evaluation archive", description="Keep the parameters and the histograms of every channel of each rendered evaluation, to score them again under another channel or distance without rendering. Histograms of all channels are slower to compute", default=False),
+    PROGRESSIVE_PROPNAME: BoolProperty(name="Early abort", description="Render candidates with few samples first, and skip the full render of those clearly worse than the best one", default=False),
+    PROFILE_SLOWEST_PROPNAME: IntProperty(name="Profile slowest", description="Number of slowest evaluations whose cProfile profile is saved and printed at the end of the run. 0 disables profiling, which slows evaluations down", default=0, min=0, soft_max=10),
+    ROI_MODE_PROPNAME: EnumProperty(name="Region", description="Part of the frame which is rendered and compared", default="NONE",
+                                    items=[
+                                        ('NONE', "Whole Frame", "Render and compare the whole frame"),
+                                        ('RECTANGLE', "Rectangle", "Render and compare a rectangle of the frame"),
+                                        ('MASK', "Mask", "Render the bounding rectangle of a mask painted against the reference, and only compare its painted pixels"),
+                                      ]),
+    ROI_MIN_X_PROPNAME: FloatProperty(name="Min X", description="Left of the region, relative to the frame width", default=0.0, min=0.0, max=1.0, subtype='FACTOR'),
+    ROI_MIN_Y_PROPNAME: FloatProperty(name="Min Y", description="Bottom of the region, relative to the frame height", default=0.0, min=0.0, max=1.0, subtype='FACTOR'),
+    ROI_MAX_X_PROPNAME: FloatProperty(name="Max X", description="Right of the region, relative to the frame width", default=1.0, min=0.0, max=1.0, subtype='FACTOR'),
+    ROI_MAX_Y_PROPNAME: FloatProperty(name="Max Y", description="Top of the region, relative to the frame height", default=1.0, min=0.0, max=1.0, subtype='FACTOR'),
+    ROI_MASK_PROPNAME: PointerProperty(name="Mask", description="Mask image with the frame aspect ratio, white where the render must match the reference", type=Image),
+    RENDER_BACKEND_PROPNAME: EnumProperty(name="Render", description="How candidates are rendered", default="FULL",
+                                          items=[
+                                              ('FULL', "Full Render", "Final render with the scene render engine"),
+                                              ('EEVEE', "EEVEE", "Final render with EEVEE, whatever the scene render engine"),
+                                              ('VIEWPORT', "Viewport", "OpenGL render of the camera with the shading of a 3D viewport in camera view, or the Workbench settings. No compositing"),
+                                            ]),
+    SCREENING_BACKEND_PROPNAME: EnumProperty(name="Screening", description="Render candidates with a fast backend first, and skip the render of those clearly worse than the best one", default="NONE",
+                                             items=[
+                                                 ('NONE', "None", "Render every candidate with the render backend"),
+                                                 ('EEVEE', "EEVEE", "Screen with EEVEE renders"),
+                                                 ('VIEWPORT', "Viewport", "Screen with viewport renders"),
+                                               ]),
+    SENSITIVITY_TRAJECTORIES_PROPNAME: IntProperty(name="Sensitivity trajectories", description="Morris trajectories rendered before matching to measure the influence of each variable, each costs (variables + 1) renders. Insensitive variables are frozen at their value. 0 disables screening", default=0, min=0, soft_max=20),
+    SENSITIVITY_THRESHOLD_PROPNAME: FloatProperty(name="Sensitivity threshold", description="Variables whose influence is below this fraction of the most influential one are frozen", default=0.05, min=0.0, max=1.0, subtype='FACTOR'),
 }
 
 VECTOR_TO_FLOAT_SUBTYPE = {
@@ -0,0 +1,89 @@
+from bpy.types import Scene
+import numpy as np
+import hashlib
+
+# Region of interest of the frame, in normalized coordinates with the origin at the bottom left, like render borders
+# and like the rows of image matrices read from Blender pixels.
+
+MASK_THRESHOLD = 0.5
+BORDER_ATTRIBUTES = ("use_border", "use_crop_to_border", "border_min_x", "border_min_y", "border_max_x", "border_max_y")
+
+def mask_from_matrix(matrix: np.ndarray) -> np.ndarray:
+    """Boolean (height, width) mask of the painted pixels of a (height, width, 4) mask image matrix"""
+    return matrix[:, :, :3].mean(axis=-1) * matrix[:, :, 3] >= MASK_THRESHOLD
+
+class RegionOfInterest:
+    """
+    Rectangle of the frame to render and compare, with an optional mask restricting the compared pixels inside it.
+
+    Renders only cover the rectangle (render border cropped to border), while the reference is cropped to it.
+    The mask is given over the whole frame, and resampled to the size of each compared crop.
+    """
+    def __init__(self, min_x: float, min_y: float, max_x: float, max_y: float, mask: np.ndarray | None = None):
+        if not (0 <= min_x < max_x <= 1 and 0 <= min_y < max_y <= 1):
+            raise ValueError(f"Invalid region of interest ({min_x}, {min_y}) - ({max_x}, {max_y})")
+        self.min_x, self.min_y, self.max_x, self.max_y = float(min_x), float(min_y), float(max_x), float(max_y)
+        self.mask_crop = self._crop_rows_columns(mask) if mask is not None else None
+        self.mask_hash = hashlib.sha1(np.packbits(self.mask_crop).tobytes() + repr(self.mask_crop.shape).encode()).hexdigest() if mask is not None else None
+        self.resampled_masks: dict[tuple[int, int], np.ndarray] = {}
+
+    @classmethod
+    def from_mask(cls, mask: np.ndarray) -> "RegionOfInterest":
+        """Region bounding the painted pixels of a boolean (height, width) mask"""
+        rows = np.flatnonzero(mask.any(axis=1))
+        columns = np.flatnonzero(mask.any(axis=0))
+        if len(rows) == 0:
+            raise ValueError("The region of interest mask is empty")
+        height, width = mask.shape
+        return cls(columns[0] / width, rows[0] / height, (columns[-1] + 1) / width, (rows[-1] + 1) / height, mask)
+
+    def area_fraction(self) -> float:
+        return (self.max_x - self.min_x) * (self.max_y - self.min_y)
+
+    def _crop_rows_columns(self, matrix: np.ndarray) -> np.ndarray:
+        height, width = matrix.shape[:2]
+        rows = slice(int(np.floor(self.min_y * height)), max(int(np.ceil(self.max_y * height)), 1))
+        columns = slice(int(np.floor(self.min_x * width)), max(int(np.ceil(self.max_x * width)), 1))
+        return matrix[rows, columns]
+
+    def crop(self, matrix: np.ndarray) -> np.ndarray:
+        """Crops a full frame (height, width, 4) matrix to the region"""
+        return self._crop_rows_columns(matrix)
+
+    def mask_for(self, matrix: np.ndarray) -> np.ndarray | None:
+        """Mask of the compared pixels of a matrix covering the region, None when all pixels are compared"""
+        if self.mask_crop is None:
+            return None
+        shape = matrix.shape[:2]
+        if shape not in self.resampled_masks:
+            # nearest neighbour, renders and reference rarely have the resolution of the mask
+            rows = ((np.arange(shape[0]) + 0.5) * self.mask_crop.shape[0] / shape[0]).astype(np.intp)
+            columns = ((np.arange(shape[1]) + 0.5) * self.mask_crop.shape[1] / shape[1]).astype(np.intp)
+            self.resampled_masks[shape] = self.mask_crop[rows[:, np.newaxis], columns]
+        return self.resampled_masks[shape]
+
+    def key(self) -> tuple:
+        """Identifies the region, for reference profile validity and evaluation cache fingerprints"""
+        return (self.min_x, self.min_y, self.max_x, self.max_y, self.mask_hash)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, RegionOfInterest) and self.key() == other.key()
+
+    def __getstate__(self) -> dict:
+        # sent to render workers, resampled masks are rebuilt there
+        return dict(self.__dict__, resampled_masks={})
+
+def get_border(scene: Scene) -> dict:
+    return {attribute: getattr(scene.render, attribute) for attribute in BORDER_ATTRIBUTES}
+
+def set_border(scene: Scene, border: dict):
+    for attribute, value in border.items():
+        if getattr(scene.render, attribute) != value:
+            setattr(scene.render, attribute, value)
+
+def apply_region(scene: Scene, region: RegionOfInterest):
+    """Renders only the region, cropped, so that render results cover exactly the region"""
+    set_border(scene, {
+        "use_border": True, "use_crop_to_border": True,
+        "border_min_x": region.min_x, "border_min_y": region.min_y, "border_max_x": region.max_x, "border_max_y": region.max_y,
+    })
@@ -0,0 +1,120 @@
+import bpy
+from bpy.types import Context, RenderSettings
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+
+# EEVEE identifiers, newest first: BLENDER_EEVEE_NEXT from Blender 4.2, BLENDER_EEVEE before
+EEVEE_ENGINE_IDENTIFIERS = ('BLENDER_EEVEE_NEXT', 'BLENDER_EEVEE')
+
+class RenderBackend(ABC):
+    """Renders the scene for an evaluation into the Render Result image, read back by a RenderCapture"""
+    label = ""
+    uses_compositor = True # False if the compositor isn't run, the viewer node can't be captured then
+
+    def __init__(self, write_still: bool = True):
+        self.write_still = write_still
+
+    @contextmanager
+    def session(self, context: Context):
+        """Scope of consecutive renders with this backend, like the renders of a batch, sharing their setup"""
+        yield
+
+    @abstractmethod
+    def render(self, context: Context, animation: bool = False):
+        """Renders the current frame, or every frame of the scene frame range to the output path if animation"""
+        raise NotImplementedError()
+
+class FullRender(RenderBackend):
+    """Final render with the scene render engine"""
+    label = "full render"
+
+    def render(self, context: Context, animation: bool = False):
+        if animation:
+            bpy.ops.render.render(animation=True)
+        else:
+            bpy.ops.render.render(write_still=self.write_still)
+
+class EeveeRender(FullRender):
+    """
+    Final render with EEVEE whatever the scene render engine, and the EEVEE settings of the scene.
+
+    The scene engine is switched to EEVEE for a session, and restored after it, so that renders with the scene engine
+    can be interleaved in the same run (EEVEE screening before full renders). The first EEVEE render after a switch
+    can cost more than the next ones, since EEVEE sets up its render data and compiles the shaders missing from
+    its cache again: batches are rendered in one session, so this is paid once per batch rather than once per render.
+    benchmarks/bench_render_backend.py measures it on a given scene. Render fidelities of the scene engine leave the
+    EEVEE samples alone, which are restored after the session all the same.
+    """
+    label = "EEVEE"
+
+    def __init__(self, write_still: bool = True):
+        super().__init__(write_still)
+        self.in_session = False
+
+    @contextmanager
+    def session(self, context: Context):
+        render = context.scene.render
+        engine = render.engine
+        if self.in_session or engine in EEVEE_ENGINE_IDENTIFIERS:
+            yield
+            return
+        eevee_samples = context.scene.eevee.taa_render_samples
+        set_eevee_engine(render)
+        self.in_session = True
+        try:
+            yield
+        finally:
+            self.in_session = False
+            render.engine = engine
+            context.scene.eevee.taa_render_samples = eevee_samples
+
+    def render(self, context: Context, animation: bool = False):
+        with self.session(context): # a session of its own outside of a batch
+            super().render(context, animation)
+
+class ViewportRender(RenderBackend):
+    """
+    OpenGL render of the scene camera, in a fraction of the final render time. The compositor isn't run.
+
+    Uses the shading of a 3D viewport looking through the camera if there is one (Solid, Material Preview or Rendered),
+    the scene Workbench settings otherwise, as in background Blender.
+    """
+    label = "viewport"
+    uses_compositor = False
+
+    def render(self, context: Context, animation: bool = False):
+        write_still = self.write_still and not animation
+        view = camera_view(context)
+        if view is None:
+            bpy.ops.render.opengl(animation=animation, write_still=write_still)
+            return
+        window, area, region = view
+        with context.temp_override(window=window, area=area, region=region):
+            bpy.ops.render.opengl(animation=animation, write_still=write_still, view_context=True)
+
+def set_eevee_engine(render: RenderSettings):
+    for identifier in EEVEE_ENGINE_IDENTIFIERS:
+        try:
+            render.engine = identifier
+            return
+        except TypeError: # not an engine of this Blender version
+            continue
+    raise RuntimeError("EEVEE isn't available")
+
+def camera_view(context: Context) -> tuple | None:
+    """(window, area, region) of a 3D viewport looking through the scene camera, None if there is none"""
+    window_manager = context.window_manager
+    for window in (window_manager.windows if window_manager is not None else []):
+        for area in window.screen.areas:
+            if area.type != 'VIEW_3D' or area.spaces.active.region_3d.view_perspective != 'CAMERA':
+                continue
+            region = next((region for region in area.regions if region.type == 'WINDOW'), None)
+            if region is not None:
+                return window, area, region
+    return None
+
+RENDER_BACKEND_BY_NAME = {
+    'FULL': FullRender,
+    'VIEWPORT': ViewportRender,
+    'EEVEE': EeveeRender,
+}
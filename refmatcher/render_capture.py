@@ -0,0 +1,117 @@
+import bpy
+from bpy.types import Scene, Image
+from abc import ABC, abstractmethod
+from refmatcher import image_comparison
+import numpy as np
+
+VIEWER_NODE_NAME = "RefMatcher Viewer"
+VIEWER_IMAGE_NAME = "Viewer Node"
+# view transforms whose display conversion can be reproduced from the linear viewer buffer
+SUPPORTED_VIEW_TRANSFORMS = {'Standard', 'Raw'}
+
+def linear_to_srgb(matrix: np.ndarray):
+    """Applies the sRGB transfer function in place on the RGB channels of a (height, width, 4) matrix"""
+    rgb = matrix[:, :, :3]
+    np.clip(rgb, 0, 1, out=rgb)
+    low = rgb <= 0.0031308
+    encoded = 1.055 * np.power(rgb, 1 / 2.4) - 0.055
+    np.multiply(rgb, 12.92, out=rgb, where=low)
+    np.copyto(rgb, encoded, where=~low)
+
+class RenderCapture(ABC):
+    """Reads the last render result as a (height, width, 4) float matrix"""
+    def setup(self, scene: Scene):
+        pass
+
+    def teardown(self, scene: Scene):
+        pass
+
+    @abstractmethod
+    def capture(self, scene: Scene) -> np.ndarray:
+        raise NotImplementedError()
+
+class FileCapture(RenderCapture):
+    """Saves the render result to a PNG file and loads it back. Slow, but works with every view transform."""
+    def __init__(self, work_dir: str):
+        self.work_dir = work_dir
+        self.pixel_buffers = image_comparison.PixelBuffers()
+
+    def teardown(self, scene: Scene):
+        self.pixel_buffers.clear()
+
+    def capture(self, scene: Scene) -> np.ndarray:
+        return image_comparison.image_to_matrix(image_comparison.rendered_image(self.work_dir), self.pixel_buffers)
+
+class ViewerNodeCapture(RenderCapture):
+    """Reads the float render result from a compositor viewer node, without any disk round trip."""
+    def __init__(self, work_dir: str):
+        self.fallback = FileCapture(work_dir)
+        self.pixel_buffers = image_comparison.PixelBuffers()
+        self.use_fallback = False
+        self.previous_use_nodes = True
+        self.previous_use_compositing = True
+
+    def setup(self, scene: Scene):
+        view_settings = scene.view_settings
+        self.use_fallback = view_settings.view_transform not in SUPPORTED_VIEW_TRANSFORMS or view_settings.look != 'None' or view_settings.use_curve_mapping
+        if self.use_fallback:
+            print(f"View transform {view_settings.view_transform} can't be applied to the viewer node buffer, falling back to file capture.")
+            return
+        self.previous_use_nodes = scene.use_nodes
+        self.previous_use_compositing = scene.render.use_compositing
+        scene.use_nodes = True # creates the default Render Layers -> Composite tree if needed
+        scene.render.use_compositing = True
+        node_tree = scene.node_tree
+        viewer = node_tree.nodes.get(VIEWER_NODE_NAME) or node_tree.nodes.new("CompositorNodeViewer")
+        viewer.name = VIEWER_NODE_NAME
+        source = self._composite_source(scene)
+        if source is None:
+            print("No compositor output to capture, falling back to file capture.")
+            self._restore(scene)
+            self.use_fallback = True
+            return
+        node_tree.links.new(source, viewer.inputs["Image"])
+        node_tree.nodes.active = viewer # the viewer image is filled by the active viewer node
+
+    def teardown(self, scene: Scene):
+        self.pixel_buffers.clear()
+        self.fallback.teardown(scene)
+        if not self.use_fallback:
+            self._restore(scene)
+
+    def _restore(self, scene: Scene):
+        node_tree = scene.node_tree
+        viewer = node_tree.nodes.get(VIEWER_NODE_NAME) if node_tree else None
+        if viewer is not None:
+            node_tree.nodes.remove(viewer)
+        scene.use_nodes = self.previous_use_nodes
+        scene.render.use_compositing = self.previous_use_compositing
+
+    def capture(self, scene: Scene) -> np.ndarray:
+        viewer_image: Image | None = bpy.data.images.get(VIEWER_IMAGE_NAME)
+        if self.use_fallback or viewer_image is None or viewer_image.size[0] == 0:
+            return self.fallback.capture(scene)
+        matrix = image_comparison.image_to_matrix(viewer_image, self.pixel_buffers)
+        view_settings = scene.view_settings
+        if view_settings.view_transform == 'Standard':
+            if view_settings.exposure != 0:
+                matrix[:, :, :3] *= 2 ** view_settings.exposure
+            linear_to_srgb(matrix)
+            if view_settings.gamma != 1:
+                np.power(matrix[:, :, :3], 1 / view_settings.gamma, out=matrix[:, :, :3])
+        return matrix
+
+    @staticmethod
+    def _composite_source(scene: Scene) -> bpy.types.NodeSocket | None:
+        """Returns the socket linked to the Composite node, so that compositing is included in the capture"""
+        node_tree = scene.node_tree
+        composite = next((node for node in node_tree.nodes if node.type == 'COMPOSITE'), None)
+        if composite is not None and composite.inputs["Image"].is_linked:
+            return composite.inputs["Image"].links[0].from_socket
+        render_layers = next((node for node in node_tree.nodes if node.type == 'R_LAYERS'), None)
+        return render_layers.outputs["Image"] if render_layers is not None else None
+
+RENDER_CAPTURE_BY_NAME = {
+    'VIEWER_NODE': ViewerNodeCapture,
+    'FILE': FileCapture,
+}
@@ -0,0 +1,53 @@
+import numpy as np
+
+# Morris elementary effects screening, in the unit hypercube of the matching variables.
+# A trajectory starts at a random grid point and moves one variable at a time by delta, so that r trajectories
+# measure r elementary effects of each variable with r * (variables + 1) renders.
+
+MORRIS_LEVELS = 4
+
+def morris_trajectories(trajectories: int, dimension: int, rng: np.random.Generator, levels: int = MORRIS_LEVELS) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Returns the (trajectories, dimension + 1, dimension) points, the variable changed at each step and its signed step"""
+    delta = levels / (2 * (levels - 1))
+    grid = np.arange(levels // 2) / (levels - 1) # start values from which a step of +delta stays in [0, 1]
+    points = np.empty((trajectories, dimension + 1, dimension))
+    orders = np.empty((trajectories, dimension), dtype=np.intp)
+    steps = np.empty((trajectories, dimension))
+    for t in range(trajectories):
+        signs = rng.choice([-1.0, 1.0], dimension)
+        x = rng.choice(grid, dimension) + np.where(signs < 0, delta, 0.0)
+        orders[t] = rng.permutation(dimension)
+        steps[t] = signs[orders[t]] * delta
+        points[t, 0] = x
+        for j, variable in enumerate(orders[t]):
+            x = x.copy()
+            x[variable] += steps[t, j]
+            points[t, j + 1] = x
+    return points, orders, steps
+
+def elementary_effects(scores: np.ndarray, orders: np.ndarray, steps: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Mean absolute elementary effect (mu*) and standard deviation of the elementary effects (sigma) of each variable,
+    from the (trajectories, dimension + 1) scores of the trajectory points. Effects involving non-finite scores are ignored.
+    """
+    trajectories, dimension = orders.shape
+    effects = np.full((trajectories, dimension), np.nan)
+    with np.errstate(invalid='ignore'):
+        for t in range(trajectories):
+            effects[t, orders[t]] = np.diff(scores[t]) / steps[t]
+    effects[~np.isfinite(effects)] = np.nan
+    measured = ~np.all(np.isnan(effects), axis=0)
+    mu_star = np.zeros(dimension)
+    sigma = np.zeros(dimension)
+    mu_star[measured] = np.nanmean(np.abs(effects[:, measured]), axis=0)
+    sigma[measured] = np.nanstd(effects[:, measured], axis=0)
+    return mu_star, sigma
+
+def insensitive_variables(mu_star: np.ndarray, threshold: float) -> np.ndarray:
+    """Indices of the variables whose mu* is below threshold times the largest one. The most influential is always kept."""
+    largest = np.max(mu_star) if len(mu_star) > 0 else 0.0
+    if not np.isfinite(largest) or largest <= 0:
+        return np.array([], dtype=np.intp)
+    insensitive = mu_star < threshold * largest
+    insensitive[np.argmax(mu_star)] = False
+    return np.flatnonzero(insensitive)
@@ -3,27 +3,90 @@ import webbrowser
 import threading
 import shutil
 from pathlib import Path
+from urllib.parse import urlsplit, parse_qs
 import json
+import io
 from typing import Callable
+from refmatcher import evaluation_log
 
 MODULE_DIR = Path(__file__).parent
+STATUS_INTERVAL = 1.0 # seconds between status checks of event stream clients
+
+def parse_int(value: str, minimum: int) -> int | None:
+    """Integer of a request parameter clamped to minimum, None if it isn't an integer"""
+    try:
+        return max(int(value), minimum)
+    except ValueError:
+        return None
+
+class EventStream():
+    """Thread safe list of published events. Event ids are their index, so that clients can resume after a given id."""
+    def __init__(self):
+        self.events: list[tuple[str, str]] = [] # (event type, JSON data)
+        self.condition = threading.Condition()
+        self.closed = False
+
+    def publish(self, event_type: str, data: dict):
+        with self.condition:
+            self.events.append((event_type, json.dumps(data)))
+            self.condition.notify_all()
+
+    def wait_events(self, first_id: int, timeout: float) -> list[tuple[int, str, str]]:
+        """Returns the events with id >= first_id, waiting up to timeout seconds if there are none yet"""
+        with self.condition:
+            self.condition.wait_for(lambda: len(self.events) > first_id or self.closed, timeout)
+            return [(i, event_type, data) for i, (event_type, data) in enumerate(self.events[first_id:], first_id)]
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
 
 class HTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
-    def __init__(self, live_data_callback: Callable[[], dict], stop_callback: Callable[[], None], *args, **kwargs):
+    def __init__(self, live_data_callback: Callable[[], dict], stop_callback: Callable[[], None], event_stream: EventStream, metrics_callback: Callable[[], str] | None, *args, **kwargs):
         self.live_data_callback = live_data_callback
         self.stop_callback = stop_callback
+        self.event_stream = event_stream
+        self.metrics_callback = metrics_callback
         super().__init__(*args, **kwargs)
 
     def do_GET(self):
+        url = urlsplit(self.path)
         if self.path == "/":
             self.path = "/index.html"
+        elif url.path == "/events":
+            self.stream_events(url.query)
+            return
+        elif url.path == "/log":
+            # incremental read of the evaluation log: the client sends back the offset of the previous response
+            offset = parse_int(parse_qs(url.query).get("offset", ["0"])[0], 0)
+            if offset is None:
+                self.send_error(400, "Invalid offset")
+                return
+            log_path = Path(self.directory) / evaluation_log.LOG_FILENAME
+            reset = offset > (log_path.stat().st_size if log_path.is_file() else 0) # a new run restarted the log
+            records, offset = evaluation_log.read_records(log_path, offset)
+            self.send_json({"records": records, "offset": offset, "reset": reset})
+            return
+        elif url.path == "/progress.csv":
+            records, _ = evaluation_log.read_records(Path(self.directory) / evaluation_log.LOG_FILENAME)
+            csv_file = io.StringIO()
+            evaluation_log.write_csv(csv_file, records)
+            self.send_response(200)
+            self.send_header("Content-type", "text/csv")
+            self.send_header("Content-Disposition", "attachment; filename=progress.csv")
+            self.end_headers()
+            self.wfile.write(csv_file.getvalue().encode())
+            return
         elif self.path == "/data":
-            data = self.live_data_callback()
-            json_data = json.dumps(data)
+            self.send_json(self.live_data_callback())
+            return
+        elif self.path == "/metrics" and self.metrics_callback is not None:
+            # Prometheus text exposition format
             self.send_response(200)
-            self.send_header("Content-type", "application/json")
+            self.send_header("Content-type", "text/plain; version=0.0.4; charset=utf-8")
             self.end_headers()
-            self.wfile.write(json_data.encode())
+            self.wfile.write(self.metrics_callback().encode())
             return
         elif self.path == "/stop":
             self.send_response(200)
@@ -34,17 +97,62 @@ class HTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
             return
         return http.server.SimpleHTTPRequestHandler.do_GET(self)
 
+    def stream_events(self, query: str):
+        """
+        Server-Sent Events: pushes published events as they happen, and status changes checked every STATUS_INTERVAL.
+        A reconnecting client resumes after its Last-Event-ID header, or the last query parameter.
+        """
+        last_event_id = parse_int(self.headers.get("Last-Event-ID") or parse_qs(query).get("last", ["-1"])[0], -1)
+        if last_event_id is None:
+            self.send_error(400, "Invalid last event id")
+            return
+        next_id = last_event_id + 1
+        self.send_response(200)
+        self.send_header("Content-type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        last_status = None
+        try:
+            while not self.event_stream.closed:
+                for event_id, event_type, data in self.event_stream.wait_events(next_id, STATUS_INTERVAL):
+                    self.wfile.write(f"id: {event_id}\nevent: {event_type}\ndata: {data}\n\n".encode())
+                    next_id = event_id + 1
+                try:
+                    status = json.dumps(self.live_data_callback())
+                except Exception as error: # the status is read while the optimizer thread updates it, the stream goes on
+                    print(f"Dashboard status unavailable: {error!r}")
+                    status = last_status
+                if status != last_status:
+                    self.wfile.write(f"event: status\ndata: {status}\n\n".encode())
+                    last_status = status
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError): # client went away
+            pass
+
+    def send_json(self, data: dict):
+        json_data = json.dumps(data)
+        self.send_response(200)
+        self.send_header("Content-type", "application/json")
+        self.end_headers()
+        self.wfile.write(json_data.encode())
+
     def log_message(self, format: str, *args) -> None:
         # override log function to remove console logs
         pass
 
+class DashboardHTTPServer(http.server.ThreadingHTTPServer):
+    """One thread per request: event stream connections stay open, and a slow client must not block the others"""
+    block_on_close = False # event stream handlers return once the event stream is closed
+
 class OptimizeViewServer():
-    def __init__(self, port: int, work_dir: str, live_data_callback: Callable[[], dict], stop_callback: Callable[[], None]):
+    def __init__(self, port: int, work_dir: str, live_data_callback: Callable[[], dict], stop_callback: Callable[[], None], metrics_callback: Callable[[], str] | None = None):
         self.port = port
         self.work_dir = work_dir
         self.httpd = None
         self.live_data_callback = live_data_callback
         self.stop_callback = stop_callback
+        self.metrics_callback = metrics_callback
+        self.event_stream = EventStream()
         self._ensure_server_files()
 
     def _ensure_server_files(self):
@@ -57,14 +165,16 @@ class OptimizeViewServer():
 
     def _start_server(self):
         # TODO: test if port is free (by catching OSError if no specific function allows port testing), if not use port 0 (port allocated by the OS)
-        with http.server.HTTPServer(("", self.port),
-                                    lambda *args, **kwargs: HTTPRequestHandler(
-                                        self.live_data_callback,
-                                        self.stop_callback,
-                                        *args,
-                                        directory=self.work_dir,
-                                        **kwargs)
-                                    )as httpd:
+        with DashboardHTTPServer(("", self.port),
+                                 lambda *args, **kwargs: HTTPRequestHandler(
+                                     self.live_data_callback,
+                                     self.stop_callback,
+                                     self.event_stream,
+                                     self.metrics_callback,
+                                     *args,
+                                     directory=self.work_dir,
+                                     **kwargs)
+                                 )as httpd:
             self.httpd = httpd
             # TODO: add opening tab option in addon preferences
             webbrowser.open_new_tab(f"http://localhost:{self.port}?interval=1000")
@@ -76,7 +186,11 @@ class OptimizeViewServer():
             self.server_thread.daemon = True
             self.server_thread.start()
 
+    def publish(self, event_type: str, data: dict):
+        self.event_stream.publish(event_type, data)
+
     def shutdown(self):
+        self.event_stream.close()
         if self.httpd:
             self.httpd.shutdown()
             self.server_thread.join()
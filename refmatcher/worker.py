@@ -0,0 +1,10 @@
+import sys
+import os
+
+# Entry point of background render workers, started by workers.WorkerPool:
+# blender -b worker_scene.blend --python worker.py -- <host> <port> <work_dir>
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from refmatcher import workers
+    workers.run_worker(sys.argv[sys.argv.index("--") + 1:])
@@ -0,0 +1,168 @@
+import bpy
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener, Client, Connection, wait
+from collections import deque
+from typing import Iterable
+from refmatcher import properties, matching_variables, image_comparison, render_capture, fidelity, region, render_backend
+import numpy as np
+import subprocess
+import threading
+import traceback
+import time
+import os
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "worker.py")
+AUTHKEY_ENVIRONMENT_VARIABLE = "REFMATCHER_WORKER_AUTHKEY"
+STARTUP_TIMEOUT = 300 # seconds, workers have to load the .blend file before connecting
+SHUTDOWN_TIMEOUT = 10
+
+class WorkerError(Exception):
+    pass
+
+class WorkerPool:
+    """
+    Pool of background Blender processes rendering a saved copy of the current .blend file.
+
+    Each worker receives parameter vectors through a local socket, applies them with matching_variables, renders,
+    and sends back the histograms of the render. Histograms are a few kilobytes, so no pixels cross process boundaries.
+    """
+    def __init__(self, worker_count: int, work_dir: str):
+        self.worker_count = worker_count
+        self.work_dir = work_dir
+        self.processes: list[subprocess.Popen] = []
+        self.connections: list[Connection] = []
+        self.log_files = []
+
+    def start(self, channels: Iterable[str], capture: str, histogram_threads: int = 1, region_of_interest: region.RegionOfInterest | None = None):
+        os.makedirs(self.work_dir, exist_ok=True)
+        blend_path = os.path.join(self.work_dir, "worker_scene.blend")
+        bpy.ops.wm.save_as_mainfile(filepath=blend_path, copy=True, relative_remap=True)
+        authkey = os.urandom(32)
+        environment = dict(os.environ, **{AUTHKEY_ENVIRONMENT_VARIABLE: authkey.hex()})
+        with Listener(("localhost", 0), authkey=authkey) as listener:
+            host, port = listener.address
+            for i in range(self.worker_count):
+                worker_dir = os.path.join(self.work_dir, f"worker_{i}")
+                os.makedirs(worker_dir, exist_ok=True)
+                log_file = open(os.path.join(worker_dir, "worker.log"), 'w')
+                self.log_files.append(log_file)
+                command = [bpy.app.binary_path, "-b", blend_path, "--python", WORKER_SCRIPT, "--", host, str(port), worker_dir]
+                self.processes.append(subprocess.Popen(command, env=environment, stdout=log_file, stderr=subprocess.STDOUT))
+            accept_thread = threading.Thread(target=self._accept_connections, args=(listener,), daemon=True)
+            accept_thread.start()
+            deadline = time.monotonic() + STARTUP_TIMEOUT
+            while accept_thread.is_alive() and time.monotonic() < deadline and any(process.poll() is None for process in self.processes):
+                accept_thread.join(1)
+        if len(self.connections) < self.worker_count:
+            self.shutdown()
+            raise WorkerError(f"Only {len(self.connections)} of {self.worker_count} workers started, see logs in {self.work_dir}")
+        for connection in self.connections:
+            connection.send(('setup', {'channels': tuple(channels), 'capture': capture, 'histogram_threads': histogram_threads, 'region': region_of_interest}))
+        print(f"Started {self.worker_count} render workers.")
+
+    def _accept_connections(self, listener: Listener):
+        while len(self.connections) < self.worker_count:
+            try:
+                self.connections.append(listener.accept())
+            except (OSError, AuthenticationError): # listener closed after timeout, or unexpected client
+                return
+
+    def map(self, xs: list[np.ndarray], render_fidelity: fidelity.Fidelity | None = None, backend: str = 'FULL') -> list[np.ndarray]:
+        """Renders every parameter vector on the first idle worker, and returns their histograms in order"""
+        results: list[np.ndarray | None] = [None] * len(xs)
+        queue = deque(enumerate(xs))
+        idle = list(self.connections)
+        busy: dict[Connection, int] = {}
+        while queue or busy:
+            while queue and idle:
+                connection = idle.pop()
+                index, x = queue.popleft()
+                connection.send(('evaluate', [float(value) for value in x], tuple(render_fidelity) if render_fidelity else None, backend))
+                busy[connection] = index
+            for connection in wait(list(busy)):
+                try:
+                    message = connection.recv()
+                except EOFError:
+                    raise WorkerError(f"A render worker stopped unexpectedly, see logs in {self.work_dir}")
+                index = busy.pop(connection)
+                if message[0] == 'error':
+                    raise WorkerError(f"Render worker failed:\n{message[1]}")
+                results[index] = message[1]
+                idle.append(connection)
+        return results
+
+    def shutdown(self):
+        for connection in self.connections:
+            try:
+                connection.send(('stop',))
+                connection.close()
+            except OSError:
+                pass
+        for process in self.processes:
+            try:
+                process.wait(SHUTDOWN_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        for log_file in self.log_files:
+            log_file.close()
+        self.connections.clear()
+        self.processes.clear()
+        self.log_files.clear()
+
+
+# worker side
+
+def ensure_registered():
+    """The addon may not be enabled in the worker, but matching properties must be readable"""
+    if not hasattr(bpy.types.Scene, properties.MATCHING_PROPERTIES_PROPNAME):
+        import refmatcher
+        refmatcher.register()
+
+def run_worker(argv: list[str]):
+    host, port, work_dir = argv[0], int(argv[1]), argv[2]
+    authkey = bytes.fromhex(os.environ[AUTHKEY_ENVIRONMENT_VARIABLE])
+    ensure_registered()
+    context = bpy.context
+    scene = context.scene
+    capture: render_capture.RenderCapture | None = None
+    file_capture = render_capture.FileCapture(work_dir) # for backends which don't run the compositor
+    backends: dict[str, render_backend.RenderBackend] = {}
+    histogram_engine: image_comparison.HistogramEngine | None = None
+    region_of_interest: region.RegionOfInterest | None = None # the render border is saved in the .blend copy, only the mask is needed
+    bindings = matching_variables.MatchingBindings(context)
+    connection = Client((host, port), authkey=authkey)
+    try:
+        while True:
+            message = connection.recv()
+            if message[0] == 'setup':
+                settings = message[1]
+                capture = render_capture.RENDER_CAPTURE_BY_NAME[settings['capture']](work_dir)
+                capture.setup(scene)
+                histogram_engine = image_comparison.HistogramEngine(settings['channels'], threads=settings['histogram_threads'])
+                region_of_interest = settings['region']
+            elif message[0] == 'evaluate':
+                _, x, render_fidelity, backend_name = message
+                try:
+                    bindings.apply(x)
+                    if render_fidelity is not None:
+                        fidelity.apply_fidelity(scene, fidelity.Fidelity(*render_fidelity))
+                    if backend_name not in backends:
+                        backends[backend_name] = render_backend.RENDER_BACKEND_BY_NAME[backend_name](write_still=False)
+                    backend = backends[backend_name]
+                    backend.render(context)
+                    matrix = (capture if backend.uses_compositor else file_capture).capture(scene)
+                    mask = region_of_interest.mask_for(matrix) if region_of_interest is not None else None
+                    connection.send(('result', histogram_engine.compute(matrix, mask)))
+                except Exception:
+                    connection.send(('error', traceback.format_exc()))
+            elif message[0] == 'stop':
+                break
+    except EOFError: # main process is gone
+        pass
+    finally:
+        if capture is not None:
+            capture.teardown(scene)
+        file_capture.teardown(scene)
+        if histogram_engine is not None:
+            histogram_engine.close()
+        connection.close()
@@ -0,0 +1,10 @@
+import sys
+import os
+
+# Headless batch matching, see refmatcher/cli.py for the job file format:
+# blender -b scene.blend -P refmatcher_cli.py -- --job job.json
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from refmatcher import cli
+    sys.exit(cli.main(sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []))